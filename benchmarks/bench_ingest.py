@@ -0,0 +1,78 @@
+"""
+Ingest benchmark: save-then-reread vs parse-on-ingest.
+
+"round trip"  - write the batch to Parquet, read it back, parse (previous pipeline)
+"in memory"   - one Arrow table, parsed directly while the write runs on a thread
+Detection latency is the time until the events are available.
+
+Usage: python benchmarks/bench_ingest.py [--rows 200000]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from core.data_manager import DataManager  # noqa: E402
+from core.parser import LogParser  # noqa: E402
+from bench_parser import synthetic_messages  # noqa: E402
+
+
+def synthetic_records(rows, base=1_767_225_600.0):
+    """Collector-shaped records (see LogCollector._normalize)"""
+    records = []
+    for i, message in enumerate(synthetic_messages(rows)):
+        ts = base + i * 0.013
+        raw = {'__REALTIME_TIMESTAMP': str(int(ts * 1e6)), '__CURSOR': f"s=bench;i={i:x}",
+               '_HOSTNAME': 'bench', 'MESSAGE': message, '_SYSTEMD_UNIT': 'ssh.service'}
+        records.append({'timestamp': ts, 'message': message, 'hostname': 'bench',
+                        'cursor': raw['__CURSOR'], 'raw': json.dumps(raw)})
+    return records
+
+
+def round_trip(records, storage):
+    start = time.perf_counter()
+    archives = DataManager.save_logs(1, records, storage)
+    events = []
+    for archive in archives:
+        events.extend(LogParser(os.path.join(storage, archive.filename)).parse())
+    return events, time.perf_counter() - start, time.perf_counter() - start
+
+
+def in_memory(records, storage, writer):
+    start = time.perf_counter()
+    table = DataManager.to_table(records)
+    saving = writer.submit(DataManager.save_logs, 1, table, storage)
+    events = LogParser(table).parse()
+    detected = time.perf_counter() - start
+    saving.result()
+    return events, detected, time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument('--rows', type=int, default=200_000)
+    args = ap.parse_args()
+
+    records = synthetic_records(args.rows)
+    with tempfile.TemporaryDirectory() as tmp, ThreadPoolExecutor(max_workers=1) as writer:
+        # save_logs prints one line per file, keep it out of the output
+        with contextlib.redirect_stdout(io.StringIO()):
+            old_events, old_detect, old_total = round_trip(records, os.path.join(tmp, 'a'))
+            new_events, new_detect, new_total = in_memory(records, os.path.join(tmp, 'b'), writer)
+
+    print(f"rows:                      {args.rows}  (cpus: {os.cpu_count()})")
+    print(f"events:                    {len(new_events)}")
+    print(f"round trip  detection:     {old_detect:.2f}s   total {old_total:.2f}s")
+    print(f"in memory   detection:     {new_detect:.2f}s   total {new_total:.2f}s")
+    print(f"detection speedup:         {old_detect / new_detect:.1f}x")
+    print(f"identical:                 {old_events == new_events}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Parser benchmark: row loop vs columnar detection.
+
+Usage: python benchmarks/bench_parser.py [--rows 200000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from core.parser import LogParser  # noqa: E402
+
+
+def synthetic_messages(rows, seed=42):
+    """sshd-like journal messages with a realistic share of failed/accepted logins"""
+    rnd = random.Random(seed)
+    users = ['root', 'admin', 'ubuntu', 'test', 'oracle', 'deploy']
+    messages = []
+    for _ in range(rows):
+        ip = f"{rnd.randint(1, 223)}.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}"
+        user = rnd.choice(users)
+        roll = rnd.random()
+        if roll < 0.25:
+            messages.append(f"Failed password for {user} from {ip} port {rnd.randint(1024, 65535)} ssh2")
+        elif roll < 0.35:
+            messages.append(f"Failed password for invalid user {user} from {ip} port {rnd.randint(1024, 65535)} ssh2")
+        elif roll < 0.45:
+            messages.append(f"Connection closed by authenticating user {user} {ip} port {rnd.randint(1024, 65535)} [preauth]")
+        elif roll < 0.50:
+            messages.append(f"Accepted publickey for {user} from {ip} port {rnd.randint(1024, 65535)} ssh2: RSA SHA256:abc")
+        else:
+            messages.append(f"pam_unix(sshd:session): session closed for user {user}")
+    return messages
+
+
+def run(parser):
+    # The row loop prints a line per hit, keep it out of the measurement output
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        events = parser.parse()
+        elapsed = time.perf_counter() - start
+    return events, elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument('--rows', type=int, default=200_000)
+    args = ap.parse_args()
+
+    base = 1_767_225_600.0
+    df = pd.DataFrame({
+        'timestamp': [base + i * 0.013 for i in range(args.rows)],
+        'message': synthetic_messages(args.rows),
+    })
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.parquet')
+        df.to_parquet(path, engine='pyarrow', compression='snappy')
+
+        rows_events, rows_time = run(LogParser(path, vectorized=False))
+        cols_events, cols_time = run(LogParser(path, vectorized=True))
+
+    print(f"rows:           {args.rows}")
+    print(f"events:         {len(cols_events)}")
+    print(f"iterrows loop:  {args.rows / rows_time:>12,.0f} rows/s ({rows_time:.2f}s)")
+    print(f"columnar:       {args.rows / cols_time:>12,.0f} rows/s ({cols_time:.2f}s)")
+    print(f"speedup:        {rows_time / cols_time:.1f}x")
+    print(f"identical:      {rows_events == cols_events}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,355 @@
+"""
+Ingestion pipeline benchmark: every stage from the journal stream to the dashboard.
+
+A synthetic sshd journal (benchmarks/journal.py) is written for every host
+and replayed through a local stand-in for the SSH session, so LogCollector
+runs unchanged. The journal holds the fields journalctl would send with the
+JOURNAL_FIELDS setting (JOURNAL_FIELDS='*' for complete entries). Stages are
+timed per batch of --batch rows:
+
+  decode       JSON decode of the journal lines (orjson when installed)
+  normalize    decoded entries -> collector records
+  to_table     records -> Arrow table
+  archive      Parquet write + search index (DataManager.save_logs)
+  parse        detection rules (LogParser)
+  alerts       new alerts: dedup query, insert, rollups, one commit per batch
+  dedup        the same batch again, every alert already stored
+  collect      LogCollector.iter_logs over the stand-in (read + decode + normalize)
+  end_to_end   collect + ingest.process + ingest.store, as a fetch job runs them
+  stats        dashboard queries (stats, ip-stats, host-stats, timeline, alert list)
+
+Reported per stage: rows/s (requests/s for stats), p50 / p99 latency per
+batch (per request) and peak RSS while it ran. --output writes the results
+as JSON. --baseline compares them with an earlier file and exits with 1 when
+a stage lost more than --tolerance of its throughput.
+
+Usage: python benchmarks/bench_pipeline.py [--rows 200000] [--hosts 4] [--batch 10000]
+           [--mix brute_force=0.3,benign=0.7] [--output results.json] [--baseline old.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+from journal import DEFAULT_MIX, parse_mix, write_journal  # noqa: E402
+
+STATS_URLS = ['/api/alerts/stats', '/api/alerts/ip-stats', '/api/alerts/host-stats',
+              '/api/alerts/timeline', '/api/alerts/?limit=50']
+
+
+def rss_bytes():
+    """Current resident set size (peak so far where /proc is missing)"""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Recorder:
+    """Latencies, row counts and peak RSS per stage; a sampler thread catches RSS peaks inside a stage"""
+
+    def __init__(self, interval=0.01):
+        self.latencies = defaultdict(list)
+        self.rows = defaultdict(int)
+        self.peak_rss = defaultdict(int)
+        self.stage = None
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, args=(interval,), daemon=True)
+        self._sampler.start()
+
+    def _sample(self, interval):
+        while not self._stop.wait(interval):
+            stage = self.stage
+            if stage:
+                self.peak_rss[stage] = max(self.peak_rss[stage], rss_bytes())
+
+    @contextlib.contextmanager
+    def measure(self, stage, rows):
+        self.stage = stage
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latencies[stage].append(time.perf_counter() - started)
+            self.rows[stage] += rows
+            self.peak_rss[stage] = max(self.peak_rss[stage], rss_bytes())
+            self.stage = None
+
+    def timed(self, stage, iterable, rows=len):
+        """Yields the items of an iterator, timing how long each one took to produce"""
+        iterator = iter(iterable)
+        while True:
+            self.stage = stage
+            started = time.perf_counter()
+            item = next(iterator, None)
+            if item is None:
+                self.stage = None
+                return
+            self.latencies[stage].append(time.perf_counter() - started)
+            self.rows[stage] += rows(item)
+            self.peak_rss[stage] = max(self.peak_rss[stage], rss_bytes())
+            self.stage = None
+            yield item
+
+    def close(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def results(self):
+        results = {}
+        for stage, latencies in self.latencies.items():
+            ordered = sorted(latencies)
+            seconds = sum(ordered)
+            results[stage] = {
+                'unit': 'requests' if stage == 'stats' else 'rows',
+                'rows': self.rows[stage],
+                'batches': len(ordered),
+                'seconds': round(seconds, 4),
+                'rows_per_s': round(self.rows[stage] / seconds, 1) if seconds else 0.0,
+                'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+                'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+                'peak_rss_mb': round(self.peak_rss[stage] / 2 ** 20, 1),
+            }
+        return results
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+
+class _Channel:
+    def __init__(self, fh):
+        self.fh = fh
+
+    def recv(self, size):
+        return self.fh.read(size)
+
+    def close(self):
+        self.fh.close()
+
+
+class _Stdout:
+    def __init__(self, path):
+        self.channel = _Channel(open(path, 'rb'))
+
+
+class LocalPool:
+    """Stand-in for core.ssh_pool: `journalctl` on a host streams that host's journal file"""
+
+    def __init__(self, journals):
+        self.journals = journals  # host name -> journal file
+
+    def exec_command(self, host, cmd, timeout=None):
+        return None, _Stdout(self.journals[host.name]), None
+
+    def discard(self, host):
+        pass
+
+
+def read_batches(path, batch):
+    """Lines of a journal file in lists of `batch`"""
+    lines = []
+    with open(path, 'rb') as fh:
+        for line in fh:
+            lines.append(line)
+            if len(lines) >= batch:
+                yield lines
+                lines = []
+    if lines:
+        yield lines
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SRC, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args, tmp):
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        'STORAGE_PATH': os.path.join(tmp, 'archives'),
+        'JOB_WORKERS': '0',
+        'FIREWALL_SYNC_INTERVAL': '0',
+    })
+    from app import create_app
+    from extensions import db
+    from models import Host
+    from core import ingest
+    from core.collector import LogCollector, json_loads
+    from core.data_manager import DataManager
+    from core.parser import LogParser
+
+    app = create_app()
+    app.config['LOGIN_DISABLED'] = True
+    storage = app.config['STORAGE_PATH']
+
+    with app.app_context():
+        db.create_all()
+        hosts = [Host(name=f"bench-{n}", ip_address='127.0.0.1') for n in range(args.hosts)]
+        # end_to_end stores its alerts under hosts of its own, so they are new alerts too
+        e2e_hosts = [Host(name=f"e2e-{n}", ip_address='127.0.0.1') for n in range(args.hosts)]
+        db.session.add_all(hosts + e2e_hosts)
+        db.session.commit()
+        hosts = [ingest.host_ref(h) for h in hosts]
+        e2e_hosts = [ingest.host_ref(h) for h in e2e_hosts]
+
+    journals = {}
+    rows_per_host = args.rows // args.hosts
+    for n, host in enumerate(hosts):
+        path = os.path.join(tmp, f"{host.name}.json")
+        write_journal(path, rows_per_host, host=host.name, seed=args.seed, mix=args.mix,
+                      fields=app.config['JOURNAL_FIELDS'])
+        journals[host.name] = journals[e2e_hosts[n].name] = path
+
+    recorder = Recorder()
+    collector = LogCollector.from_config(app.config, pool=LocalPool(journals))
+    events_total = alerts_total = 0
+    # Stage code prints a line per file / fetch, keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()), app.app_context():
+        for host in hosts:
+            for lines in read_batches(journals[host.name], args.batch):
+                with recorder.measure('decode', len(lines)):
+                    entries = [json_loads(line) for line in lines]
+                with recorder.measure('normalize', len(lines)):
+                    records = [collector._record(entry, line, host) for entry, line in zip(entries, lines)]
+                del entries
+                with recorder.measure('to_table', len(records)):
+                    table = DataManager.to_table(records)
+                del records
+                with recorder.measure('archive', table.num_rows):
+                    DataManager.save_logs(host.id, table, storage, DataManager.raw_mode())
+                with recorder.measure('parse', table.num_rows):
+                    events = LogParser(table).parse()
+                with recorder.measure('alerts', len(events)):
+                    alerts_total += ingest.insert_alerts(host.id, events)
+                    db.session.commit()
+                with recorder.measure('dedup', len(events)):
+                    ingest.insert_alerts(host.id, events)
+                    db.session.commit()
+                events_total += len(events)
+
+        for host in hosts:
+            for _ in recorder.timed('collect', collector.iter_logs(host, chunk_size=args.batch)):
+                pass
+
+        for host in e2e_hosts:
+            for chunk in collector.iter_logs(host, chunk_size=args.batch):
+                with recorder.measure('end_to_end', len(chunk)):
+                    ingest.store(ingest.process(host, chunk))
+
+        client = app.test_client()
+        for _ in range(args.queries):
+            for url in STATS_URLS:
+                with recorder.measure('stats', 1):
+                    response = client.get(url)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{url} answered {response.status_code}")
+    recorder.close()
+
+    order = ['decode', 'normalize', 'to_table', 'archive', 'parse', 'alerts', 'dedup',
+             'collect', 'end_to_end', 'stats']
+    stages = recorder.results()
+    return {
+        'meta': {
+            'benchmark': 'pipeline',
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'rows': rows_per_host * args.hosts,
+            'hosts': args.hosts,
+            'batch': args.batch,
+            'mix': args.mix,
+            'seed': args.seed,
+            'journal_fields': app.config['JOURNAL_FIELDS'] or '*',
+            'json_decoder': json_loads.__module__ or 'json',
+            'events': events_total,
+            'alerts': alerts_total,
+        },
+        'stages': {stage: stages[stage] for stage in order if stage in stages},
+    }
+
+
+def report(results):
+    meta = results['meta']
+    print(f"rows: {meta['rows']}  hosts: {meta['hosts']}  batch: {meta['batch']}  events: {meta['events']}  "
+          f"alerts: {meta['alerts']}  (cpus: {meta['cpus']}, revision: {meta['revision']}, "
+          f"decoder: {meta.get('json_decoder', 'json')})")
+    print(f"{'STAGE':<12} {'RATE':>14} {'P50':>11} {'P99':>11} {'PEAK RSS':>10}")
+    for stage, s in results['stages'].items():
+        unit = 'req/s' if s['unit'] == 'requests' else 'rows/s'
+        print(f"{stage:<12} {s['rows_per_s']:>9,.0f} {unit:<6}{s['p50_ms']:>8.2f} ms {s['p99_ms']:>8.2f} ms "
+              f"{s['peak_rss_mb']:>7.0f} MB")
+
+
+def compare(results, baseline, tolerance):
+    """Prints the throughput change per stage, returns the stages that regressed"""
+    print(f"\nvs baseline {baseline['meta'].get('revision')} ({baseline['meta'].get('created_at')}):")
+    regressed = []
+    for stage, s in results['stages'].items():
+        old = baseline['stages'].get(stage)
+        if not old or not old['rows_per_s']:
+            continue
+        change = s['rows_per_s'] / old['rows_per_s'] - 1
+        flag = ''
+        if change < -tolerance:
+            regressed.append(stage)
+            flag = '  REGRESSION'
+        print(f"{stage:<12} {change:>+8.1%}   p99 {old['p99_ms']:.2f} -> {s['p99_ms']:.2f} ms{flag}")
+    return regressed
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--rows', type=int, default=200_000, help='journal lines in total')
+    ap.add_argument('--hosts', type=int, default=4)
+    ap.add_argument('--batch', type=int, default=10_000, help='rows per batch / fetch chunk')
+    ap.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                    help='scenario=share,... (see benchmarks/journal.py)')
+    ap.add_argument('--queries', type=int, default=20, help='rounds of dashboard queries')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--output', help='write the results to this JSON file')
+    ap.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    ap.add_argument('--tolerance', type=float, default=0.10, help='allowed throughput loss vs baseline')
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench-pipeline-')
+    try:
+        results = run(args, tmp)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as fh:
+            regressed = compare(results, json.load(fh), args.tolerance)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+SQLite write benchmark: default settings vs tuning + write-behind buffer.
+
+Several writer threads store ingestion results (LogArchive + alerts + LogSource)
+concurrently, as parallel fetches and streams do, while one reader thread runs
+the dashboard queries. Reported: sustained alerts/s, store latency, reader
+queries/s and "database is locked" errors.
+
+"before"  SQLITE_TUNING=0, WRITE_BEHIND=0: every writer commits on its own
+"after"   WAL / synchronous=NORMAL / cache / mmap / busy_timeout, results
+          batched by the write-behind buffer
+
+Usage: python benchmarks/bench_sqlite.py [--seconds 10] [--writers 8] [--events 50]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+
+def make_result(ingest, host, seq, events, rnd):
+    """A FetchResult as ingest.process() would produce it, without SSH or Parquet"""
+    from core.data_manager import ArchiveFile
+    result = ingest.FetchResult(host)
+    base = datetime(2026, 1, 1) + timedelta(seconds=seq * events)
+    result.events = [{
+        'timestamp': base + timedelta(seconds=i, microseconds=rnd.randint(0, 999_999)),
+        'type': 'ssh_failed',
+        'severity': rnd.choice(['WARNING', 'CRITICAL']),
+        'source_ip': f"10.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}",
+        'target_user': rnd.choice(['root', 'admin', 'ubuntu', 'deploy']),
+        'message': 'Failed password',
+    } for i in range(events)]
+    result.logs_count = events
+    result.archives = [ArchiveFile(f"host_id={host.id}/date=2026-01-01/bench_{seq}.parquet", events, None)]
+    result.cursor = f"s=bench;i={seq:x}"
+    return result
+
+
+def run(label, tuned, seconds, writers, events):
+    tmp = tempfile.mkdtemp()
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        'STORAGE_PATH': os.path.join(tmp, 'archives'),
+        'SQLITE_TUNING': '1' if tuned else '0',
+        'WRITE_BEHIND': '1' if tuned else '0',
+        'CORRELATION_ENABLED': '0',
+        'JOB_WORKERS': '0',
+    })
+    from app import create_app
+    from extensions import db
+    from models import Host, Alert
+    from core import ingest, rollups
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        hosts = [Host(name=f"bench-{i}", ip_address='127.0.0.1') for i in range(writers)]
+        db.session.add_all(hosts)
+        db.session.commit()
+        refs = [ingest.host_ref(h) for h in hosts]
+
+    stop = threading.Event()
+    stats = {'alerts': 0, 'latencies': [], 'locked': 0, 'reads': 0}
+    lock = threading.Lock()
+
+    def writer(n):
+        rnd = random.Random(n)
+        seq = n * 1_000_000
+        while not stop.is_set():
+            result = make_result(ingest, refs[n], seq, events, rnd)
+            seq += 1
+            started = time.perf_counter()
+            try:
+                with app.app_context():
+                    count = ingest.submit(result).result() if tuned else ingest.store(result)
+            except Exception as e:
+                with lock:
+                    stats['locked'] += 'locked' in str(e)
+                continue
+            with lock:
+                stats['alerts'] += count
+                stats['latencies'].append(time.perf_counter() - started)
+
+    def reader():
+        while not stop.is_set():
+            try:
+                with app.app_context():
+                    Alert.query.order_by(Alert.timestamp.desc(), Alert.id.desc()).limit(50).all()
+                    rollups.read('severity')
+                with lock:
+                    stats['reads'] += 1
+            except Exception as e:
+                with lock:
+                    stats['locked'] += 'locked' in str(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    threads.append(threading.Thread(target=reader))
+    with contextlib.redirect_stdout(io.StringIO()):
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        ingest.drain()
+
+    latencies = sorted(stats['latencies']) or [0.0]
+    print(f"{label:<8} {stats['alerts'] / seconds:>10,.0f} alerts/s   "
+          f"store p50 {latencies[len(latencies) // 2] * 1000:>7.1f} ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:>7.1f} ms   "
+          f"reads {stats['reads'] / seconds:>7,.1f}/s   locked errors {stats['locked']}")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--seconds', type=float, default=10)
+    ap.add_argument('--writers', type=int, default=8)
+    ap.add_argument('--events', type=int, default=50, help='alerts per stored result')
+    args = ap.parse_args()
+
+    run('before', False, args.seconds, args.writers, args.events)
+    run('after', True, args.seconds, args.writers, args.events)
+
+
+if __name__ == '__main__':
+    main()
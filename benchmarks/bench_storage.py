@@ -0,0 +1,132 @@
+"""
+Archive storage benchmark: size and scan speed of the raw journal line layouts.
+
+The same synthetic journal (benchmarks/journal.py, complete entries unless
+--fields is given) is archived in files of --batch rows with each layout:
+
+  inline/snappy     raw JSON line in the file (ARCHIVE_RAW=inline, the default)
+  separate/snappy   raw JSON line in a sidecar file (ARCHIVE_RAW=separate)
+  columnar/zstd-1   raw line split into typed columns (ARCHIVE_RAW=columnar)
+  inline/zstd-6     inline after `flask compact` (one file, zstd level 6)
+  columnar/zstd-6   columnar after `flask compact`
+
+Reported per layout: bytes on disk and ratio to inline/snappy, write rows/s,
+scan rows/s of the detection columns (timestamp, message) and of whole rows
+with the raw line (rebuilt from the columns for columnar files). Columnar
+round trips are checked: every rebuilt line must parse to its original entry.
+
+Usage: python benchmarks/bench_storage.py [--rows 200000] [--batch 10000] [--fields MESSAGE,_PID]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import pyarrow as pa  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+from core.collector import LogCollector  # noqa: E402
+from core.compactor import ArchiveCompactor  # noqa: E402
+from core.data_manager import DataManager, COLUMNAR_WRITE_OPTIONS, WRITE_OPTIONS  # noqa: E402
+from journal import JournalGenerator  # noqa: E402
+
+HOST = 'bench-0'
+COMPACTED = ArchiveCompactor()
+COMPACT_OPTIONS = {'compression': COMPACTED.compression, 'compression_level': COMPACTED.compression_level,
+                   'row_group_size': COMPACTED.row_group_size, 'use_dictionary': True, 'write_statistics': True}
+# name: (ARCHIVE_RAW mode, write options, one file per batch?)
+LAYOUTS = {
+    'inline/snappy': ('inline', WRITE_OPTIONS, True),
+    'separate/snappy': ('separate', WRITE_OPTIONS, True),
+    'columnar/zstd-1': ('columnar', COLUMNAR_WRITE_OPTIONS, True),
+    'inline/zstd-6': ('inline', COMPACT_OPTIONS, False),
+    'columnar/zstd-6': ('columnar', COMPACT_OPTIONS, False),
+}
+
+
+class _Host:
+    id, name, ip_address = 1, HOST, '127.0.0.1'
+
+
+def journal_table(rows, fields):
+    """Archive table of `rows` synthetic journal entries, as the collector builds it"""
+    lines = [line.encode() for line in JournalGenerator(HOST).lines(rows, fields)]
+    return DataManager.to_table(LogCollector()._records(lines, _Host))
+
+
+def disk_bytes(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+
+
+def run_layout(table, directory, mode, options, per_batch, batch):
+    os.makedirs(directory)
+    parts = [table.slice(i, batch) for i in range(0, table.num_rows, batch)] if per_batch else [table]
+    paths = [os.path.join(directory, f"part-{i:05d}.parquet") for i in range(len(parts))]
+
+    start = time.perf_counter()
+    for part, path in zip(parts, paths):
+        DataManager.write_archive(part, path, mode, **options)
+    write_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for path in paths:
+        pq.read_table(path, columns=['timestamp', 'message'])
+    scan_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    read = [DataManager.read_archive(path) for path in paths]
+    full_s = time.perf_counter() - start
+
+    rows = table.num_rows
+    return {
+        'bytes': disk_bytes(directory),
+        'write_rows_per_s': rows / write_s,
+        'scan_rows_per_s': rows / scan_s,
+        'full_rows_per_s': rows / full_s,
+        'raw': pa.concat_tables(read)['raw'],
+    }
+
+
+def check_round_trip(original, rebuilt):
+    """Rebuilt lines must parse to the original entries"""
+    mismatches = sum(1 for a, b in zip(original.to_pylist(), rebuilt.to_pylist())
+                     if (a is None) != (b is None) or (a is not None and json.loads(a) != json.loads(b)))
+    return mismatches
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--rows', type=int, default=200_000)
+    ap.add_argument('--batch', type=int, default=10_000, help='rows per ingest file')
+    ap.add_argument('--fields', type=lambda text: [f for f in text.split(',') if f],
+                    help='journal fields, like JOURNAL_FIELDS (default: complete entries)')
+    args = ap.parse_args()
+
+    table = journal_table(args.rows, args.fields)
+    raw_bytes = sum(len(line.encode()) for line in table['raw'].to_pylist())
+    print(f"rows: {table.num_rows}  raw JSON: {raw_bytes / 1e6:.1f} MB "
+          f"({raw_bytes / table.num_rows:.0f} B/row)  fields: {','.join(args.fields) if args.fields else 'all'}")
+    print(f"{'LAYOUT':<16} {'SIZE':>9} {'RATIO':>6} {'B/ROW':>6} {'WRITE':>12} {'SCAN':>13} {'FULL READ':>13}")
+
+    tmp = tempfile.mkdtemp(prefix='bench-storage-')
+    try:
+        baseline = None
+        for name, (mode, options, per_batch) in LAYOUTS.items():
+            result = run_layout(table, os.path.join(tmp, name.replace('/', '-')), mode, options, per_batch, args.batch)
+            baseline = baseline or result['bytes']
+            note = ''
+            if mode == 'columnar':
+                mismatches = check_round_trip(table['raw'], result['raw'])
+                note = '  round trip ok' if not mismatches else f"  {mismatches} LINES DIFFER"
+            print(f"{name:<16} {result['bytes'] / 1e6:>6.1f} MB {baseline / result['bytes']:>5.1f}x "
+                  f"{result['bytes'] / table.num_rows:>6.0f} {result['write_rows_per_s']:>7,.0f} r/s "
+                  f"{result['scan_rows_per_s']:>8,.0f} r/s {result['full_rows_per_s']:>8,.0f} r/s{note}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
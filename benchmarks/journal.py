@@ -0,0 +1,219 @@
+"""
+Synthetic sshd journal: `journalctl --output json` lines as the collector
+receives them, with a configurable mix of normal traffic and attacks.
+
+Scenarios (each emits a burst of related lines):
+  benign       session open/close, accepted logins, disconnects
+  noise        scanners: preauth disconnects, failed key exchange
+  brute_force  one IP, one user (mostly root), many failed passwords
+  spray        one IP, many invalid users
+  distributed  many IPs, one user
+  sudo         failed sudo attempts and users outside sudoers
+
+Usage: python benchmarks/journal.py [--rows 100000] [--hosts 2] [--mix brute_force=0.4,benign=0.6]
+           [--fields MESSAGE,__CURSOR] [-o FILE]
+"""
+import argparse
+import json
+import random
+import sys
+import uuid
+
+SCENARIOS = ('benign', 'noise', 'brute_force', 'spray', 'distributed', 'sudo')
+# Share of lines per scenario
+DEFAULT_MIX = {'benign': 0.45, 'noise': 0.2, 'brute_force': 0.2, 'spray': 0.08, 'distributed': 0.05, 'sudo': 0.02}
+# Average burst length per scenario, to turn line shares into burst probabilities
+BURST_LENGTH = {'benign': 4, 'noise': 2, 'brute_force': 30, 'spray': 24, 'distributed': 20, 'sudo': 3}
+
+USERS = ['ubuntu', 'deploy', 'alice', 'bob', 'ci', 'backup']
+ATTACKED_USERS = ['root', 'admin', 'oracle', 'test', 'postgres', 'git', 'user', 'ftp', 'pi', 'guest', 'support']
+
+
+def parse_mix(text):
+    """'brute_force=0.4,benign=0.6' -> {'brute_force': 0.4, 'benign': 0.6}"""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"unknown scenario '{name}' (expected one of {', '.join(SCENARIOS)})")
+        mix[name] = float(weight)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError('the mix needs at least one scenario with a positive weight')
+    return mix
+
+
+class JournalGenerator:
+    """
+    Journal entries of one host, deterministic for a given seed. Entries
+    carry the fields journald really attaches to sshd messages, so lines
+    have a realistic size (~1 KiB) and decode cost.
+    """
+
+    def __init__(self, host='bench-0', seed=0, start=1_767_225_600.0, rate=50.0, mix=None):
+        self.host = host
+        self.rnd = random.Random(f"{host}:{seed}")
+        self.now = start
+        self.rate = rate  # lines per second
+        mix = mix or DEFAULT_MIX
+        total = sum(mix.values())
+        weights = {name: weight / total / BURST_LENGTH[name] for name, weight in mix.items() if weight > 0}
+        self.scenarios = list(weights)
+        self.weights = list(weights.values())
+        self.boot_id = uuid.UUID(int=self.rnd.getrandbits(128)).hex
+        self.machine_id = uuid.UUID(int=self.rnd.getrandbits(128)).hex
+        self.seqnum_id = uuid.UUID(int=self.rnd.getrandbits(128)).hex
+        self.seqnum = 0
+        self.pid = 1000
+
+    def _ip(self):
+        rnd = self.rnd
+        return f"{rnd.randint(1, 223)}.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}"
+
+    def _port(self):
+        return self.rnd.randint(1024, 65535)
+
+    def _entry(self, message, identifier='sshd'):
+        self.seqnum += 1
+        self.now += self.rnd.expovariate(self.rate)
+        realtime = int(self.now * 1e6)
+        monotonic = realtime - 1_767_000_000_000_000
+        cursor = (f"s={self.seqnum_id};i={self.seqnum:x};b={self.boot_id};m={monotonic:x};"
+                  f"t={realtime:x};x={self.rnd.getrandbits(64):016x}")
+        entry = {
+            '__CURSOR': cursor,
+            '__REALTIME_TIMESTAMP': str(realtime),
+            '__MONOTONIC_TIMESTAMP': str(monotonic),
+            '_BOOT_ID': self.boot_id,
+            'PRIORITY': '6' if identifier == 'sshd' else '5',
+            'SYSLOG_FACILITY': '4' if identifier == 'sshd' else '10',
+            'SYSLOG_IDENTIFIER': identifier,
+            '_PID': str(self.pid),
+            '_UID': '0',
+            '_GID': '0',
+            '_COMM': identifier,
+            '_EXE': f"/usr/sbin/{identifier}" if identifier == 'sshd' else '/usr/bin/sudo',
+            '_CMDLINE': 'sshd: unknown [priv]' if identifier == 'sshd' else 'sudo -i',
+            '_CAP_EFFECTIVE': '1ffffffffff',
+            '_TRANSPORT': 'syslog',
+            '_HOSTNAME': self.host,
+            '_MACHINE_ID': self.machine_id,
+            'SYSLOG_TIMESTAMP': 'Jan  1 00:00:00 ',
+            'MESSAGE': message,
+            '_SOURCE_REALTIME_TIMESTAMP': str(realtime - self.rnd.randint(5, 200)),
+        }
+        if identifier == 'sshd':
+            entry.update({
+                '_SYSTEMD_CGROUP': '/system.slice/ssh.service',
+                '_SYSTEMD_UNIT': 'ssh.service',
+                '_SYSTEMD_SLICE': 'system.slice',
+                '_SYSTEMD_INVOCATION_ID': self.boot_id[::-1],
+            })
+        return entry
+
+    def _burst(self, scenario):
+        rnd = self.rnd
+        self.pid += rnd.randint(1, 40)
+        if scenario == 'benign':
+            user, ip, port = rnd.choice(USERS), self._ip(), self._port()
+            method = rnd.choice(['publickey', 'publickey', 'password'])
+            yield f"Accepted {method} for {user} from {ip} port {port} ssh2" + (
+                ": ED25519 SHA256:" + uuid.UUID(int=rnd.getrandbits(128)).hex if method == 'publickey' else '')
+            yield f"pam_unix(sshd:session): session opened for user {user}(uid=1000) by (uid=0)"
+            yield f"Received disconnect from {ip} port {port}:11: disconnected by user"
+            yield f"pam_unix(sshd:session): session closed for user {user}"
+        elif scenario == 'noise':
+            ip, port = self._ip(), self._port()
+            yield rnd.choice([
+                f"Connection closed by {ip} port {port} [preauth]",
+                f"Unable to negotiate with {ip} port {port}: no matching key exchange method found.",
+                "error: kex_exchange_identification: Connection closed by remote host",
+                f"Disconnected from {ip} port {port} [preauth]",
+            ])
+            yield f"Connection reset by {ip} port {port} [preauth]"
+        elif scenario == 'brute_force':
+            ip = self._ip()
+            user = 'root' if rnd.random() < 0.7 else rnd.choice(ATTACKED_USERS)
+            for _ in range(rnd.randint(10, 50)):
+                port = self._port()
+                yield f"Failed password for {user} from {ip} port {port} ssh2"
+                if rnd.random() < 0.2:
+                    yield f"Connection closed by authenticating user {user} {ip} port {port} [preauth]"
+            yield f"error: maximum authentication attempts exceeded for {user} from {ip} port {self._port()} ssh2 [preauth]"
+        elif scenario == 'spray':
+            ip = self._ip()
+            for user in rnd.sample(ATTACKED_USERS, rnd.randint(6, len(ATTACKED_USERS))):
+                port = self._port()
+                yield f"Invalid user {user} from {ip} port {port}"
+                yield f"Failed password for invalid user {user} from {ip} port {port} ssh2"
+        elif scenario == 'distributed':
+            user = rnd.choice(ATTACKED_USERS)
+            for _ in range(rnd.randint(12, 28)):
+                yield f"Failed password for {user} from {self._ip()} port {self._port()} ssh2"
+        elif scenario == 'sudo':
+            user = rnd.choice(USERS)
+            yield ('sudo', f"pam_unix(sudo:auth): authentication failure; logname={user} uid=1000 euid=0 "
+                           f"tty=/dev/pts/0 ruser={user} rhost=  user={user}")
+            yield ('sudo', f"{user} : {rnd.randint(1, 3)} incorrect password attempts ; TTY=pts/0 ; "
+                           f"PWD=/home/{user} ; USER=root ; COMMAND=/bin/bash")
+            if rnd.random() < 0.5:
+                yield ('sudo', f"{user} : user NOT in sudoers ; TTY=pts/0 ; PWD=/home/{user} ; USER=root ; "
+                               f"COMMAND=/usr/bin/cat /etc/shadow")
+
+    def entries(self, rows):
+        """`rows` journal entries (dicts), in time order"""
+        produced = 0
+        while produced < rows:
+            scenario = self.rnd.choices(self.scenarios, self.weights)[0]
+            for message in self._burst(scenario):
+                identifier = 'sshd'
+                if isinstance(message, tuple):
+                    identifier, message = message
+                yield self._entry(message, identifier)
+                produced += 1
+                if produced >= rows:
+                    return
+
+    def lines(self, rows, fields=None):
+        """
+        `rows` journal lines as `journalctl --output json` prints them; with
+        `fields` only those (and the cursor and timestamps), like --output-fields
+        """
+        keep = set(fields) | {'__CURSOR', '__REALTIME_TIMESTAMP', '__MONOTONIC_TIMESTAMP', '_BOOT_ID'} if fields else None
+        for entry in self.entries(rows):
+            if keep:
+                entry = {key: value for key, value in entry.items() if key in keep}
+            yield json.dumps(entry, separators=(',', ':')) + '\n'
+
+
+def write_journal(path, rows, host='bench-0', seed=0, mix=None, rate=50.0, fields=None):
+    """Writes `rows` lines of one host's journal to a file, returns its size in bytes"""
+    with open(path, 'w', encoding='utf-8') as fh:
+        for line in JournalGenerator(host, seed=seed, mix=mix, rate=rate).lines(rows, fields):
+            fh.write(line)
+        return fh.tell()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--rows', type=int, default=100_000, help='lines per host')
+    ap.add_argument('--hosts', type=int, default=1)
+    ap.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='scenario=share,... (default: %(default)s)')
+    ap.add_argument('--rate', type=float, default=50.0, help='lines per second and host (timestamps)')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--fields', type=lambda text: [f for f in text.split(',') if f],
+                    help='only these fields, like journalctl --output-fields (default: all)')
+    ap.add_argument('-o', '--output', help='file to write (default: stdout)')
+    args = ap.parse_args()
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for n in range(args.hosts):
+            for line in JournalGenerator(f"bench-{n}", seed=args.seed, mix=args.mix, rate=args.rate).lines(args.rows, args.fields):
+                out.write(line)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,51 +1,191 @@
-from flask import Blueprint, jsonify
+import base64
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import Blueprint, jsonify, current_app, request, Response
 from flask_login import login_required
-from models import Alert, Host
+from sqlalchemy.orm import joinedload
+from models import Alert, AlertRollup, Host, SEVERITY_BY_RANK
 from extensions import db
+from core import rollups, hub
 
 alerts_bp = Blueprint('alerts_api', __name__, url_prefix='/api/alerts')
 
+# Short-lived response cache shared by all dashboard tabs (ALERT_STATS_TTL seconds, 0 = off)
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def cached(key, build):
+    ttl = current_app.config.get('ALERT_STATS_TTL', 0)
+    if not ttl:
+        return build()
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and now - hit[0] < ttl:
+            return hit[1]
+    value = build()
+    with _cache_lock:
+        _cache[key] = (now, value)
+    return value
+
+
 @alerts_bp.route('/stats', methods=['GET'])
 @login_required
 def get_alert_stats():
     """Retrieves alert statistics grouped by severity"""
-    stats_raw = db.session.query(Alert.severity, db.func.count(Alert.id)).group_by(Alert.severity).all()
-    
-    result = {'CRITICAL': 0, 'WARNING': 0, 'INFO': 0}
-    
-    for sev, count in stats_raw:
-        if sev in result:
-            result[sev] = count
-            
-    return jsonify(result)
+    return jsonify(cached('stats', hub.severity_counts))
 
 @alerts_bp.route('/recent', methods=['GET'])
 @login_required
 def get_recent_alerts():
     """Retrieves a list of all alerts for the table"""
-    alerts = Alert.query.order_by(Alert.timestamp.desc()).limit(50).all()
-    return jsonify([{
-        'timestamp': a.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-        'severity': a.severity,
-        'host': a.host.name if a.host else 'Unknown',
-        'message': a.message
-    } for a in alerts])
+    alerts = Alert.query.options(joinedload(Alert.host)).order_by(
+        Alert.timestamp.desc(), Alert.id.desc()
+    ).limit(50).all()
+    return jsonify([hub.alert_json(a) for a in alerts])
+
+
+@alerts_bp.route('/stream', methods=['GET'])
+@login_required
+def stream_alerts():
+    """
+    Server-sent events: 'alert' for every new alert, 'stats' with the
+    updated severity counters, 'resync' when this client fell behind and
+    should reload /recent and /stats.
+    """
+    feed = hub.start_feed(current_app._get_current_object())
+    subscription = hub.hub.subscribe()
+    snapshot = hub.severity_counts()
+    keepalive = current_app.config['ALERT_STREAM_KEEPALIVE']
+
+    def events():
+        try:
+            yield f"retry: 3000\nevent: stats\ndata: {json.dumps(snapshot)}\n\n"
+            feed.notify()
+            while True:
+                messages = subscription.get(timeout=keepalive)
+                if not messages:
+                    yield ": keepalive\n\n"  # also detects closed connections
+                for event, data in messages:
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            hub.hub.unsubscribe(subscription)
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # no proxy buffering
+    })
+
+
+def encode_cursor(alert):
+    """Opaque page cursor: position of the last alert in (timestamp, id) order"""
+    raw = f"{alert.timestamp.isoformat()}|{alert.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    timestamp, alert_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(timestamp), int(alert_id)
+
+
+@alerts_bp.route('/', methods=['GET'])
+@login_required
+def list_alerts():
+    """
+    Alert listing with keyset pagination, newest first.
+    Filters: host_id, severity (comma separated), source_ip, resolved (true/false),
+    since / until (ISO timestamps, UTC). Paging: limit (max 500) and cursor
+    (the next_cursor of the previous page).
+    """
+    args = request.args
+    limit = max(1, min(args.get('limit', 50, type=int), 500))
+
+    query = Alert.query.options(joinedload(Alert.host))
+    try:
+        if args.get('host_id'):
+            query = query.filter(Alert.host_id == int(args['host_id']))
+        if args.get('severity'):
+            query = query.filter(Alert.severity.in_(args['severity'].upper().split(',')))
+        if args.get('source_ip'):
+            query = query.filter(Alert.source_ip == args['source_ip'])
+        if args.get('resolved'):
+            query = query.filter(Alert.is_resolved == (args['resolved'].lower() in ('1', 'true', 'yes')))
+        if args.get('since'):
+            query = query.filter(Alert.timestamp >= datetime.fromisoformat(args['since']))
+        if args.get('until'):
+            query = query.filter(Alert.timestamp <= datetime.fromisoformat(args['until']))
+        if args.get('cursor'):
+            # Seek past the previous page instead of OFFSET: constant cost per page
+            query = query.filter(db.tuple_(Alert.timestamp, Alert.id) < decode_cursor(args['cursor']))
+    except ValueError:
+        return jsonify({'error': 'Invalid filter or cursor'}), 400
+
+    # One extra row tells whether another page exists
+    alerts = query.order_by(Alert.timestamp.desc(), Alert.id.desc()).limit(limit + 1).all()
+    page = alerts[:limit]
+
+    return jsonify({
+        'items': [{
+            'id': a.id,
+            'timestamp': a.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            'severity': a.severity,
+            'host_id': a.host_id,
+            'host': a.host.name if a.host else 'Unknown',
+            'source_ip': a.source_ip,
+            'target_user': a.target_user,
+            'message': a.message,
+            'is_resolved': a.is_resolved
+        } for a in page],
+        'next_cursor': encode_cursor(page[-1]) if len(alerts) > limit else None
+    })
 
 @alerts_bp.route('/ip-stats', methods=['GET'])
 @login_required
 def get_ip_threats():
     """Returns IP addresses with more than 10 alerts"""
-    from sqlalchemy import func
-    
-    # Query to find IPs with more than 10 alerts
-    results = db.session.query(
-        Alert.source_ip, 
-        func.count(Alert.id).label('total'),
-        func.max(Alert.severity).label('max_severity')
-    ).group_by(Alert.source_ip).having(func.count(Alert.id) > 10).all()
-
-    return jsonify([{
-        'ip': r.source_ip,
-        'count': r.total,
-        'severity': r.max_severity
-    } for r in results])
\ No newline at end of file
+    def build():
+        return [{
+            'ip': r.key,
+            'count': r.count,
+            'severity': SEVERITY_BY_RANK.get(r.max_severity_rank, 'INFO')
+        } for r in rollups.read('source_ip', min_count=10)]
+
+    return jsonify(cached('ip-stats', build))
+
+@alerts_bp.route('/host-stats', methods=['GET'])
+@login_required
+def get_host_stats():
+    """Alert count and highest severity per host"""
+    def build():
+        names = dict(db.session.query(Host.id, Host.name).all())
+        return [{
+            'host_id': int(r.key),
+            'host': names.get(int(r.key), 'Unknown'),
+            'count': r.count,
+            'severity': SEVERITY_BY_RANK.get(r.max_severity_rank, 'INFO')
+        } for r in rollups.read('host')]
+
+    return jsonify(cached('host-stats', build))
+
+@alerts_bp.route('/timeline', methods=['GET'])
+@login_required
+def get_alert_timeline():
+    """Alert count per hour bucket for the last ?hours= hours (default 168)"""
+    hours = request.args.get('hours', 168, type=int)
+
+    def build():
+        since = rollups.hour_bucket(datetime.utcnow() - timedelta(hours=hours))
+        rows = AlertRollup.query.filter(
+            AlertRollup.dimension == 'hour',
+            AlertRollup.key >= since
+        ).order_by(AlertRollup.key).all()
+        return [{
+            'hour': r.key,
+            'count': r.count,
+            'severity': SEVERITY_BY_RANK.get(r.max_severity_rank, 'INFO')
+        } for r in rows]
+
+    return jsonify(cached(f'timeline:{hours}', build))
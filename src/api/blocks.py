@@ -0,0 +1,95 @@
+from flask import Blueprint, jsonify, request
+from flask_login import login_required
+from extensions import db
+from models import FirewallBlock, Host
+from core import jobs, response
+from api.hosts import job_accepted
+
+# API Blueprint for firewall blocks across hosts (see core/response.py)
+blocks_bp = Blueprint('blocks_api', __name__, url_prefix='/api/blocks')
+
+
+def block_json(block, names):
+    return {
+        'id': block.id,
+        'host_id': block.host_id,
+        'host': names.get(block.host_id, 'Unknown'),
+        'ip': block.ip_address,
+        'status': block.status,  # pending, applied, failed, removed
+        'expires_at': block.expires_at.isoformat() if block.expires_at else None,
+        'applied_at': block.applied_at.isoformat() if block.applied_at else None,
+        'error': block.error
+    }
+
+
+def parse_request():
+    """{"ips": [...], "host_ids": [...] (default: all hosts), "ttl": seconds} -> (ips, host_ids, ttl)"""
+    data = request.get_json(silent=True) or {}
+    ips = data.get('ips')
+    host_ids = data.get('host_ids')
+    if not ips or not isinstance(ips, list) or not all(isinstance(ip, str) for ip in ips):
+        raise ValueError('ips must be a non-empty list of addresses')
+    if host_ids is not None:
+        if not isinstance(host_ids, list):
+            raise ValueError('host_ids must be a list')
+        known = {h for h, in db.session.query(Host.id).filter(Host.id.in_(host_ids)).all()}
+        if known != set(host_ids):
+            raise ValueError(f"unknown host ids: {sorted(set(host_ids) - known)}")
+    return ips, host_ids, data.get('ttl')
+
+
+@blocks_bp.route('', methods=['GET'])
+@blocks_bp.route('/', methods=['GET'])
+@login_required
+def get_blocks():
+    """Firewall blocks, newest first. Filters: host_id, ip, status (default: all but removed), limit."""
+    args = request.args
+    limit = max(1, min(args.get('limit', 500, type=int), 5000))
+    query = FirewallBlock.query
+    if args.get('host_id', type=int) is not None:
+        query = query.filter(FirewallBlock.host_id == args.get('host_id', type=int))
+    if args.get('ip'):
+        query = query.filter(FirewallBlock.ip_address == args['ip'])
+    if args.get('status'):
+        query = query.filter(FirewallBlock.status == args['status'])
+    else:
+        query = query.filter(FirewallBlock.status != 'removed')
+    blocks = query.order_by(FirewallBlock.id.desc()).limit(limit).all()
+    names = dict(db.session.query(Host.id, Host.name).all())
+    return jsonify([block_json(block, names) for block in blocks])
+
+
+@blocks_bp.route('', methods=['POST'])
+@blocks_bp.route('/', methods=['POST'])
+@login_required
+def create_blocks():
+    """
+    Blocks many addresses on many hosts at once. The blocks are recorded
+    and one firewall sync job pushes them, one SSH command per host;
+    returns that job (202, poll /api/jobs/<id>).
+    """
+    try:
+        ips, host_ids, ttl = parse_request()
+        response.request_blocks(ips, host_ids=host_ids, ttl=ttl)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
+
+    job, created = jobs.enqueue('firewall_sync', dedup_key='firewall_sync')
+    return job_accepted(job, created)
+
+
+@blocks_bp.route('', methods=['DELETE'])
+@blocks_bp.route('/', methods=['DELETE'])
+@login_required
+def delete_blocks():
+    """Unblocks addresses ({"ips": [...], "host_ids": [...]}), returns the sync job removing them"""
+    try:
+        ips, host_ids, _ = parse_request()
+        response.request_unblocks(ips, host_ids=host_ids)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
+
+    job, created = jobs.enqueue('firewall_sync', dedup_key='firewall_sync')
+    return job_accepted(job, created)
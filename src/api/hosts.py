@@ -1,15 +1,9 @@
-from flask import Blueprint, request, jsonify, current_app
-from flask_login import login_required, current_user
-from core import collector
+from flask import Blueprint, request, jsonify, url_for
+from flask_login import login_required
+from core import ingest, jobs, response, sources
+from core.rules import default_ruleset
 from extensions import db
-from models import Host, LogSource, LogArchive, Alert
-from datetime import datetime
-
-from core.collector import LogCollector
-from core.data_manager import DataManager
-from core.parser import LogParser
-
-import os
+from models import Host, LogSource
 
 # API Blueprint for Host Management
 hosts_bp = Blueprint('hosts_api', __name__, url_prefix='/api/hosts')
@@ -67,105 +61,107 @@ def delete_host(host_id):
     db.session.commit()
     return jsonify({'message': 'Host deleted successfully'}), 200
 
+def source_json(ref):
+    return {
+        'id': ref.id,
+        'name': ref.name,
+        'units': list(ref.units),
+        'matches': list(ref.matches),
+        'path': ref.path,
+        'rules': list(ref.rules) if ref.rules else None,
+        'cursor': ref.cursor
+    }
+
+def list_param(value):
+    """JSON list or comma separated string -> comma separated string"""
+    if isinstance(value, (list, tuple)):
+        return ','.join(str(item) for item in value)
+    return str(value or '')
+
+@hosts_bp.route('/<int:host_id>/sources', methods=['GET'])
+@login_required
+def get_sources(host_id):
+    """Log sources of the host (the default ssh.service one when none are defined)"""
+    if not db.session.get(Host, host_id):
+        return jsonify({'error': 'Host not found'}), 404
+    return jsonify([source_json(ref) for ref in ingest.host_sources([host_id])[host_id]]), 200
+
+@hosts_bp.route('/<int:host_id>/sources', methods=['POST'])
+@login_required
+def add_source(host_id):
+    """
+    Adds a log source: journal `units` and/or `matches` (FIELD=value), or a
+    log file `path`, plus the rule packs (`rules`, default: all) its entries
+    are parsed with. Fetched with the host's other sources from the next
+    fetch on; new journal sources start at the host's journal cursor.
+    """
+    if not db.session.get(Host, host_id):
+        return jsonify({'error': 'Host not found'}), 404
+    data = request.get_json() or {}
+
+    log_source = LogSource(
+        host_id=host_id,
+        log_type=str(data.get('name') or ''),
+        units=list_param(data.get('units')) or None,
+        matches=list_param(data.get('matches')) or None,
+        path=data.get('path') or None,
+        rules=list_param(data.get('rules')) or None
+    )
+    ref = sources.SourceRef(None, log_source.log_type, sources.split_list(log_source.units),
+                            sources.split_list(log_source.matches), log_source.path,
+                            sources.split_list(log_source.rules) or None, None)
+    try:
+        sources.validate(ref, default_ruleset().packs)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if LogSource.query.filter_by(host_id=host_id, log_type=ref.name).first():
+        return jsonify({'error': 'Source with this name already exists'}), 409
+
+    if ref.name != sources.DEFAULT_SOURCE.name and not LogSource.query.filter_by(host_id=host_id).first():
+        # The implicit ssh.service source keeps being fetched next to the new one
+        db.session.add(LogSource(host_id=host_id, log_type=sources.DEFAULT_SOURCE.name,
+                                 units=','.join(sources.DEFAULT_SOURCE.units)))
+    db.session.add(log_source)
+    db.session.commit()
+    return jsonify({'message': 'Source added successfully', 'id': log_source.id}), 201
+
+@hosts_bp.route('/<int:host_id>/sources/<int:source_id>', methods=['DELETE'])
+@login_required
+def delete_source(host_id, source_id):
+    """Stops fetching a log source; its archived logs and alerts stay"""
+    log_source = db.session.get(LogSource, source_id)
+    if not log_source or log_source.host_id != host_id:
+        return jsonify({'error': 'Source not found'}), 404
+    db.session.delete(log_source)
+    db.session.commit()
+    return jsonify({'message': 'Source deleted successfully'}), 200
+
 ###
 
 @hosts_bp.route('/<int:host_id>/fetch', methods=['POST'])
 @login_required
 def fetch_logs_endpoint(host_id):
     """
-    Endpoint to fetch logs from a host, save them, and update state.:
-    1. Check state (LogSource)
-    2. Fetch (SSH)
-    3. Save (Parquet)
-    4. Update state
+    Queues a log fetch for the host and returns the job right away.
+    The job worker does: 1. Fetch (SSH), 2. Parse + Save (Parquet),
+    3. Store alerts and update state (LogSource); poll /api/jobs/<id>.
+    A fetch already queued or running for the host is returned instead of a new one.
     """
     host = db.session.get(Host, host_id)
     if not host:
         return jsonify({'error': 'Host not found'}), 404
 
-    # Managing state (LogSource)
-    log_source = LogSource.query.filter_by(host_id=host.id).first()
-    if not log_source:
-        # Create initial LogSource record
-        log_source = LogSource(host_id=host.id, log_type='ssh', last_fetch=None)
-        db.session.add(log_source)
-    
-    # Fetching logs (SSH)
-    collector = LogCollector()
-    logs = collector.fetch_logs(host, last_fetch_time=None) 
-    print(f"DEBUG: Pobranych znaków logu: {len(logs) if logs else 0}")
-
-    if not logs:
-        return jsonify({'message': 'No new logs found', 'count': 0})
-
-    # Saving logs (Parquet)
-    filename = DataManager.save_logs(host.id, logs)
-    
-    if filename:
-        # Record in LogArchive
-        archive = LogArchive(host_id=host.id, filename=filename, record_count=len(logs))
-        db.session.add(archive)
-        
-        # Parsing logs for security events
-        storage_path = current_app.config.get('STORAGE_PATH', './data/archives')
-        full_path = os.path.join(storage_path, filename)
-        parser = LogParser(full_path)
-        events = parser.parse()
-        
-        alerts_count = 0
-        # Generating alerts based on parsed events
-        for event in events:
-
-            existing_alert = Alert.query.filter_by(
-                host_id=host.id,
-                timestamp=event['timestamp'],
-                source_ip=event['source_ip'],
-                target_user=event['target_user']
-            ).first()
-
-            if existing_alert:
-                continue  # Skip duplicate alert
-
-            # Default -> INFO
-            severity_level = event['severity']
-            msg_content = f"Correct login -> user: {event['target_user']} IP: {event['source_ip']}"
-
-            if severity_level == 'CRITICAL':
-                msg_content = f"ALERT KRYTYCZNY: Próba włamania na ROOT z {event['source_ip']}"
-            elif severity_level == 'WARNING':
-                msg_content = f"Uwaga: Błędne logowanie użytkownika {event['target_user']} z {event['source_ip']}"
-            else:
-                msg_content = f"Logowanie: {event['target_user']} z {event['source_ip']}"
-            # create Alert record
-            new_alert = Alert(
-                host_id=host.id,
-                severity=severity_level,
-                source_ip=event['source_ip'],
-                target_user=event['target_user'],
-                message=msg_content,
-                timestamp=event['timestamp'],
-                is_resolved=(severity_level == 'INFO')
-            )
-            
-            db.session.add(new_alert)
-            alerts_count += 1
-        
-        # Updating state
-        log_source.last_fetch = datetime.utcnow()
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Success', 
-            'count': len(logs), 
-            'file': filename,
-            'alerts_generated': alerts_count  # Info about generated alerts
-        }), 200
-    
-    return jsonify({'error': 'Failed to save logs'}), 500
+    job, created = jobs.enqueue('fetch', host_id=host.id, dedup_key=f"fetch:{host.id}")
+    return job_accepted(job, created)
 
 @hosts_bp.route('/<int:host_id>/block-ip', methods=['POST'])
 @login_required
 def block_ip(host_id):
+    """
+    Blocks an IP on the host's firewall (optional "ttl" in seconds) and
+    returns the firewall sync job (see fetch). See /api/blocks for many
+    addresses and hosts at once.
+    """
     data = request.get_json()
     ip_to_block = data.get('ip')
     host = db.session.get(Host, host_id)
@@ -173,22 +169,17 @@ def block_ip(host_id):
     if not ip_to_block or not host:
         return jsonify({'error': 'Błędne dane'}), 400
 
-    block_cmd = f"sudo iptables -I INPUT -s {ip_to_block} -j DROP"
-    
-    collector = LogCollector()
-
+    # The address ends up in a remote shell command
     try:
-        import subprocess
-        key_path = "/root/.ssh/id_rsa_siem"
-        ssh_cmd = [
-            "ssh", "-i", key_path,
-            "-o", "ProxyCommand=cloudflared access ssh --hostname %h",
-            "-o", "StrictHostKeyChecking=no",
-            f"mikolaj_mazur05@{host.ip_address}",
-            block_cmd
-        ]
-        subprocess.run(ssh_cmd, check=True)
-        
-        return jsonify({'message': f'Adres {ip_to_block} został zablokowany!'}), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        response.request_blocks([ip_to_block], host_ids=[host.id], ttl=data.get('ttl'))
+    except ValueError:
+        return jsonify({'error': 'Błędne dane'}), 400
+    db.session.commit()
+
+    job, created = jobs.enqueue('firewall_sync', dedup_key='firewall_sync')
+    return job_accepted(job, created)
+
+def job_accepted(job, created):
+    reply = jsonify({'job_id': job.id, 'status': job.status, 'deduplicated': not created})
+    reply.headers['Location'] = url_for('jobs_api.get_job', job_id=job.id)
+    return reply, 202
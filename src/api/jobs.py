@@ -0,0 +1,33 @@
+from flask import Blueprint, jsonify
+from flask_login import login_required
+from extensions import db
+from models import Job
+
+# API Blueprint for queued jobs (fetch, block-ip)
+jobs_bp = Blueprint('jobs_api', __name__, url_prefix='/api/jobs')
+
+
+def job_json(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'host_id': job.host_id,
+        'status': job.status,  # queued, running, done, failed
+        'progress': job.progress,
+        'stage': job.stage,
+        'result': job.result,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    """Status, progress and result of a job"""
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_json(job)), 200
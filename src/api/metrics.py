@@ -0,0 +1,25 @@
+import hmac
+from flask import Blueprint, Response, current_app, request
+from flask_login import current_user
+from core.metrics import REGISTRY
+
+# Prometheus scrape endpoint (see core/metrics.py)
+metrics_bp = Blueprint('metrics', __name__)
+
+
+def authorized():
+    """A logged-in session, or `Authorization: Bearer <METRICS_TOKEN>` for the scraper"""
+    if current_app.config.get('LOGIN_DISABLED') or current_user.is_authenticated:
+        return True
+    token = current_app.config.get('METRICS_TOKEN')
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header.encode(), f"Bearer {token}".encode())
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Counters and histograms of this process and of the job workers, Prometheus text format"""
+    if not authorized():
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    snapshots = REGISTRY.load_snapshots(current_app.config['METRICS_DIR'])
+    return Response(REGISTRY.render(snapshots), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,92 @@
+import os
+from datetime import datetime, timezone
+from flask import Blueprint, jsonify, request
+from flask_login import login_required
+import pyarrow.compute as pc
+from models import LogArchive, ArchiveIndex, Host
+from extensions import db
+from core import archive_index
+from core.data_manager import DataManager
+
+# API Blueprint for forensic search over the Parquet archive
+search_bp = Blueprint('search_api', __name__, url_prefix='/api/search')
+
+
+def parse_time(value):
+    """ISO timestamp (naive = UTC) -> epoch seconds"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+@search_bp.route('', methods=['GET'])
+@search_bp.route('/', methods=['GET'])
+@login_required
+def search_archive():
+    """
+    Archived log lines mentioning an IP and/or a user, across all hosts.
+    Filters: ip, user (at least one; both = lines with both), host_id,
+    since / until (ISO timestamps, UTC), limit (max 1000).
+    Files are pruned with their ArchiveIndex (time range, Bloom filter)
+    and only the ones that can match are read.
+    """
+    args = request.args
+    limit = max(1, min(args.get('limit', 100, type=int), 1000))
+
+    try:
+        terms = archive_index.search_terms(args.get('ip'), args.get('user'))
+        since = parse_time(args['since']) if args.get('since') else None
+        until = parse_time(args['until']) if args.get('until') else None
+        host_id = int(args['host_id']) if args.get('host_id') else None
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+    if not terms:
+        return jsonify({'error': 'ip or user is required'}), 400
+
+    query = db.session.query(LogArchive, ArchiveIndex).outerjoin(
+        ArchiveIndex, ArchiveIndex.archive_id == LogArchive.id
+    )
+    if host_id is not None:
+        query = query.filter(LogArchive.host_id == host_id)
+    # Time range pruning; files without an index entry are always read
+    if since is not None:
+        query = query.filter(db.or_(ArchiveIndex.id.is_(None), ArchiveIndex.max_ts >= since))
+    if until is not None:
+        query = query.filter(db.or_(ArchiveIndex.id.is_(None), ArchiveIndex.min_ts <= until))
+    files = query.order_by(LogArchive.id.desc()).all()
+
+    candidates = [archive for archive, index in files if index is None or archive_index.may_contain(index, terms)]
+
+    storage_path = DataManager.storage_path()
+    names = dict(db.session.query(Host.id, Host.name).all())
+    items, scanned = [], 0
+    for archive in candidates:
+        path = os.path.join(storage_path, archive.filename)
+        if not os.path.exists(path):
+            continue
+        scanned += 1
+        table = DataManager.read_archive(path, columns=['timestamp', 'message', 'hostname'])
+        if since is not None:
+            table = table.filter(pc.greater_equal(table['timestamp'], since))
+        if until is not None:
+            table = table.filter(pc.less_equal(table['timestamp'], until))
+        for row in archive_index.matching_rows(table, terms).to_pylist():
+            items.append({
+                'timestamp': datetime.fromtimestamp(row['timestamp'], timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+                'host_id': archive.host_id,
+                'host': names.get(archive.host_id, 'Unknown'),
+                'hostname': row['hostname'],
+                'message': row['message'],
+                'file': archive.filename
+            })
+        if len(items) > limit:
+            break
+
+    items.sort(key=lambda item: item['timestamp'], reverse=True)
+    return jsonify({
+        'items': items[:limit],
+        'truncated': len(items) > limit,
+        'files_total': len(files),
+        'files_scanned': scanned
+    })
@@ -3,11 +3,18 @@ from flask import Flask, render_template
 from flask_login import login_required
 import api
 from extensions import db, migrate, login_manager
-from models import User, Host, LogSource, LogArchive, IPRegistry, Alert
-from commands import setup
+from models import User, Host, LogSource, LogArchive, ArchiveIndex, IPRegistry, Alert, Job, FirewallBlock
+from commands import setup, fetch_all, stream, compact, rebuild_rollups, worker, reparse, index_archives, block_ip
 from auth import auth_bp
 from api.hosts import hosts_bp
 from api.alerts import alerts_bp
+from api.jobs import jobs_bp
+from api.search import search_bp
+from api.blocks import blocks_bp
+from api.metrics import metrics_bp
+from core.scheduler import start_background_services
+from core.storage import configure_sqlite, instrument_engine
+from core import logs
 
 def create_app():
     app = Flask(__name__)
@@ -16,20 +23,134 @@ def create_app():
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:////app/data/siem.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['STORAGE_PATH'] = os.environ.get('STORAGE_PATH', './data/archives')
+    # Raw journal lines: kept in the archive file (inline), in a sidecar file (separate), not at all (drop)
+    # or split into typed columns and rebuilt on read (columnar)
+    app.config['ARCHIVE_RAW'] = os.environ.get('ARCHIVE_RAW', 'inline')
+    # Entries per fetch chunk: a large backlog is parsed and archived chunk by chunk
+    app.config['FETCH_CHUNK_SIZE'] = int(os.environ.get('FETCH_CHUNK_SIZE', 50_000))
+    # Journal fields fetched from the hosts (journalctl --output-fields); '*' = complete entries,
+    # e.g. when the archived raw lines should keep every field
+    journal_fields = os.environ.get('JOURNAL_FIELDS', 'MESSAGE,_HOSTNAME,__REALTIME_TIMESTAMP,__CURSOR,_PID')
+    app.config['JOURNAL_FIELDS'] = [] if journal_fields.strip() == '*' else [
+        f.strip() for f in journal_fields.split(',') if f.strip()]
+
+    # SQLite tuning applied on connect (see core/storage.py): busy timeout (ms), synchronous mode,
+    # page cache (KiB) and memory-mapped I/O (bytes)
+    app.config['SQLITE_TUNING'] = os.environ.get('SQLITE_TUNING', '1').lower() in ('1', 'true', 'yes')
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 10000))
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+    # Write-behind buffer for ingestion results: on/off, results per commit, max wait (s)
+    app.config['WRITE_BEHIND'] = os.environ.get('WRITE_BEHIND', '1').lower() in ('1', 'true', 'yes')
+    app.config['WRITE_BEHIND_MAX_ITEMS'] = int(os.environ.get('WRITE_BEHIND_MAX_ITEMS', 50))
+    app.config['WRITE_BEHIND_MAX_DELAY'] = float(os.environ.get('WRITE_BEHIND_MAX_DELAY', 0.02))
+
+    # Fetch scheduler: pool size, per-host timeout (s), sweep interval (s, 0 = disabled)
+    app.config['FETCH_WORKERS'] = int(os.environ.get('FETCH_WORKERS', 8))
+    app.config['FETCH_TIMEOUT'] = int(os.environ.get('FETCH_TIMEOUT', 60))
+    app.config['FETCH_INTERVAL'] = int(os.environ.get('FETCH_INTERVAL', 0))
+
+    # Correlation of failed logins: window (s) and thresholds within it
+    app.config['CORRELATION_ENABLED'] = os.environ.get('CORRELATION_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    app.config['CORRELATION_WINDOW'] = int(os.environ.get('CORRELATION_WINDOW', 300))
+    app.config['CORRELATION_BRUTE_FORCE'] = int(os.environ.get('CORRELATION_BRUTE_FORCE', 10))        # failures per IP and host
+    app.config['CORRELATION_SPRAY_USERS'] = int(os.environ.get('CORRELATION_SPRAY_USERS', 5))         # distinct users per IP
+    app.config['CORRELATION_DISTRIBUTED_IPS'] = int(os.environ.get('CORRELATION_DISTRIBUTED_IPS', 10))  # distinct IPs per user
+
+    # IP reputation during detection: on/off, allow/deny list files (one CIDR per line),
+    # IPRegistry refresh interval (s)
+    app.config['REPUTATION_ENABLED'] = os.environ.get('REPUTATION_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    app.config['REPUTATION_ALLOWLIST'] = os.environ.get('REPUTATION_ALLOWLIST', '')
+    app.config['REPUTATION_DENYLIST'] = os.environ.get('REPUTATION_DENYLIST', '')
+    app.config['REPUTATION_REFRESH'] = float(os.environ.get('REPUTATION_REFRESH', 30))
+
+    # Firewall blocks (core/response.py): backend (ipset or iptables), hosts pushed at once,
+    # per-host timeout (s), interval of the check for failed / expired blocks (s, 0 = disabled)
+    app.config['FIREWALL_BACKEND'] = os.environ.get('FIREWALL_BACKEND', 'ipset')
+    app.config['FIREWALL_WORKERS'] = int(os.environ.get('FIREWALL_WORKERS', 16))
+    app.config['FIREWALL_TIMEOUT'] = int(os.environ.get('FIREWALL_TIMEOUT', 30))
+    app.config['FIREWALL_SYNC_INTERVAL'] = int(os.environ.get('FIREWALL_SYNC_INTERVAL', 60))
+
+    # Response cache for the dashboard stats endpoints (s, 0 = disabled)
+    app.config['ALERT_STATS_TTL'] = float(os.environ.get('ALERT_STATS_TTL', 0))
+
+    # Live alert stream (SSE): per-client buffer (messages), alerts table poll interval (s), keepalive (s)
+    app.config['ALERT_STREAM_BUFFER'] = int(os.environ.get('ALERT_STREAM_BUFFER', 100))
+    app.config['ALERT_STREAM_INTERVAL'] = float(os.environ.get('ALERT_STREAM_INTERVAL', 2.0))
+    app.config['ALERT_STREAM_KEEPALIVE'] = float(os.environ.get('ALERT_STREAM_KEEPALIVE', 15))
+
+    # Archive compaction interval (s, 0 = disabled)
+    app.config['COMPACT_INTERVAL'] = int(os.environ.get('COMPACT_INTERVAL', 0))
+
+    # Streaming (journalctl --follow) ingestion: on/off, micro-batch size and max age (s)
+    app.config['STREAM_LOGS'] = os.environ.get('STREAM_LOGS', '0').lower() in ('1', 'true', 'yes')
+    app.config['STREAM_BATCH_SIZE'] = int(os.environ.get('STREAM_BATCH_SIZE', 500))
+    app.config['STREAM_BATCH_INTERVAL'] = float(os.environ.get('STREAM_BATCH_INTERVAL', 2.0))
+
+    # Background services (fetch sweep, compaction, streaming, firewall sync, job workers) run in `flask worker`;
+    # 1 = start them in the web process instead, with its first request (single-process deployments only)
+    app.config['BACKGROUND_SERVICES'] = os.environ.get('BACKGROUND_SERVICES', '0').lower() in ('1', 'true', 'yes')
+
+    # Job queue (fetch, block-ip): worker processes started with the background services,
+    # queue poll interval (s) and the time without a worker heartbeat after which a running job counts as lost (s)
+    app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+    app.config['JOB_POLL_INTERVAL'] = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+    app.config['JOB_TIMEOUT'] = int(os.environ.get('JOB_TIMEOUT', 600))
+
+    # Logging of the siem.* loggers (key=value lines on stdout): level, and one in N per-line
+    # debug records written (rule hits)
+    app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
+    app.config['LOG_SAMPLE_EVERY'] = int(os.environ.get('LOG_SAMPLE_EVERY', 100))
+
+    # /metrics (Prometheus): snapshot directory of the job worker and stream processes,
+    # bearer token for scrapers without a login session (empty = session only)
+    app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR', './data/metrics')
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')
 
     # Extensions initialization
+    logs.configure(app.config['LOG_LEVEL'], app.config['LOG_SAMPLE_EVERY'])
     db.init_app(app)
-    migrate.init_app(app, db)
+    configure_sqlite(app)
+    instrument_engine(app)
+    migrate.init_app(app, db, directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
     login_manager.init_app(app)
 
     # Register CLI commands
     # docker compose exec app flask setup
     app.cli.add_command(setup)
+    # docker compose exec app flask fetch-all
+    app.cli.add_command(fetch_all)
+    # docker compose exec app flask stream
+    app.cli.add_command(stream)
+    # docker compose exec app flask compact
+    app.cli.add_command(compact)
+    app.cli.add_command(rebuild_rollups)
+    # docker compose exec app flask worker
+    app.cli.add_command(worker)
+    # docker compose exec app flask reparse --since 2026-01-01 --rule ssh_invalid_user
+    app.cli.add_command(reparse)
+    app.cli.add_command(index_archives)
+    # docker compose exec app flask block-ip 203.0.113.7 --ttl 3600
+    app.cli.add_command(block_ip)
 
     # Blueprints registration
     app.register_blueprint(auth_bp)
     app.register_blueprint(hosts_bp)
     app.register_blueprint(alerts_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(blocks_bp)
+    app.register_blueprint(metrics_bp)
+
+    # Single-process deployments: background services start with the first served request,
+    # so CLI commands never spawn them. Otherwise `flask worker` runs them, once.
+    if app.config['BACKGROUND_SERVICES']:
+        @app.before_request
+        def start_services():
+            start_background_services(app)
 
     # Simple route to verify app is running
     @app.route('/')
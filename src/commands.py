@@ -1,17 +1,26 @@
 import click
 import os
+import time
 from flask.cli import with_appcontext
+from flask_migrate import upgrade, stamp
 from extensions import db
 from models import User
 
 @click.command(name='setup')
 @with_appcontext
 def setup():
-    """Creates database tables and an admin user from .env"""
+    """Creates or upgrades database tables and an admin user from .env"""
     
-    # Create all database tables
-    db.create_all()
-    print("Database tables created.")
+    if db.inspect(db.engine).has_table('users'):
+        # Existing database: apply pending migrations
+        upgrade()
+        db.create_all()
+        print("Database upgraded.")
+    else:
+        # Fresh database: create all tables at the latest schema
+        db.create_all()
+        stamp()
+        print("Database tables created.")
 
     # Create admin user from .env
     admin_user = os.environ.get('ADMIN_USER', 'admin')
@@ -26,4 +35,188 @@ def setup():
         db.session.commit()
         print(f"Added user '{admin_user}' with password from .env")
     else:
-        print("Skipping... User admin already exists")
\ No newline at end of file
+        print("Skipping... User admin already exists")
+
+@click.command(name='fetch-all')
+@click.option('--workers', type=int, default=None, help='Hosts fetched at once (default: FETCH_WORKERS)')
+@click.option('--timeout', type=int, default=None, help='Per-host timeout in seconds (default: FETCH_TIMEOUT)')
+@click.option('--host', 'host_ids', type=int, multiple=True, help='Limit the sweep to these host IDs')
+@with_appcontext
+def fetch_all(workers, timeout, host_ids):
+    """Fetches logs from all hosts concurrently and prints a summary"""
+    from flask import current_app
+    from core.scheduler import FetchScheduler
+
+    scheduler = FetchScheduler(
+        current_app._get_current_object(),
+        max_workers=workers or current_app.config['FETCH_WORKERS'],
+        host_timeout=timeout or current_app.config['FETCH_TIMEOUT']
+    )
+    summary = scheduler.run(host_ids=list(host_ids) or None)
+
+    print(f"{'HOST':<24} {'STATUS':<8} {'LATENCY':>9} {'LOGS':>7} {'ALERTS':>7}")
+    for s in summary:
+        line = f"{s['host']:<24} {s['status']:<8} {s['latency']:>8.2f}s {s['logs']:>7} {s['alerts']:>7}"
+        if s['error']:
+            line += f"  ({s['error']})"
+        print(line)
+
+    total_logs = sum(s['logs'] for s in summary)
+    total_alerts = sum(s['alerts'] for s in summary)
+    print(f"{len(summary)} hosts, {total_logs} logs, {total_alerts} alerts")
+
+
+@click.command(name='stream')
+@click.option('--host', 'host_ids', type=int, multiple=True, help='Limit streaming to these host IDs')
+@with_appcontext
+def stream(host_ids):
+    """Follows host journals continuously (Ctrl+C to stop)"""
+    from flask import current_app
+    from core import ingest, metrics
+    from core.streamer import LogStreamer
+
+    streamer = LogStreamer(
+        current_app._get_current_object(),
+        host_ids=list(host_ids) or None,
+        batch_size=current_app.config['STREAM_BATCH_SIZE'],
+        batch_interval=current_app.config['STREAM_BATCH_INTERVAL']
+    )
+    streamer.start()
+    try:
+        while True:
+            time.sleep(15)
+            # Counters of this process, for /metrics served by the web app
+            metrics.REGISTRY.dump(current_app.config['METRICS_DIR'], name=f"stream-{os.getpid()}")
+    except KeyboardInterrupt:
+        print("Stopping...")
+        streamer.stop()
+        streamer.join(timeout=10)
+        ingest.drain()
+
+
+@click.command(name='compact')
+@click.option('--host', 'host_ids', type=int, multiple=True, help='Limit compaction to these host IDs')
+@click.option('--min-files', type=int, default=2, help='Smallest number of files worth merging per day')
+@with_appcontext
+def compact(host_ids, min_files):
+    """Merges small archive files into one sorted, zstd-compressed file per host and day"""
+    from models import Host
+    from core.compactor import ArchiveCompactor
+
+    compactor = ArchiveCompactor(min_files=min_files)
+    ids = list(host_ids) or [h.id for h in Host.query.order_by(Host.id).all()]
+
+    merged = 0
+    for host_id in ids:
+        merged += len(compactor.compact_host(host_id))
+    print(f"Compacted {merged} partitions")
+
+
+@click.command(name='rebuild-rollups')
+@with_appcontext
+def rebuild_rollups():
+    """Recomputes the dashboard alert rollups from the alerts table"""
+    from core import rollups
+
+    rollups.rebuild()
+    print("Alert rollups rebuilt.")
+
+
+@click.command(name='worker')
+@click.option('--processes', type=int, default=None, help='Job worker processes (default: JOB_WORKERS, at least 1)')
+@with_appcontext
+def worker(processes):
+    """Runs the job workers and the background services in the foreground (Ctrl+C to stop)"""
+    from flask import current_app
+    from core import ingest, metrics
+    from core.scheduler import start_background_services, stop_background_services
+
+    app = current_app._get_current_object()
+    start_background_services(app, job_workers=processes or app.config['JOB_WORKERS'] or 1)
+    try:
+        while True:
+            time.sleep(15)
+            # Counters of this process (sweeps, streaming), for /metrics served by the web app
+            metrics.REGISTRY.dump(app.config['METRICS_DIR'], name=f"services-{os.getpid()}")
+    except KeyboardInterrupt:
+        print("Stopping...")
+        stop_background_services()
+        ingest.drain()
+
+
+@click.command(name='reparse')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='First archive day (YYYY-MM-DD)')
+@click.option('--until', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Last archive day (YYYY-MM-DD)')
+@click.option('--host', 'host_ids', type=int, multiple=True, help='Limit to these host IDs')
+@click.option('--rule', 'rule_ids', multiple=True, help='Only run these rule IDs (default: all rules)')
+@click.option('--workers', type=int, default=None, help='Parser processes (default: CPU count)')
+@click.option('--resume', is_flag=True, help='Skip archives finished by the previous run with the same options')
+@with_appcontext
+def reparse(since, until, host_ids, rule_ids, workers, resume):
+    """Re-runs detection rules over archived logs and stores the new alerts"""
+    from flask import current_app
+    from core.backfill import Backfill
+
+    backfill = Backfill(current_app._get_current_object(), since=since, until=until,
+                        host_ids=host_ids, rule_ids=rule_ids, workers=workers)
+    try:
+        summary = backfill.run(resume=resume)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(f"{summary['files']} files ({summary['skipped']} skipped, {summary['failed']} failed), "
+          f"{summary['rows']} rows, {summary['events']} events, {summary['alerts']} new alerts "
+          f"in {summary['seconds']:.1f}s")
+
+
+@click.command(name='index-archives')
+@with_appcontext
+def index_archives():
+    """Builds the search index of archive files that have none (written before it existed)"""
+    from models import LogArchive, ArchiveIndex
+    from core.archive_index import build_index
+    from core.data_manager import DataManager
+
+    missing = LogArchive.query.outerjoin(ArchiveIndex).filter(ArchiveIndex.id.is_(None)).order_by(LogArchive.id).all()
+    indexed = 0
+    for archive in missing:
+        path = os.path.join(DataManager.storage_path(), archive.filename)
+        if not os.path.exists(path):
+            print(f"Skipping {archive.filename}: file not found")
+            continue
+        table = DataManager.read_archive(path, columns=['timestamp', 'message'])
+        archive.search_index = ArchiveIndex(host_id=archive.host_id, **build_index(table))
+        db.session.commit()
+        indexed += 1
+    print(f"Indexed {indexed} of {len(missing)} archive files")
+
+
+@click.command(name='block-ip')
+@click.argument('ips', nargs=-1, required=True)
+@click.option('--host', 'host_ids', type=int, multiple=True, help='Limit to these host IDs (default: all hosts)')
+@click.option('--ttl', type=click.IntRange(min=1), default=None, help='Unblock after this many seconds (default: never)')
+@click.option('--unblock', is_flag=True, help='Remove the blocks instead')
+@with_appcontext
+def block_ip(ips, host_ids, ttl, unblock):
+    """Blocks (or unblocks) IPs / CIDR networks on the hosts' firewalls and pushes the change"""
+    from flask import current_app
+    from core import response
+
+    try:
+        if unblock:
+            response.request_unblocks(ips, host_ids=list(host_ids) or None)
+        else:
+            response.request_blocks(ips, host_ids=list(host_ids) or None, ttl=ttl)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+
+    summary = response.build_engine(current_app.config).sync()
+    print(f"{'HOST':<24} {'STATUS':<8} {'LATENCY':>9} {'BLOCKED':>8} {'ADDED':>6} {'REMOVED':>8}")
+    for s in summary:
+        line = (f"{s['host']:<24} {s['status']:<8} {s['latency']:>8.2f}s "
+                f"{s['blocked']:>8} {s['added']:>6} {s['removed']:>8}")
+        if s['error']:
+            line += f"  ({s['error']})"
+        print(line)
+    failed = sum(1 for s in summary if s['status'] == 'error')
+    print(f"{len(summary)} hosts updated, {failed} failed")
@@ -0,0 +1,199 @@
+import hashlib
+import ipaddress
+import math
+import re
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Addresses and user names the search index knows about.
+# Candidates only: IPs are validated, users are the token after the usual
+# sshd / sudo / PAM markers ("for", "invalid user", "user", USER=, ...).
+# The patterns run both as Python `re` and as arrow (RE2) kernels, so they
+# stick to the syntax both understand; each has one group named `v`.
+IP_PATTERN = r'(?P<v>\b\d{1,3}(?:\.\d{1,3}){3}\b|[0-9A-Fa-f]*:[0-9A-Fa-f]*:[0-9A-Fa-f:]*)'
+USER_PATTERN = (r'\b(?:for(?: invalid user| user)?|[Ii]nvalid user|user=?|USER=|ruser=|logname=)\s*'
+                r'(?P<v>[A-Za-z_][A-Za-z0-9._@-]{0,63})(?:[\s(:;,]|$)')
+# sudo lines start with the invoking user: "bob : TTY=pts/0 ; ... ; USER=root ; COMMAND=..."
+SUDO_PATTERN = r'^[ \t]*(?P<v>[A-Za-z_][A-Za-z0-9._@-]{0,63}) : '
+PATTERNS = {
+    'ip': (IP_PATTERN, re.compile(IP_PATTERN)),
+    'user': (USER_PATTERN, re.compile(USER_PATTERN)),
+    'sudo': (SUDO_PATTERN, re.compile(SUDO_PATTERN)),
+}
+# Words the user pattern picks up that are never user names
+NOT_USERS = frozenset({'for', 'from', 'user', 'invalid', 'port', 'authentication', 'password', 'publickey'})
+
+FALSE_POSITIVE_RATE = 0.01
+MASK64 = (1 << 64) - 1
+
+
+class BloomFilter:
+    """
+    Fixed-size set membership with no false negatives. Bit positions come
+    from one blake2b digest (double hashing), so filters are portable
+    between processes and Python versions.
+    """
+
+    def __init__(self, size_bits, hashes, bits=None):
+        self.size_bits = size_bits
+        self.hashes = hashes
+        self.bits = bytearray(bits) if bits is not None else bytearray((size_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, items, error_rate=FALSE_POSITIVE_RATE):
+        items = max(items, 1)
+        size_bits = max(64, math.ceil(-items * math.log(error_rate) / math.log(2) ** 2))
+        size_bits = (size_bits + 7) // 8 * 8  # whole bytes: from_bytes() must see the same size
+        hashes = max(1, round(size_bits / items * math.log(2)))
+        return cls(size_bits, hashes)
+
+    @classmethod
+    def from_bytes(cls, data, hashes):
+        return cls(len(data) * 8, hashes, data)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        # 64-bit wrap-around, same arithmetic as add_many()
+        return [((h1 + i * h2) & MASK64) % self.size_bits for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def add_many(self, items):
+        """add() for many items at once, bit positions computed with numpy"""
+        items = list(items)
+        if not items:
+            return
+        digests = b''.join(hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest() for item in items)
+        halves = np.frombuffer(digests, dtype='<u8').reshape(-1, 2)
+        h1, h2 = halves[:, :1], halves[:, 1:] | np.uint64(1)
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        positions = ((h1 + steps * h2) % np.uint64(self.size_bits)).ravel()
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        np.bitwise_or.at(bits, (positions >> np.uint64(3)).astype(np.intp),
+                         (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+
+def normalize_ip(value):
+    """Canonical text form of an address (IPv6 compressed), None if it is not one"""
+    if ':' not in value:
+        # Dotted quads are already canonical when valid (no leading zeros, octets <= 255)
+        octets = value.split('.')
+        if len(octets) == 4 and all(o.isdigit() and o.isascii() and int(o) <= 255 and (o == '0' or o[0] != '0')
+                                    for o in octets):
+            return value
+        return None
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        return None
+
+
+def _terms(kind, values):
+    """Candidate strings found by one pattern -> index keys"""
+    terms = set()
+    for value in values:
+        if kind == 'ip':
+            ip = normalize_ip(value)
+            if ip:
+                terms.add(f"ip:{ip}")
+        elif value.lower() not in NOT_USERS and not normalize_ip(value):
+            terms.add(f"user:{value}")
+    return terms
+
+
+def extract_terms(message):
+    """IPs and user names mentioned in one log message, as 'ip:<addr>' / 'user:<name>' keys"""
+    terms = set()
+    for kind, (_, regex) in PATTERNS.items():
+        terms |= _terms('ip' if kind == 'ip' else 'user', regex.findall(message))
+    return terms
+
+
+def column_terms(messages):
+    """
+    extract_terms() of a whole message column, merged. The common case,
+    at most one match per line, runs as arrow kernels; only lines with
+    several matches of a pattern go through Python regexes.
+    """
+    terms = set()
+    for kind, (pattern, regex) in PATTERNS.items():
+        kind = 'ip' if kind == 'ip' else 'user'
+        counts = pc.count_substring_regex(messages, pattern)
+        single = messages.filter(pc.fill_null(pc.equal(counts, 1), False))
+        if len(single):
+            found = pc.extract_regex(single, pattern).field('v')
+            terms |= _terms(kind, pc.unique(found).to_pylist())
+        for message in messages.filter(pc.fill_null(pc.greater(counts, 1), False)).to_pylist():
+            terms |= _terms(kind, regex.findall(message))
+    return terms
+
+
+def build_index(table):
+    """
+    Index entry of one archive file (table in the archive schema): time
+    range, row count and a Bloom filter of every IP and user name in it.
+    """
+    terms = column_terms(pc.unique(pc.drop_null(table['message'])))
+
+    bloom = BloomFilter.for_capacity(len(terms))
+    bloom.add_many(terms)
+
+    timestamps = pc.min_max(table['timestamp'])
+    return {
+        'min_ts': timestamps['min'].as_py(),
+        'max_ts': timestamps['max'].as_py(),
+        'row_count': table.num_rows,
+        'bloom': bloom.to_bytes(),
+        'bloom_hashes': bloom.hashes,
+    }
+
+
+def search_terms(ip=None, user=None):
+    """Query parameters -> index keys every matching line must contain"""
+    terms = []
+    if ip:
+        normalized = normalize_ip(ip)
+        if normalized is None:
+            raise ValueError(f"invalid IP address '{ip}'")
+        terms.append(f"ip:{normalized}")
+    if user:
+        terms.append(f"user:{user}")
+    return terms
+
+
+def may_contain(index, terms):
+    """False only if the file certainly has no line with all of the terms"""
+    bloom = BloomFilter.from_bytes(index.bloom, index.bloom_hashes)
+    return all(term in bloom for term in terms)
+
+
+def matching_rows(table, terms):
+    """Rows of an archive table that mention every term (same extraction as the index)"""
+    if table.num_rows == 0:
+        return table
+    # Cheap substring check first, the exact extraction only on what is left
+    candidates = table
+    for term in terms:
+        kind, needle = term.split(':', 1)
+        if kind == 'ip' and ':' in needle:
+            continue  # IPv6 may be written in another (uncompressed) form
+        candidates = candidates.filter(pc.fill_null(pc.match_substring(candidates['message'], needle), False))
+
+    keep = np.fromiter(
+        (message is not None and all(t in extract_terms(message) for t in terms)
+         for message in candidates['message'].to_pylist()),
+        dtype=bool, count=candidates.num_rows
+    )
+    return candidates.filter(pa.array(keep))
@@ -0,0 +1,230 @@
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pyarrow.parquet as pq
+
+from extensions import db
+from models import LogArchive
+from core import ingest
+from core.correlator import build_correlator
+from core.reputation import get_reputation
+from core.data_manager import DataManager
+from core.logs import fields, get_logger
+from core.parser import LogParser
+from core.rules import RuleSet, RULES_PATH
+from core.sources import rule_routes
+
+log = get_logger('reparse')
+
+# Rule set of a worker process, loaded once by _init_worker
+_rules = None
+
+
+def _init_worker(rules_path, rule_ids):
+    global _rules
+    _rules = RuleSet(rules_path, only=rule_ids)
+
+
+def _parse_task(path, row_groups, routes=None):
+    """Runs in a worker process: detection over one archive file or a range of its row groups"""
+    if row_groups is None:
+        source = path
+    else:
+        parquet = pq.ParquetFile(path)
+        columns = [c for c in LogParser.COLUMNS if c in parquet.schema_arrow.names]
+        source = parquet.read_row_groups(row_groups, columns=columns)
+    return list(LogParser(source, rules=_rules, routes=routes).iter_events())
+
+
+class Backfill:
+    """
+    Re-runs detection over archived logs (`flask reparse`).
+
+    Archive files are parsed by a pool of worker processes, one task per
+    file or per `rows_per_task` rows worth of row groups. Results are
+    taken back in archive order (day, host, file) and written by this
+    process alone: new alerts are deduplicated against the stored ones by
+    fingerprint, so re-parsing the same range twice adds nothing. Each
+    commit also records the finished archives in a state file, which lets
+    an interrupted run continue where it stopped (`resume`).
+    """
+
+    def __init__(self, app, since=None, until=None, host_ids=None, rule_ids=None, workers=None,
+                 state_path=None, rows_per_task=500_000, commit_every=50):
+        self.app = app
+        self.since = since
+        self.until = until
+        self.host_ids = list(host_ids) if host_ids else None
+        self.rule_ids = sorted(rule_ids) if rule_ids else None
+        self.workers = workers or os.cpu_count() or 1
+        self.state_path = state_path or os.path.join(app.config['STORAGE_PATH'], '.reparse-state.json')
+        self.rows_per_task = rows_per_task
+        self.commit_every = commit_every
+
+    @staticmethod
+    def archive_day(archive):
+        """Day of an archive file: its date= partition, the upload day for older files"""
+        partition = os.path.dirname(archive.filename)
+        if 'date=' in partition:
+            return partition.rsplit('date=', 1)[1]
+        return archive.created_at.strftime('%Y-%m-%d') if archive.created_at else ''
+
+    def archives(self):
+        """Archive files in range, in the order their alerts are written"""
+        query = LogArchive.query
+        if self.host_ids:
+            query = query.filter(LogArchive.host_id.in_(self.host_ids))
+        selected = []
+        for archive in query.order_by(LogArchive.id).all():
+            day = self.archive_day(archive)
+            if self.since and day < self.since.strftime('%Y-%m-%d'):
+                continue
+            if self.until and day > self.until.strftime('%Y-%m-%d'):
+                continue
+            selected.append((day, archive))
+        selected.sort(key=lambda item: (item[0], item[1].host_id, item[1].id))
+        return [archive for _, archive in selected]
+
+    def tasks(self, archive, path):
+        """(path, row_groups) tasks of one archive file; large files are split by row group"""
+        if archive.record_count <= self.rows_per_task:
+            return [(path, None)]
+        metadata = pq.ParquetFile(path).metadata
+        tasks, group, rows = [], [], 0
+        for i in range(metadata.num_row_groups):
+            group.append(i)
+            rows += metadata.row_group(i).num_rows
+            if rows >= self.rows_per_task:
+                tasks.append((path, group))
+                group, rows = [], 0
+        if group:
+            tasks.append((path, group))
+        return tasks
+
+    def _params(self):
+        return {
+            'since': self.since.strftime('%Y-%m-%d') if self.since else None,
+            'until': self.until.strftime('%Y-%m-%d') if self.until else None,
+            'hosts': self.host_ids,
+            'rules': self.rule_ids,
+        }
+
+    def load_state(self):
+        """Archive ids finished by an earlier run with the same parameters"""
+        if not os.path.exists(self.state_path):
+            return set()
+        with open(self.state_path, encoding='utf-8') as fh:
+            state = json.load(fh)
+        if state.get('params') != self._params():
+            log.warning('reparse state belongs to other parameters, starting over', extra=fields(path=self.state_path))
+            return set()
+        return set(state.get('done', []))
+
+    def save_state(self, done):
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as fh:
+            json.dump({'params': self._params(), 'done': sorted(done),
+                       'updated_at': datetime.utcnow().isoformat()}, fh)
+        os.replace(temp_path, self.state_path)
+
+    def run(self, resume=False, progress=print):
+        """Re-parses the selected archives. Returns a summary dict."""
+        # Unknown rule ids fail here, not in every worker
+        RuleSet(RULES_PATH, only=self.rule_ids)
+        done = self.load_state() if resume else set()
+        archives = [a for a in self.archives() if a.id not in done]
+        total_rows = sum(a.record_count or 0 for a in archives)
+        storage_path = DataManager.storage_path()
+        # Rows keep the rule packs of their log source (rows of older files have none: every pack)
+        routes = {host_id: rule_routes(sources)
+                  for host_id, sources in ingest.host_sources({a.host_id for a in archives}).items()}
+
+        correlator = None
+        if self.app.config.get('CORRELATION_ENABLED'):
+            # Own windows, fed in archive order: live ingestion state is not touched
+            correlator = build_correlator(self.app.config)
+
+        summary = {'files': 0, 'rows': 0, 'events': 0, 'alerts': 0, 'failed': 0, 'skipped': len(done)}
+        started = time.monotonic()
+        last_report = started
+        pending_commit = 0
+
+        # Tasks in archive order; a bounded window of them is in the pool at any time
+        def task_stream():
+            for archive in archives:
+                path = os.path.join(storage_path, archive.filename)
+                if not os.path.exists(path):
+                    yield archive, None, True
+                    continue
+                tasks = self.tasks(archive, path)
+                for n, task in enumerate(tasks):
+                    yield archive, task, n == len(tasks) - 1
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(RULES_PATH, self.rule_ids)) as pool:
+            stream = task_stream()
+            window = deque()
+            failed = set()
+
+            def fill():
+                while len(window) < self.workers * 2:
+                    item = next(stream, None)
+                    if item is None:
+                        return
+                    archive, task, last = item
+                    future = pool.submit(_parse_task, *task, routes[archive.host_id]) if task else None
+                    window.append((archive, future, last))
+
+            fill()
+            while window:
+                archive, future, last = window.popleft()
+                fill()
+
+                try:
+                    if future is None:
+                        raise FileNotFoundError(archive.filename)
+                    events = future.result()
+                except Exception as e:
+                    log.error('reparse of archive failed', extra=fields(file=archive.filename, error=e))
+                    failed.add(archive.id)
+                    events = []
+
+                if self.app.config.get('REPUTATION_ENABLED'):
+                    events = get_reputation(self.app.config).apply(events)
+                if correlator is not None:
+                    events = correlator.process(archive.host_id, events)
+                summary['events'] += len(events)
+                summary['alerts'] += ingest.insert_alerts(archive.host_id, events)
+
+                if last:
+                    if archive.id in failed:
+                        summary['failed'] += 1
+                    else:
+                        done.add(archive.id)
+                    summary['files'] += 1
+                    summary['rows'] += archive.record_count or 0
+                pending_commit += 1
+
+                if pending_commit >= self.commit_every or not window:
+                    db.session.commit()
+                    self.save_state(done)
+                    pending_commit = 0
+
+                now = time.monotonic()
+                if now - last_report >= 5 or not window:
+                    last_report = now
+                    elapsed = now - started
+                    rate = summary['rows'] / elapsed if elapsed else 0.0
+                    eta = (total_rows - summary['rows']) / rate if rate else 0.0
+                    progress(f"[Reparse] {summary['files']}/{len(archives)} files, "
+                             f"{summary['rows']}/{total_rows} rows, {summary['alerts']} new alerts, "
+                             f"{rate:,.0f} rows/s, ETA {eta:.0f}s")
+
+        summary['seconds'] = time.monotonic() - started
+        return summary
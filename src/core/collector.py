@@ -1,67 +1,352 @@
-import paramiko
 import json
+import re
+import select
+import shlex
 import time
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from core.logs import fields, get_logger
+from core.metrics import FETCH_ERRORS
+from core.sources import DEFAULT_SOURCE, Router, file_command, file_sources, journal_matches, journal_sources
+from core.ssh_pool import ssh_pool
+
+try:
+    # Optional, decodes journal lines about twice as fast as the json module
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+log = get_logger('collector')
+
+# Journal fields fetched by default (JOURNAL_FIELDS); journald adds __CURSOR and the timestamps anyway
+OUTPUT_FIELDS = ('MESSAGE', '_HOSTNAME', '__REALTIME_TIMESTAMP', '__CURSOR', '_PID')
+
+
+def _text(value):
+    """
+    Journal field value -> str. journald writes values that are not valid
+    UTF-8 or hold control bytes (ANSI colours) as arrays of byte values;
+    raises ValueError / TypeError if such an array is malformed.
+    """
+    if isinstance(value, (list, bytes, bytearray)):
+        return bytes(value).decode('utf-8', errors='replace')
+    return value
+
 
 class LogCollector:
-    def __init__(self):
-        self.ssh = paramiko.SSHClient()
-        self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    BASE_CMD = "sudo journalctl --output json --no-pager"
+    # Bytes per channel read; lines are split out of these blocks
+    READ_SIZE = 1 << 20
+
+    def __init__(self, pool=ssh_pool, keep_raw=True, output_fields=OUTPUT_FIELDS):
+        # Sessions are shared process-wide, see core/ssh_pool.py
+        self.pool = pool
+        # False with ARCHIVE_RAW=drop: the raw line is not kept in memory at all
+        self.keep_raw = keep_raw
+        # Fields journalctl sends (--output-fields), None for complete entries
+        self.output_fields = output_fields
+        self.last_error = None
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """Collector with the ARCHIVE_RAW and JOURNAL_FIELDS settings of the app"""
+        output_fields = config.get('JOURNAL_FIELDS', OUTPUT_FIELDS)
+        return cls(keep_raw=config.get('ARCHIVE_RAW', 'inline') != 'drop',
+                   output_fields=tuple(output_fields) if output_fields else None, **kwargs)
+
+    def _normalize(self, line, host, router=None):
+        """One journal JSON line -> log record, None if the line is not valid JSON"""
+        try:
+            entry = json_loads(line)
+            return self._record(entry, line, host, router.route(entry) if router else None)
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    def _records(self, lines, host, router=None):
+        """Journal JSON lines -> log records, invalid lines skipped (_normalize without a call per line)"""
+        records, record, loads = [], self._record, json_loads
+        route = router.route if router else None
+        for line in lines:
+            try:
+                entry = loads(line)
+                records.append(record(entry, line, host, route(entry) if route else None))
+            except (ValueError, TypeError, AttributeError):
+                pass
+        return records
 
-    def fetch_logs(self, host, last_fetch_time=None):
+    def _record(self, entry, line, host, source=None):
+        """Decoded journal entry -> log record; raises ValueError / AttributeError if it is malformed"""
+        # Normalizacja mikrosekund na sekundy (float)
+        ts_raw = entry.get('__REALTIME_TIMESTAMP')
+        timestamp = int(ts_raw) / 1000000.0 if ts_raw else time.time()
+
+        # Data normalization
+        return {
+            'timestamp': timestamp,
+            'message': _text(entry.get('MESSAGE', '')),
+            'hostname': _text(entry.get('_HOSTNAME', host.name)),
+            'cursor': entry.get('__CURSOR'),
+            'source': source,
+            'raw': (line.strip() if isinstance(line, str) else line.decode('utf-8', errors='replace').strip())
+                   if self.keep_raw else None
+        }
+
+    def _build_cmd(self, last_fetch_time=None, cursor=None, follow=False, sources=(DEFAULT_SOURCE,)):
+        """journalctl command pulling every journal source in `sources` at once"""
+        cmd = self.BASE_CMD
+        if self.output_fields:
+            router = Router(sources)
+            # Routing needs the match fields of the entries when there is more than one source
+            extra = () if router.single is not None else router.fields
+            output_fields = dict.fromkeys(self.output_fields + extra)
+            cmd += f" --output-fields={','.join(output_fields)}"
+        if follow:
+            cmd += " --follow"
+
+        if cursor:
+            # Resume exactly after the last stored entry
+            cmd += f" --after-cursor={shlex.quote(cursor)}"
+        elif last_fetch_time:
+            # Format date for journalctl: "YYYY-MM-DD HH:MM:SS"
+            since_str = last_fetch_time.strftime("%Y-%m-%d %H:%M:%S")
+            cmd += f' --since "{since_str}"'
+        else:
+            # Default to last 1000 lines on first run
+            cmd += " -n 1000"
+        return f"{cmd} {journal_matches(sources)}"
+
+    def _open(self, host, sources, last_fetch_time=None, cursor=None, follow=False, timeout=None):
+        """
+        Starts every source of the host on the pooled session: one journalctl
+        channel for all journal sources, one channel per log file. Returns
+        [(channel, decode(lines) -> records, keep_partial)].
+        """
+        streams = []
+        try:
+            journal = journal_sources(sources)
+            if journal:
+                cmd = self._build_cmd(last_fetch_time, cursor, follow, journal)
+                log.debug('fetching', extra=fields(host=host.name, cmd=cmd))
+                stdin, stdout, stderr = self.pool.exec_command(host, cmd, timeout=timeout)
+                router = Router(journal)
+                streams.append((stdout.channel, lambda lines: self._records(lines, host, router), True))
+            for source in file_sources(sources):
+                reader = _FileReader(source, host, self.keep_raw)
+                # No cursor yet: only the end of the file (see FIRST_READ_BYTES)
+                cmd = file_command(source, None if source.cursor is None else int(source.cursor), follow)
+                log.debug('fetching', extra=fields(host=host.name, cmd=cmd))
+                stdin, stdout, stderr = self.pool.exec_command(host, cmd, timeout=timeout)
+                # A line still being written is read again next time
+                streams.append((stdout.channel, reader.records, False))
+        except Exception:
+            for channel, _, _ in streams:
+                channel.close()
+            raise
+        return streams
+
+    def _lines(self, channel, keep_partial=True, deadline=None, timeout=None):
+        """Complete lines of a channel, one block at a time; the unterminated rest after EOF if keep_partial"""
+        buffer = b''
+        while True:
+            if deadline and time.monotonic() > deadline:
+                raise TimeoutError(f"fetch exceeded {timeout}s")
+            data = channel.recv(self.READ_SIZE)
+            if not data:
+                break
+            *lines, buffer = (buffer + data).split(b'\n')
+            yield lines
+        if keep_partial and buffer.strip():
+            yield [buffer]
+
+    def fetch_logs(self, host, last_fetch_time=None, timeout=None, cursor=None, sources=None):
         """
         Fetches logs from a remote host via SSH using Cloudflare Tunnel.
+        `cursor` (journald __CURSOR) takes precedence over `last_fetch_time`.
+        `timeout` bounds the whole call (connect + transfer), in seconds.
         """
         logs = []
+        for chunk in self.iter_logs(host, last_fetch_time, timeout, cursor, sources=sources):
+            logs.extend(chunk)
+        # All or nothing, like before chunking
+        return [] if self.last_error else logs
+
+    def iter_logs(self, host, last_fetch_time=None, timeout=None, cursor=None, chunk_size=50_000, sources=None):
+        """
+        Like fetch_logs, but yields the records in chunks of at most
+        `chunk_size` while they are read, so a large backlog never has to be
+        held in memory at once. On error the chunks already yielded stay
+        valid, last_error is set and the iteration ends.
+        `sources` (SourceRefs, default: ssh.service) are all started at once
+        on the host's session: journal sources resume after `cursor`, log
+        files at their own offset. Their output is read one after the other.
+        """
+        chunk = []
+        self.last_error = None
+        deadline = time.monotonic() + timeout if timeout else None
+        streams = []
         try:
-            key_path = "/root/.ssh/id_rsa_siem" 
-            my_key = paramiko.RSAKey.from_private_key_file(key_path)
-            sock = paramiko.ProxyCommand(f"cloudflared access ssh --hostname {host.ip_address}")
-
-            self.ssh.connect(
-                hostname=host.ip_address,
-                username='mikolaj_mazur05',
-                pkey=my_key,
-                sock=sock,
-                timeout=10
-            )
-
-            # Building the command (Incremental Logic)
-            # Use journalctl with JSON output
-            cmd = f"sudo journalctl -u ssh.service --output json --no-pager"
-            
-            if last_fetch_time:
-                # Format date for journalctl: "YYYY-MM-DD HH:MM:SS"
-                since_str = last_fetch_time.strftime("%Y-%m-%d %H:%M:%S")
-                cmd += f' --since "{since_str}"'
-            else:
-                # Default to last 100 lines on first run
-                cmd += " -n 1000"
-
-            print(f"[SSH] Executing: {cmd}")
-            stdin, stdout, stderr = self.ssh.exec_command(cmd)
-
-            # Parsing results
-            for line in stdout:
-                try:
-                    entry = json.loads(line)
-                    # Normalizacja mikrosekund na sekundy (float)
-                    ts_raw = entry.get('__REALTIME_TIMESTAMP')
-                    timestamp = int(ts_raw) / 1000000.0 if ts_raw else time.time()
-
-                    # Data normalization
-                    logs.append({
-                        'timestamp': timestamp,
-                        'message': entry.get('MESSAGE', ''),
-                        'hostname': entry.get('_HOSTNAME', host.name),
-                        'raw': line.strip()
-                    })
-                except (json.JSONDecodeError, ValueError):
-                    continue
-            
-            self.ssh.close()
-            return logs
+            streams = self._open(host, sources or (DEFAULT_SOURCE,), last_fetch_time, cursor, timeout=timeout)
+
+            # Parsing results, read in large blocks (line-by-line reads of the channel cost more than decoding)
+            for channel, decode, keep_partial in streams:
+                for lines in self._lines(channel, keep_partial, deadline, timeout):
+                    chunk.extend(decode(lines))
+                    while len(chunk) >= chunk_size:
+                        yield chunk[:chunk_size]
+                        chunk = chunk[chunk_size:]
+            if chunk:
+                yield chunk
 
         except Exception as e:
-            print(f"[SSH Error] {e}")
-            return []
\ No newline at end of file
+            self.last_error = str(e) or e.__class__.__name__
+            FETCH_ERRORS.labels(host.name).inc()
+            log.warning('fetch failed', extra=fields(host=host.name, error=self.last_error))
+            # The session may be broken, reconnect on next use
+            self.pool.discard(host)
+        finally:
+            # Also when the consumer stops early: the pooled session stays usable
+            for channel, _, _ in streams:
+                channel.close()
+
+    def follow(self, host, cursor=None, batch_size=500, batch_interval=2.0, stop=None, sources=None):
+        """
+        Streams new entries with `journalctl --follow` (and `tail -F` for log
+        files), resuming after `cursor` / the files' offsets. Yields
+        micro-batches of log records, at most `batch_size` long and at most
+        `batch_interval` seconds old. Ends when a channel closes or `stop`
+        (a threading.Event) is set; connection errors propagate.
+        """
+        streams = self._open(host, sources or (DEFAULT_SOURCE,), cursor=cursor, follow=True)
+        log.info('following', extra=fields(host=host.name, channels=len(streams)))
+        decoders = {channel: decode for channel, decode, _ in streams}
+        buffers = dict.fromkeys(decoders, b'')
+
+        batch = []
+        flush_at = time.monotonic() + batch_interval
+        try:
+            while not (stop and stop.is_set()):
+                # Short waits so batches get flushed on time even when the host is quiet
+                ready, _, _ = select.select(list(decoders), [], [], min(batch_interval, 1.0))
+                closed = False
+                for channel in ready:
+                    chunk = channel.recv(65536)
+                    if not chunk:
+                        closed = True  # remote side closed the stream
+                        continue
+                    *lines, buffers[channel] = (buffers[channel] + chunk).split(b'\n')
+                    batch.extend(decoders[channel](lines))
+                if closed:
+                    break
+
+                while len(batch) >= batch_size:
+                    yield batch[:batch_size]
+                    batch = batch[batch_size:]
+
+                now = time.monotonic()
+                if batch and now >= flush_at:
+                    yield batch
+                    batch = []
+                if now >= flush_at:
+                    flush_at = now + batch_interval
+
+            if batch:
+                yield batch
+        finally:
+            for channel in decoders:
+                channel.close()
+
+
+MONTHS = {name: number for number, name in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1)}
+
+# Time at the start of a log file line: ISO 8601 / RFC 3339 (rsyslog, RFC 5424
+# after its "<PRI>1 ") or the nginx error log's 2026/03/01 12:00:00
+_ISO_TIME = re.compile(r'(?:<\d{1,3}>\d* )?(\d{4})[-/](\d{2})[-/](\d{2})[T ](\d{2}):(\d{2}):(\d{2})(\.\d+)?'
+                       r'(Z|[+-]\d{2}:?\d{2})?')
+# BSD syslog: "Mar  1 12:00:00", without a year
+_SYSLOG_TIME = re.compile(r'([A-Z][a-z]{2}) {1,2}(\d{1,2}) (\d{2}):(\d{2}):(\d{2})\b')
+# Common / combined access log (nginx, Apache): [01/Mar/2026:12:00:00 +0000]
+_ACCESS_TIME = re.compile(r'\[(\d{2})/([A-Z][a-z]{2})/(\d{4}):(\d{2}):(\d{2}):(\d{2}) ([+-]\d{4})\]')
+
+
+def _zone(text):
+    """'Z', '+02:00', '-0130' -> timezone"""
+    if text in (None, 'Z'):
+        return timezone.utc
+    sign = -1 if text[0] == '-' else 1
+    text = text[1:].replace(':', '')
+    return timezone(sign * timedelta(hours=int(text[:2]), minutes=int(text[2:])))
+
+
+def line_timestamp(text, now):
+    """
+    Event time of a log file line (epoch seconds), None if it has none:
+    an ISO 8601 or syslog time at its start, or an access log's time.
+    Times without a zone are UTC; syslog's missing year is the one that
+    does not put the line in the future of `now` (read time).
+    """
+    try:
+        match = _ISO_TIME.match(text)
+        if match:
+            year, month, day, hour, minute, second, fraction, zone = match.groups()
+            moment = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second),
+                              tzinfo=_zone(zone))
+            return moment.timestamp() + (float(fraction) if fraction else 0.0)
+        match = _SYSLOG_TIME.match(text)
+        if match and match.group(1) in MONTHS:
+            month, day, hour, minute, second = MONTHS[match.group(1)], *map(int, match.groups()[1:])
+            year = datetime.fromtimestamp(now, timezone.utc).year
+            moment = datetime(year, month, day, hour, minute, second, tzinfo=timezone.utc).timestamp()
+            if moment > now + 86400:
+                # December lines read in January
+                moment = datetime(year - 1, month, day, hour, minute, second, tzinfo=timezone.utc).timestamp()
+            return moment
+        match = _ACCESS_TIME.search(text)
+        if match and match.group(2) in MONTHS:
+            day, name, year, hour, minute, second, zone = match.groups()
+            return datetime(int(year), MONTHS[name], int(day), int(hour), int(minute), int(second),
+                            tzinfo=_zone(zone)).timestamp()
+    except ValueError:
+        pass  # not a real date (Feb 30, hour 25)
+    return None
+
+
+class _FileReader:
+    """
+    Output of a log file channel (file_command) -> log records. Lines carry
+    their own time (line_timestamp; the time they were read if they have
+    none), and their end offset in the file as `offset` (stored as the
+    source's cursor) and, with the path, as `cursor`.
+    """
+
+    def __init__(self, source, host, keep_raw=True):
+        self.source = source
+        self.host = host
+        self.keep_raw = keep_raw
+        self.offset = None  # the first line is the start offset
+        # A first read starting inside the file begins mid-line (see FIRST_READ_BYTES)
+        self.skip_line = False
+
+    def records(self, lines):
+        if self.offset is None and lines:
+            self.offset = int(lines[0])
+            self.skip_line = self.source.cursor is None and self.offset > 0
+            lines = lines[1:]
+        records, now, name, path, hostname = [], time.time(), self.source.name, self.source.path, self.host.name
+        for line in lines:
+            self.offset += len(line) + 1
+            if self.skip_line:
+                self.skip_line = False
+                continue
+            text = line.decode('utf-8', errors='replace').rstrip('\r')
+            if not text.strip():
+                continue
+            records.append({
+                'timestamp': line_timestamp(text, now) or now,
+                'message': text,
+                'hostname': hostname,
+                'cursor': f"{path}:{self.offset}",
+                'source': name,
+                'raw': text if self.keep_raw else None,
+                'offset': self.offset,
+            })
+        return records
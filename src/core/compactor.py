@@ -0,0 +1,155 @@
+import os
+import uuid
+from collections import defaultdict
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from extensions import db
+from models import Host, LogArchive, ArchiveIndex
+from core.data_manager import DataManager, ARCHIVE_SCHEMA
+from core.archive_index import build_index
+from core import raw_columns
+from core.logs import fields, get_logger
+
+log = get_logger('compactor')
+
+
+class ArchiveCompactor:
+    """
+    Merges a host's small archive files into one file per (host, day).
+
+    Entries are deduplicated (journald cursor, file cursor and line, raw
+    line as fallback), sorted by timestamp and written with zstd,
+    dictionary encoding and large row groups. The merged file is verified before the LogArchive rows are
+    swapped in one transaction; the originals are deleted only afterwards.
+    """
+
+    def __init__(self, small_file_rows=250_000, min_files=2, row_group_size=128_000,
+                 compression='zstd', compression_level=6):
+        self.small_file_rows = small_file_rows
+        self.min_files = min_files
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.compression_level = compression_level
+
+    def candidates(self, host_id):
+        """Small archive files of the host, grouped by their date partition"""
+        groups = defaultdict(list)
+        archives = LogArchive.query.filter(
+            LogArchive.host_id == host_id,
+            LogArchive.record_count < self.small_file_rows
+        ).order_by(LogArchive.id).all()
+        for archive in archives:
+            partition = os.path.dirname(archive.filename)
+            # Only files in the host_id=/date= layout can be merged per day
+            if partition.startswith(f"host_id={host_id}{os.sep}date="):
+                groups[partition].append(archive)
+        return {p: a for p, a in groups.items() if len(a) >= self.min_files}
+
+    def compact_host(self, host_id):
+        """Compacts every eligible day of a host, returns one summary per merged group"""
+        return [self._compact(host_id, partition, archives)
+                for partition, archives in sorted(self.candidates(host_id).items())]
+
+    @staticmethod
+    def deduplicate(table):
+        """
+        Keeps the first occurrence of every entry. Log file cursors
+        (path:offset) repeat for other lines after a truncation or
+        rotation, so file lines are keyed by cursor and text together.
+        """
+        cursor = table['cursor']
+        # journald cursors are "s=<seqnum id>;i=..."
+        is_file = pc.invert(pc.starts_with(cursor, 's='))
+        key = pc.if_else(is_file, pc.binary_join_element_wise(cursor, table['message'], '\n'), cursor)
+        key = pc.coalesce(key, table['raw'], pc.cast(table['timestamp'], pa.string()))
+        keyed = pa.table({'key': key, 'row': pa.array(range(table.num_rows), pa.int64())})
+        rows = keyed.group_by('key').aggregate([('row', 'min')])['row_min']
+        return table.take(pc.take(rows, pc.sort_indices(rows)))
+
+    def _compact(self, host_id, partition, archives):
+        storage_path = DataManager.storage_path()
+        sources = [os.path.join(storage_path, a.filename) for a in archives]
+
+        table = pa.concat_tables([
+            DataManager.read_archive(path, schema=ARCHIVE_SCHEMA) for path in sources if os.path.exists(path)
+        ])
+        merged = self.deduplicate(table).sort_by('timestamp')
+        raw_mode = DataManager.raw_mode()
+        if raw_mode == 'drop':
+            merged = merged.set_column(merged.schema.get_field_index('raw'), 'raw',
+                                       pa.nulls(merged.num_rows, pa.string()))
+        elif raw_mode == 'columnar':
+            # Raw lines as the columnar file gives them back, for _verify
+            merged = raw_columns.canonical(merged)
+
+        # Dot-prefixed temp files are ignored by dataset discovery
+        day = partition.rsplit('date=', 1)[-1].replace('-', '')
+        filename = os.path.join(partition, f"{host_id}_{day}_compacted_{uuid.uuid4().hex[:8]}.parquet")
+        final_path = os.path.join(storage_path, filename)
+        temp_path = os.path.join(storage_path, partition, f".compact-{uuid.uuid4().hex}.parquet")
+
+        # Sidecars are merged too; ARCHIVE_RAW decides where raw goes in the merged file
+        DataManager.write_archive(
+            merged, temp_path, raw_mode,
+            row_group_size=self.row_group_size,
+            compression=self.compression,
+            compression_level=self.compression_level,
+            use_dictionary=True,
+            write_statistics=True
+        )
+
+        try:
+            self._verify(temp_path, merged)
+            if os.path.exists(DataManager.raw_path(temp_path)):
+                os.replace(DataManager.raw_path(temp_path), DataManager.raw_path(final_path))
+            os.replace(temp_path, final_path)
+        except Exception:
+            DataManager.remove_archive(temp_path)
+            raise
+
+        # Swap the LogArchive records atomically
+        try:
+            for archive in archives:
+                db.session.delete(archive)  # with its search index
+            log_archive = LogArchive(host_id=host_id, filename=filename, record_count=merged.num_rows)
+            log_archive.search_index = ArchiveIndex(host_id=host_id, **build_index(merged))
+            db.session.add(log_archive)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            DataManager.remove_archive(final_path)
+            raise
+
+        # Originals go only after the merged file is verified and recorded
+        for path in sources:
+            DataManager.remove_archive(path)
+
+        log.info('partition compacted', extra=fields(partition=partition, files=len(archives),
+                                                     rows_in=table.num_rows, rows_out=merged.num_rows))
+        return {
+            'partition': partition,
+            'files': len(archives),
+            'rows_in': table.num_rows,
+            'rows_out': merged.num_rows,
+            'filename': filename
+        }
+
+    @staticmethod
+    def _verify(path, expected):
+        """Reads the merged file back and checks row count and content"""
+        written = DataManager.read_archive(path, schema=ARCHIVE_SCHEMA)
+        if written.num_rows != expected.num_rows:
+            raise ValueError(f"compaction check failed: {written.num_rows} rows written, {expected.num_rows} expected")
+        if not written.equals(expected):
+            raise ValueError("compaction check failed: merged file differs from source rows")
+
+
+def compact_all(app=None):
+    """Compacts the archives of every host (schedulable job)"""
+    compactor = ArchiveCompactor()
+    summary = []
+    for (host_id,) in db.session.query(Host.id).order_by(Host.id).all():
+        summary.extend(compactor.compact_host(host_id))
+    return summary
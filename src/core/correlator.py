@@ -0,0 +1,208 @@
+import threading
+from collections import OrderedDict
+
+
+class WindowCounter:
+    """Event count over a sliding window kept as a ring of fixed-width buckets"""
+    __slots__ = ('counts', 'head')
+
+    def __init__(self, buckets):
+        self.counts = [0] * buckets
+        self.head = None  # absolute index of the newest bucket
+
+    def add(self, bucket):
+        size = len(self.counts)
+        if self.head is None:
+            self.head = bucket
+        elif bucket > self.head:
+            # Clear the buckets that slid out of the window
+            for i in range(1, min(bucket - self.head, size) + 1):
+                self.counts[(self.head + i) % size] = 0
+            self.head = bucket
+        elif bucket <= self.head - size:
+            return  # older than the window
+        self.counts[bucket % size] += 1
+
+    def total(self):
+        return sum(self.counts)
+
+
+class DistinctWindow:
+    """Distinct values seen inside the window, capped at `cap` entries"""
+    __slots__ = ('seen',)
+
+    def __init__(self):
+        self.seen = {}  # value -> newest bucket it was seen in
+
+    def add(self, value, bucket, horizon, cap):
+        if value is None:
+            return
+        self.seen[value] = max(bucket, self.seen.get(value, bucket))
+        if len(self.seen) > cap:
+            # Forget expired values first, then the stalest one
+            self.seen = {v: b for v, b in self.seen.items() if b > horizon}
+            if len(self.seen) > cap:
+                del self.seen[min(self.seen, key=self.seen.get)]
+
+    def count(self, horizon):
+        return sum(1 for b in self.seen.values() if b > horizon)
+
+
+class _KeyState:
+    __slots__ = ('window', 'alerted_at', 'suppressed')
+
+    def __init__(self, window):
+        self.window = window
+        self.alerted_at = None  # event time of the last aggregated alert
+        self.suppressed = 0     # single-line alerts folded into it since then
+
+
+class _LRU(OrderedDict):
+    """Key -> state table with a hard size limit (least recently used goes first)"""
+
+    def __init__(self, max_keys, factory):
+        super().__init__()
+        self.max_keys = max_keys
+        self.factory = factory
+
+    def touch(self, key):
+        state = self.get(key)
+        if state is None:
+            state = self[key] = self.factory()
+            if len(self) > self.max_keys:
+                self.popitem(last=False)
+        else:
+            self.move_to_end(key)
+        return state
+
+
+class Correlator:
+    """
+    Streaming correlation of failed logins, run after the parser.
+
+    Keeps bounded, in-memory sliding windows (event time) per:
+    - (source_ip, host)  -> failure count           -> 'brute_force'
+    - source_ip          -> distinct target users   -> 'password_spray'
+    - target_user        -> distinct source IPs     -> 'distributed_attack'
+
+    When a threshold is crossed one aggregated alert is emitted and further
+    failures matching the key are folded into it for the rest of the window,
+    instead of producing one alert per log line. A still-ongoing attack gets
+    a fresh aggregated alert once per window.
+    """
+
+    # Rules tagged `category: auth_failure` count as failed logins too
+    FAILED_TYPES = ('ssh_failed',)
+
+    def __init__(self, window=300, buckets=10, brute_force=10, spray_users=5,
+                 distributed_ips=10, max_keys=100_000):
+        self.window = window
+        self.buckets = buckets
+        self.bucket_width = window / buckets
+        self.brute_force = brute_force
+        self.spray_users = spray_users
+        self.distributed_ips = distributed_ips
+
+        self.by_ip_host = _LRU(max_keys, lambda: _KeyState(WindowCounter(buckets)))
+        self.by_ip = _LRU(max_keys, lambda: _KeyState(DistinctWindow()))
+        self.by_user = _LRU(max_keys, lambda: _KeyState(DistinctWindow()))
+        self._lock = threading.Lock()
+
+    def process(self, host_id, events):
+        """
+        Feeds parsed events through the windows. Returns the events to turn
+        into alerts: single-line events that were not folded into an attack,
+        plus the aggregated attack events.
+        """
+        output = []
+        with self._lock:
+            for event in events:
+                if event.get('category') != 'auth_failure' and event['type'] not in self.FAILED_TYPES:
+                    output.append(event)
+                    continue
+                aggregated, suppressed = self._observe(host_id, event)
+                output.extend(aggregated)
+                if not suppressed:
+                    output.append(event)
+        return output
+
+    def _observe(self, host_id, event):
+        ts = event['timestamp'].timestamp()
+        bucket = int(ts // self.bucket_width)
+        horizon = bucket - self.buckets
+        ip, user = event['source_ip'], event['target_user']
+        cap = max(self.spray_users, self.distributed_ips) * 2
+
+        ip_host = self.by_ip_host.touch((ip, host_id))
+        ip_host.window.add(bucket)
+        ip_state = self.by_ip.touch(ip)
+        ip_state.window.add(user, bucket, horizon, cap)
+        user_state = self.by_user.touch(user)
+        user_state.window.add(ip, bucket, horizon, cap)
+
+        checks = (
+            ('brute_force', ip_host, ip_host.window.total() >= self.brute_force),
+            ('password_spray', ip_state, ip_state.window.count(horizon) >= self.spray_users),
+            ('distributed_attack', user_state, user_state.window.count(horizon) >= self.distributed_ips),
+        )
+
+        aggregated = []
+        suppressed = False
+        for attack, state, triggered in checks:
+            active = state.alerted_at is not None and ts - state.alerted_at < self.window
+            if active:
+                state.suppressed += 1
+                suppressed = True
+            elif triggered:
+                state.alerted_at = ts
+                state.suppressed = 0
+                aggregated.append(self._attack_event(attack, host_id, event, state, horizon))
+                suppressed = True
+        return aggregated, suppressed
+
+    def _attack_event(self, attack, host_id, event, state, horizon):
+        ip, user = event['source_ip'], event['target_user']
+        minutes = max(1, round(self.window / 60))
+
+        if attack == 'brute_force':
+            title = f"ATAK BRUTE FORCE: {state.window.total()} nieudanych logowań z {ip} w ciągu {minutes} min"
+            source_ip, target_user = ip, user
+        elif attack == 'password_spray':
+            title = f"PASSWORD SPRAY: {ip} próbuje {state.window.count(horizon)} różnych kont w ciągu {minutes} min"
+            source_ip, target_user = ip, None
+        else:
+            title = f"ATAK ROZPROSZONY: {state.window.count(horizon)} adresów IP atakuje konto {user} w ciągu {minutes} min"
+            source_ip, target_user = None, user
+
+        return {
+            'timestamp': event['timestamp'],
+            'type': attack,
+            'severity': 'CRITICAL',
+            'source_ip': source_ip,
+            'target_user': target_user,
+            'message': event['message'],
+            'title': title
+        }
+
+
+_correlator = None
+_correlator_lock = threading.Lock()
+
+
+def build_correlator(config):
+    """New correlator with the thresholds from app config"""
+    return Correlator(
+        window=config['CORRELATION_WINDOW'],
+        brute_force=config['CORRELATION_BRUTE_FORCE'],
+        spray_users=config['CORRELATION_SPRAY_USERS'],
+        distributed_ips=config['CORRELATION_DISTRIBUTED_IPS']
+    )
+
+
+def get_correlator(config):
+    """Process-wide correlator (state must survive between batches), built from app config"""
+    global _correlator
+    with _correlator_lock:
+        if _correlator is None:
+            _correlator = build_correlator(config)
+        return _correlator
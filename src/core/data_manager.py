@@ -1,51 +1,239 @@
 import os
+import uuid
+from collections import namedtuple
 import pandas as pd
 import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
 import pyarrow.parquet as pq
-from datetime import datetime
-from flask import current_app
+from datetime import datetime, timezone
+from flask import current_app, has_app_context
+
+from core import raw_columns
+from core.archive_index import build_index
+from core.logs import fields, get_logger
+
+log = get_logger('archive')
+
+# Columns of every archive file
+ARCHIVE_SCHEMA = pa.schema([
+    ('timestamp', pa.float64()),   # epoch seconds (UTC)
+    ('message', pa.string()),
+    ('hostname', pa.string()),
+    ('cursor', pa.string()),       # journald __CURSOR, <path>:<end offset> for log file lines
+    ('source', pa.string()),       # LogSource name (core/sources.py), null in older files
+    ('raw', pa.string()),          # full journal JSON line, the line itself for log files
+])
+
+# Where the raw journal line is kept (ARCHIVE_RAW):
+#   inline    in the `raw` column of the archive file
+#   separate  in a `_raw_<file>` sidecar next to it (same rows, same order),
+#             so scans of the archive never touch it
+#   drop      not stored
+#   columnar  split into typed, dictionary-encoded columns of the archive
+#             file and rebuilt on read (see core/raw_columns.py)
+RAW_MODES = ('inline', 'separate', 'drop', 'columnar')
+RAW_PREFIX = '_raw_'
+# Ingest writes: snappy, or zstd at a fast level for columnar files
+# (compaction rewrites them at its own, higher level)
+WRITE_OPTIONS = {'compression': 'snappy'}
+COLUMNAR_WRITE_OPTIONS = {'compression': 'zstd', 'compression_level': 1}
+
+# One written archive file: path relative to STORAGE_PATH, rows, and its
+# search index entry (core.archive_index.build_index) for ArchiveIndex
+ArchiveFile = namedtuple('ArchiveFile', ['filename', 'record_count', 'index'])
+
+# Archive layout: <storage>/host_id=<id>/date=<YYYY-MM-DD>/<file>.parquet
+PARTITIONING = ds.partitioning(
+    pa.schema([('host_id', pa.int32()), ('date', pa.string())]),
+    flavor='hive'
+)
+
+
+def _epoch(value):
+    """datetime (naive = UTC) or epoch seconds -> epoch seconds"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
 
 class DataManager:
     @staticmethod
-    def save_logs(host_id, logs_list):
+    def storage_path():
+        return current_app.config.get('STORAGE_PATH', './data/archives')
+
+    @staticmethod
+    def raw_mode():
+        if not has_app_context():
+            return 'inline'
+        return current_app.config.get('ARCHIVE_RAW', 'inline')
+
+    @staticmethod
+    def raw_path(full_path):
+        """Sidecar holding the raw lines of an archive file (ARCHIVE_RAW=separate)"""
+        directory, name = os.path.split(full_path)
+        return os.path.join(directory, RAW_PREFIX + name)
+
+    @staticmethod
+    def write_archive(table, full_path, raw_mode='inline', **options):
+        """
+        Writes one archive file (pq.write_table options pass through).
+        With raw_mode='separate' the raw column goes to the sidecar and is
+        left empty in the main file; with 'drop' it is not written at all.
         """
-        Saves logs to a Parquet file for forensic analysis.
-        Returns the filename if successful, None otherwise.
+        if raw_mode not in RAW_MODES:
+            raise ValueError(f"unknown ARCHIVE_RAW mode '{raw_mode}'")
+        raw = table['raw']
+        if raw_mode == 'columnar':
+            for name, column in raw_columns.split(table).items():
+                table = table.append_column(name, column)
+            options = {**options, **raw_columns.ENCODING_OPTIONS}
+        if raw_mode != 'inline':
+            table = table.set_column(table.schema.get_field_index('raw'), 'raw', pa.nulls(table.num_rows, pa.string()))
+        if raw_mode == 'separate':
+            pq.write_table(pa.table({'raw': raw}), DataManager.raw_path(full_path), **options)
+        pq.write_table(table, full_path, **options)
+
+    @staticmethod
+    def read_archive(full_path, columns=None, schema=None):
+        """
+        Reads one archive file, with the raw lines from its sidecar when there
+        is one, or rebuilt from the journal columns of a columnar file
         """
-        if not logs_list:
-            return None
+        parquet = pq.ParquetFile(full_path)
+        stored = parquet.schema_arrow.names
+        if raw_columns.KEYS in stored:
+            # Columnar file: only the archive columns are returned
+            columns = [c for c in (columns or ARCHIVE_SCHEMA.names) if c in stored]
+        table = pq.read_table(full_path, columns=columns, schema=schema)
+        if 'raw' not in table.column_names:
+            return table
 
-        # Convert logs_list to DataFrame
-        df = pd.DataFrame(logs_list)
+        if raw_columns.KEYS in stored:
+            journal = parquet.read(columns=[c for c in stored if c in raw_columns.COLUMNS or c in ('message', 'cursor', 'hostname')])
+            raw = raw_columns.join(journal)
+        elif os.path.exists(DataManager.raw_path(full_path)):
+            raw = pq.read_table(DataManager.raw_path(full_path), columns=['raw'])['raw']
+        else:
+            return table
+        return table.set_column(table.schema.get_field_index('raw'), 'raw', raw)
+
+    @staticmethod
+    def remove_archive(full_path):
+        """Deletes an archive file and its raw sidecar"""
+        for path in (full_path, DataManager.raw_path(full_path)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def to_table(logs_list):
+        """Collector records -> Arrow table in the archive schema (built once per batch)"""
+        return pa.Table.from_pylist(logs_list, schema=ARCHIVE_SCHEMA)
+
+    @staticmethod
+    def day_keys(table):
+        """Partition key of every row: its UTC day as YYYY-MM-DD"""
+        micros = pc.cast(pc.floor(pc.multiply(table['timestamp'], 1_000_000)), pa.int64())
+        return pc.strftime(pc.cast(micros, pa.timestamp('us', tz='UTC')), format='%Y-%m-%d')
+
+    @staticmethod
+    def save_logs(host_id, logs_list, storage_path=None, raw_mode=None):
+        """
+        Saves logs to the partitioned Parquet archive for forensic analysis.
+        Accepts collector records or a table from to_table(). A batch spanning
+        several days is split into one file per day.
+        Returns a list of ArchiveFile (filename relative to STORAGE_PATH,
+        record count, search index entry); an empty list if nothing was saved.
+        Pass `storage_path` and `raw_mode` when calling outside an app context
+        (writer threads).
+        """
+        if isinstance(logs_list, pa.Table):
+            table = logs_list
+        elif logs_list:
+            table = DataManager.to_table(logs_list)
+        else:
+            return []
+        if table.num_rows == 0:
+            return []
+
+        # Partition key: UTC day of each entry
+        days = DataManager.day_keys(table)
 
         # Generate a unique filename
         # Format: hostID_TIMESTAMP_UUID.parquet
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{host_id}_{timestamp}.parquet"
-        
+        basename = f"{host_id}_{timestamp}_{uuid.uuid4().hex[:8]}.parquet"
+
         # Get storage path from config
-        storage_path = current_app.config.get('STORAGE_PATH', './data/archives')
-        full_path = os.path.join(storage_path, filename)
+        storage_path = storage_path or DataManager.storage_path()
+        raw_mode = raw_mode or DataManager.raw_mode()
 
         # Save to Parquet (with compression to save space)
-        # Requires: pandas, pyarrow
+        # Requires: pyarrow
+        saved = []
         try:
-            # Ensure directory exists
-            os.makedirs(storage_path, exist_ok=True)
-            
-            df.to_parquet(full_path, engine='pyarrow', compression='snappy')
-            print(f"[Forensics] Logs saved to {full_path}")
-            return filename
+            for day in pc.unique(days).to_pylist():
+                part = table.filter(pc.equal(days, day))
+                filename = os.path.join(f"host_id={host_id}", f"date={day}", basename)
+                full_path = os.path.join(storage_path, filename)
+
+                # Ensure directory exists
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+                options = COLUMNAR_WRITE_OPTIONS if raw_mode == 'columnar' else WRITE_OPTIONS
+                DataManager.write_archive(part, full_path, raw_mode, **options)
+                saved.append(ArchiveFile(filename, part.num_rows, build_index(part)))
+                log.debug('archive saved', extra=fields(path=full_path, rows=part.num_rows))
+            return saved
         except Exception as e:
-            print(f"[Error] Failed to save parquet: {e}")
-            return None
+            log.error('archive save failed', extra=fields(host_id=host_id, error=e))
+            return saved
 
     @staticmethod
     def load_logs(filename):
         """Loads logs from a file for analysis"""
-        storage_path = current_app.config.get('STORAGE_PATH', './data/archives')
-        full_path = os.path.join(storage_path, filename)
-        
+        full_path = os.path.join(DataManager.storage_path(), filename)
+
         if os.path.exists(full_path):
-            return pd.read_parquet(full_path)
-        return pd.DataFrame()
\ No newline at end of file
+            return DataManager.read_archive(full_path).to_pandas()
+        return pd.DataFrame()
+
+    @staticmethod
+    def dataset():
+        """The whole archive as one pyarrow dataset (host_id and date come from the path)"""
+        storage_path = DataManager.storage_path()
+        os.makedirs(storage_path, exist_ok=True)
+        schema = pa.unify_schemas([ARCHIVE_SCHEMA, PARTITIONING.schema])
+        return ds.dataset(storage_path, schema=schema, format='parquet', partitioning=PARTITIONING)
+
+    @staticmethod
+    def query(host_ids=None, start=None, end=None, columns=None, filter=None, batches=False):
+        """
+        Queries the archive without loading whole files.
+        - host_ids / start / end prune partitions (directories) first,
+        - start / end (datetime or epoch seconds) also filter `timestamp`,
+          which skips row groups by their min/max statistics,
+        - `filter` is an extra pyarrow.dataset expression, pushed down too.
+        Returns a pyarrow.Table, or an iterator of RecordBatches with batches=True.
+        """
+        # Files outside the host_id=/date= layout (pre-partitioning archives) are skipped
+        expr = ds.field('host_id').is_valid()
+        if host_ids:
+            expr &= ds.field('host_id').isin(list(host_ids))
+        if start is not None:
+            start = _epoch(start)
+            expr &= ds.field('date') >= datetime.fromtimestamp(start, timezone.utc).strftime('%Y-%m-%d')
+            expr &= ds.field('timestamp') >= start
+        if end is not None:
+            end = _epoch(end)
+            expr &= ds.field('date') <= datetime.fromtimestamp(end, timezone.utc).strftime('%Y-%m-%d')
+            expr &= ds.field('timestamp') <= end
+        if filter is not None:
+            expr &= filter
+
+        dataset = DataManager.dataset()
+        if batches:
+            return dataset.to_batches(columns=columns, filter=expr)
+        return dataset.to_table(columns=columns, filter=expr)
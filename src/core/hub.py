@@ -0,0 +1,177 @@
+import threading
+from collections import deque
+
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from models import Alert
+from core import rollups
+from core.logs import fields, get_logger
+
+log = get_logger('hub')
+
+
+class Subscription:
+    """
+    One client's bounded buffer. Publishing never blocks: when the buffer
+    is full the oldest message is dropped and the client is told to resync
+    (reload through the REST endpoints) instead of replaying the backlog.
+    """
+
+    def __init__(self, size):
+        self.buffer = deque(maxlen=size)
+        self.dropped = 0
+        self.lagged = False
+        self._ready = threading.Condition()
+
+    def put(self, message):
+        with self._ready:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+                self.lagged = True
+            self.buffer.append(message)
+            self._ready.notify()
+
+    def get(self, timeout):
+        """Pending messages (oldest first); [] after `timeout` seconds without any"""
+        with self._ready:
+            if not self.buffer:
+                self._ready.wait(timeout)
+            if self.lagged:
+                # Everything still buffered is stale anyway
+                self.buffer.clear()
+                self.lagged = False
+                return [('resync', {'dropped': self.dropped})]
+            messages = list(self.buffer)
+            self.buffer.clear()
+            return messages
+
+
+class AlertHub:
+    """In-process pub/sub fan-out: one publish reaches every connected dashboard"""
+
+    def __init__(self, buffer_size=100):
+        self.buffer_size = buffer_size
+        self.subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = Subscription(self.buffer_size)
+        with self._lock:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscribers.discard(subscription)
+
+    def publish(self, event, data):
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.put((event, data))
+
+
+def alert_json(alert):
+    """Same shape as the rows of /api/alerts/recent"""
+    return {
+        'id': alert.id,
+        'timestamp': alert.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        'severity': alert.severity,
+        'host': alert.host.name if alert.host else 'Unknown',
+        'message': alert.message
+    }
+
+
+def severity_counts():
+    """Same shape as /api/alerts/stats"""
+    result = {'CRITICAL': 0, 'WARNING': 0, 'INFO': 0}
+    for r in rollups.read('severity'):
+        if r.key in result:
+            result[r.key] = r.count
+    return result
+
+
+class AlertFeed(threading.Thread):
+    """
+    Publishes newly committed alerts and the updated counters to the hub.
+
+    Alerts are committed by job workers (other processes), the streamer and
+    the scheduler, so the feed tails the alerts table by id: one indexed
+    query per `interval` seconds for all clients together, and none while
+    nobody is connected. notify() wakes it right after a local commit.
+    """
+
+    BATCH = 200
+
+    def __init__(self, app, hub, interval=2.0):
+        super().__init__(name='alert-feed', daemon=True)
+        self.app = app
+        self.hub = hub
+        self.interval = interval
+        self.last_id = None
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+
+    def notify(self):
+        self._wake.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.poll()
+            except Exception as e:
+                log.error('alert feed poll failed', extra=fields(error=e))
+
+    def poll(self):
+        if not self.hub.subscribers or self.last_id is None:
+            # Nobody listening: only keep the position
+            self.last_id = db.session.query(db.func.max(Alert.id)).scalar() or 0
+            return
+
+        published = 0
+        while True:
+            alerts = Alert.query.options(joinedload(Alert.host)).filter(
+                Alert.id > self.last_id
+            ).order_by(Alert.id).limit(self.BATCH).all()
+            for alert in alerts:
+                self.hub.publish('alert', alert_json(alert))
+            if alerts:
+                self.last_id = alerts[-1].id
+                published += len(alerts)
+            if len(alerts) < self.BATCH:
+                break
+
+        if published:
+            self.hub.publish('stats', severity_counts())
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+
+
+hub = AlertHub()
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def start_feed(app):
+    """Starts the feed thread once per process (first SSE client)"""
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            hub.buffer_size = app.config['ALERT_STREAM_BUFFER']
+            _feed = AlertFeed(app, hub, interval=app.config['ALERT_STREAM_INTERVAL'])
+            with app.app_context():
+                _feed.last_id = db.session.query(db.func.max(Alert.id)).scalar() or 0
+            _feed.start()
+    return _feed
+
+
+def notify():
+    """Called after alerts are committed in this process: push them without waiting for the next poll"""
+    if _feed is not None:
+        _feed.notify()
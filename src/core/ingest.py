@@ -0,0 +1,442 @@
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from flask import current_app
+import pyarrow as pa
+
+from extensions import db
+from models import LogSource, LogArchive, ArchiveIndex, Alert
+from core.collector import LogCollector
+from core.data_manager import DataManager
+from core.parser import LogParser
+from core import rollups, hub
+from core.correlator import get_correlator
+from core.logs import fields, get_logger
+from core.metrics import ALERT_INSERT_DURATION, ALERTS_INSERTED, FETCH_DURATION, FETCH_LINES
+from core.reputation import get_reputation
+from core.sources import DEFAULT_SOURCE, journal_cursor, rule_routes, source_ref
+from core.storage import WriteBehindBuffer
+
+log = get_logger('ingest')
+
+# Parquet writes of ingested batches run here, next to detection
+# (pyarrow releases the GIL while compressing and writing)
+_archive_writer = ThreadPoolExecutor(max_workers=int(os.environ.get('ARCHIVE_WRITERS', 4)),
+                                     thread_name_prefix='archive-writer')
+
+# Plain snapshot of a Host row, safe to hand over to worker threads
+HostRef = namedtuple('HostRef', ['id', 'name', 'ip_address'])
+
+
+class FetchResult:
+    """Outcome of the fetch/save/parse stage for one host (no DB writes)"""
+    def __init__(self, host):
+        self.host = host
+        self.logs_count = 0
+        self.archives = []  # ArchiveFile records written by DataManager.save_logs
+        self.events = []
+        self.error = None
+        self.latency = 0.0
+        self.cursor = None  # journald cursor of the newest entry in the batch
+        self.offsets = {}  # log file source name -> offset after its newest line
+
+
+def host_ref(host):
+    return HostRef(host.id, host.name, host.ip_address)
+
+
+def host_sources(host_ids):
+    """
+    Log sources (SourceRefs with their cursors) of every host, in id order,
+    one per name; the default ssh.service source for hosts without any
+    """
+    found = {host_id: {} for host_id in host_ids}
+    for log_source in LogSource.query.filter(LogSource.host_id.in_(host_ids)).order_by(LogSource.id):
+        ref = source_ref(log_source)
+        found[log_source.host_id].setdefault(ref.name, ref)
+    return {host_id: list(refs.values()) or [DEFAULT_SOURCE] for host_id, refs in found.items()}
+
+
+def collect(host, sources=None, timeout=None):
+    """
+    Fetch (SSH) -> Parse + Save (Parquet), for a single host.
+    Only entries after the cursors of its `sources` (see host_sources) are
+    fetched, all sources over one SSH session. Touches only the filesystem,
+    so it can run in a worker thread (inside an app context).
+    A large backlog is processed in FETCH_CHUNK_SIZE chunks as it arrives,
+    so memory stays bounded by the chunk size instead of the backlog.
+    `timeout` also bounds the archiving: no chunk is saved after it.
+    """
+    started = time.monotonic()
+    config = current_app.config
+    sources = sources or [DEFAULT_SOURCE]
+    routes = rule_routes(sources)
+
+    collector = LogCollector.from_config(config)
+    result = FetchResult(host)
+    chunks = collector.iter_logs(host, timeout=timeout, cursor=journal_cursor(sources),
+                                 chunk_size=config.get('FETCH_CHUNK_SIZE', 50_000), sources=sources)
+    for logs in chunks:
+        if timeout and time.monotonic() - started > timeout:
+            # The caller gives up on the host: the rest is fetched again next time
+            result.error = f"fetch exceeded {timeout}s"
+            chunks.close()
+            break
+        part = process(host, logs, routes)
+        result.logs_count += part.logs_count
+        result.archives.extend(part.archives)
+        result.events.extend(part.events)
+        result.cursor = part.cursor or result.cursor
+        result.offsets.update(part.offsets)
+        if part.error:
+            # Entries after a failed save must be fetched again
+            result.error = part.error
+            chunks.close()
+            break
+
+    result.error = result.error or collector.last_error
+    result.latency = time.monotonic() - started
+    FETCH_DURATION.labels(host.name).observe(result.latency)
+    return result
+
+
+def process(host, logs, routes=None):
+    """
+    Parse-on-ingest for an already fetched batch of log records: the batch
+    becomes one Arrow table, detection runs on it in memory while the
+    archive write (Save -> Parquet) runs on a writer thread. `routes`
+    (core.sources.rule_routes) picks the rule packs of each log source.
+    """
+    result = FetchResult(host)
+    result.logs_count = len(logs)
+    FETCH_LINES.labels(host.name).inc(len(logs))
+
+    if logs:
+        try:
+            table = DataManager.to_table(logs)
+        except (pa.ArrowException, ValueError, TypeError) as e:
+            # Nothing of the batch is saved, the cursor stays before it
+            result.error = f"unreadable log records: {e}"
+            log.warning('batch conversion failed', extra=fields(host=host.name, records=len(logs), error=e))
+            return result
+        saving = _archive_writer.submit(DataManager.save_logs, host.id, table,
+                                        DataManager.storage_path(), DataManager.raw_mode())
+
+        events = LogParser(table, routes=routes).parse()
+        if current_app.config.get('REPUTATION_ENABLED'):
+            # Trusted ranges dropped, known-bad addresses escalated
+            events = get_reputation(current_app.config).apply(events)
+
+        result.archives = saving.result()
+        if sum(archive.record_count for archive in result.archives) == len(logs):
+            # Only archived entries move the cursor (and log file offsets) forward
+            result.cursor, result.offsets = positions(logs)
+        else:
+            result.error = 'Failed to save logs'
+            # Keep only events of archived entries; the rest is fetched again
+            saved_days = {archive.filename.split('date=', 1)[1].split(os.sep, 1)[0] for archive in result.archives}
+            events = [e for e in events if naive_utc(e['timestamp']).strftime('%Y-%m-%d') in saved_days]
+        result.events = events
+
+    return result
+
+
+def positions(logs):
+    """(journal cursor of the newest entry, {log file source: offset after its newest line}) of a batch"""
+    cursor, offsets = None, {}
+    for record in reversed(logs):
+        if 'offset' in record:
+            offsets.setdefault(record['source'], record['offset'])
+        elif cursor is None and record.get('cursor'):
+            cursor = record['cursor']
+    return cursor, offsets
+
+
+def alert_message(event):
+    """Human readable alert text for a parsed event"""
+    banned = event.get('reputation') == 'BANNED'
+    if event.get('title'):
+        message = event['title']  # aggregated / rule-provided text
+        return f"ZABLOKOWANY ADRES: {message}" if banned else message
+    if banned:
+        return f"ALERT KRYTYCZNY: Aktywność zablokowanego adresu {event['source_ip']} (użytkownik {event['target_user']})"
+    severity_level = event['severity']
+    if severity_level == 'CRITICAL':
+        return f"ALERT KRYTYCZNY: Próba włamania na ROOT z {event['source_ip']}"
+    elif severity_level == 'WARNING':
+        return f"Uwaga: Błędne logowanie użytkownika {event['target_user']} z {event['source_ip']}"
+    return f"Logowanie: {event['target_user']} z {event['source_ip']}"
+
+
+def naive_utc(ts):
+    """Aware datetimes -> naive UTC, the form alerts are stored in"""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def alert_fingerprint(host_id, timestamp, source_ip, target_user):
+    """Content hash identifying an alert: same host, time, IP and user -> same alert"""
+    key = f"{host_id}|{naive_utc(timestamp).isoformat(sep=' ')}|{source_ip}|{target_user}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _insert_ignoring_conflicts(rows):
+    """
+    Bulk INSERT of alert mappings that skips rows whose fingerprint
+    already exists (stored meanwhile by another writer, e.g. a backfill).
+    Returns the fingerprints that were actually inserted.
+    """
+    dialect = db.engine.dialect
+    if dialect.name in ('sqlite', 'postgresql'):
+        if dialect.name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(Alert).on_conflict_do_nothing(index_elements=['fingerprint'])
+        if dialect.insert_executemany_returning:
+            # Skipped rows return nothing
+            return {fingerprint for fingerprint, in db.session.execute(stmt.returning(Alert.fingerprint), rows)}
+    else:
+        # Rows were already filtered against the table, plain bulk insert
+        stmt = db.insert(Alert)
+    # No RETURNING (SQLite before 3.35): check the fingerprints first, inside the same transaction
+    fingerprints = [row['fingerprint'] for row in rows]
+    existing = set()
+    for i in range(0, len(fingerprints), 500):
+        existing.update(f for f, in db.session.query(Alert.fingerprint)
+                        .filter(Alert.fingerprint.in_(fingerprints[i:i + 500])))
+    db.session.execute(stmt, rows)
+    return set(fingerprints) - existing
+
+
+def alert_rows(host_id, events):
+    """Parsed events -> alert mappings by fingerprint (duplicates inside the batch dropped)"""
+    rows = {}
+    for event in events:
+        timestamp = naive_utc(event['timestamp'])
+        fingerprint = alert_fingerprint(host_id, timestamp, event['source_ip'], event['target_user'])
+        if fingerprint in rows:
+            continue  # Duplicate inside the batch
+
+        severity_level = event['severity']
+        rows[fingerprint] = {
+            'host_id': host_id,
+            'severity': severity_level,
+            'source_ip': event['source_ip'],
+            'target_user': event['target_user'],
+            'message': alert_message(event),
+            'timestamp': timestamp,
+            'is_resolved': severity_level == 'INFO',
+            'fingerprint': fingerprint
+        }
+    return rows
+
+
+def _drop_existing(rows):
+    """Removes alerts that are already stored: one SELECT per host over the batch's time window"""
+    windows = {}
+    for row in rows.values():
+        low, high = windows.get(row['host_id'], (row['timestamp'], row['timestamp']))
+        windows[row['host_id']] = (min(low, row['timestamp']), max(high, row['timestamp']))
+
+    for host_id, (low, high) in windows.items():
+        existing = db.session.query(Alert.fingerprint).filter(
+            Alert.host_id == host_id,
+            Alert.timestamp.between(low, high)
+        )
+        for (fingerprint,) in existing:
+            rows.pop(fingerprint, None)  # Skip duplicate alert
+
+
+def _insert_rows(rows):
+    """
+    Drops the alerts of `rows` that are already stored, inserts the rest.
+    `rows` is left with the alerts actually inserted, the only ones
+    counted in the rollups.
+    """
+    started = time.perf_counter()
+    _drop_existing(rows)
+    if rows:
+        inserted = _insert_ignoring_conflicts(list(rows.values()))
+        for fingerprint in [f for f in rows if f not in inserted]:
+            del rows[fingerprint]
+        # Dashboard counters of the inserted alerts, committed together with them
+        rollups.apply(rows.values())
+    ALERT_INSERT_DURATION.observe(time.perf_counter() - started)
+    ALERTS_INSERTED.inc(len(rows))
+
+
+def insert_alerts(host_id, events):
+    """
+    Set-based deduplication: fingerprints of the batch are checked against
+    the existing ones from the batch's time window (one SELECT), and the new
+    alerts go in with one executemany. Returns the number of new alerts.
+    """
+    if not events:
+        return 0
+
+    rows = alert_rows(host_id, events)
+    _insert_rows(rows)
+    return len(rows)
+
+
+def _log_sources(host_ids):
+    """LogSources of every host (the default one created when missing), with one query"""
+    sources = {host_id: [] for host_id in host_ids}
+    for log_source in LogSource.query.filter(LogSource.host_id.in_(host_ids)).order_by(LogSource.id):
+        sources[log_source.host_id].append(log_source)
+    for host_id, found in sources.items():
+        if not found:
+            # Create initial LogSource record
+            found.append(LogSource(host_id=host_id, log_type=DEFAULT_SOURCE.name,
+                                   units=','.join(DEFAULT_SOURCE.units), last_fetch=None))
+            db.session.add(found[0])
+    return sources
+
+
+def _correlate(results):
+    """
+    Events of each FetchResult after correlation. The correlator keeps
+    state, so this runs once per result, before its transaction: a
+    retried write reuses the output instead of counting the events twice.
+    """
+    if not current_app.config.get('CORRELATION_ENABLED'):
+        return [result.events for result in results]
+    # Fold repeated failures into aggregated attack alerts
+    correlator = get_correlator(current_app.config)
+    return [correlator.process(result.host.id, result.events) for result in results]
+
+
+def _stage(results, events):
+    """
+    Adds the writes of FetchResults to the session without committing:
+    LogArchive records and LogSource state per result, and the new alerts
+    of all of them (`events`, see _correlate) deduplicated and inserted
+    together. Returns the number of new alerts of each result.
+    """
+    sources = _log_sources({result.host.id for result in results})
+    rows, owner = {}, {}
+
+    for i, result in enumerate(results):
+        host_id = result.host.id
+
+        # Record in LogArchive, with the file's search index
+        for archive in result.archives:
+            log_archive = LogArchive(host_id=host_id, filename=archive.filename, record_count=archive.record_count)
+            if archive.index:
+                log_archive.search_index = ArchiveIndex(host_id=host_id, **archive.index)
+            db.session.add(log_archive)
+
+        # Generating alerts based on parsed events
+        for fingerprint, row in alert_rows(host_id, events[i]).items():
+            if fingerprint not in rows:
+                rows[fingerprint], owner[fingerprint] = row, i
+
+        # Updating state: journal sources share the journalctl stream's cursor, files have their offsets
+        for log_source in sources[host_id]:
+            log_source.last_fetch = datetime.utcnow()
+            if log_source.path:
+                if log_source.log_type in result.offsets:
+                    log_source.cursor = str(result.offsets[log_source.log_type])
+            elif result.cursor:
+                log_source.cursor = result.cursor
+
+    # Deduplicated in bulk
+    _insert_rows(rows)
+
+    counts = [0] * len(results)
+    for fingerprint in rows:
+        counts[owner[fingerprint]] += 1
+    return counts
+
+
+def store(result):
+    """
+    Writes one FetchResult to the database: LogArchive record, new alerts
+    and LogSource state, in a single commit. Returns the number of alerts.
+    """
+    return _store_one(result, _correlate([result])[0])
+
+
+def _store_one(result, events):
+    alerts_count = _stage([result], [events])[0]
+    db.session.commit()
+
+    if alerts_count:
+        # Live dashboards get them right away (see core/hub.py)
+        hub.notify()
+
+    return alerts_count
+
+
+def store_many(results):
+    """
+    Writes several FetchResults in one transaction (write-behind flush):
+    one LogSource query, one alert insert and one rollup update per batch.
+    Returns their alert counts; if the batch fails, every result is
+    retried in its own transaction and gets its own count or exception.
+    """
+    events = _correlate(results)
+    try:
+        counts = _stage(results, events)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log.warning('batched store failed, storing one by one', extra=fields(results=len(results), error=e))
+        counts = []
+        for result, result_events in zip(results, events):
+            try:
+                counts.append(_store_one(result, result_events))
+            except Exception as single:
+                db.session.rollback()
+                counts.append(single)
+        return counts
+
+    if any(counts):
+        hub.notify()
+    return counts
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def submit(result):
+    """
+    Hands a FetchResult to the write-behind buffer (WRITE_BEHIND): results
+    from all fetch/stream threads are committed together, by size or time.
+    Returns a Future of the alert count. Stores right away when disabled.
+    """
+    global _buffer
+    app = current_app._get_current_object()
+    if not app.config.get('WRITE_BEHIND'):
+        future = Future()
+        try:
+            future.set_result(store(result))
+        except Exception as e:
+            db.session.rollback()
+            future.set_exception(e)
+        return future
+
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = WriteBehindBuffer(app, store_many,
+                                        max_items=app.config['WRITE_BEHIND_MAX_ITEMS'],
+                                        max_delay=app.config['WRITE_BEHIND_MAX_DELAY'])
+            _buffer.start()
+    return _buffer.submit(result)
+
+
+def drain(timeout=10):
+    """Commits what is still queued in the write-behind buffer (before exiting)"""
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        buffer.stop()
+        buffer.join(timeout)
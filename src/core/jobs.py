@@ -0,0 +1,369 @@
+import functools
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import Job, Host, JOB_ACTIVE
+from core import ingest, metrics, response
+from core.logs import fields, get_logger
+
+log = get_logger('jobs')
+
+# Set in the worker processes of a WorkerPool: (results queue, reply queue, slot)
+_store_channel = None
+
+
+def enqueue(kind, host_id=None, params=None, dedup_key=None):
+    """
+    Queues a job. If a queued/running job with the same dedup_key exists,
+    that job is returned instead. Returns (job, created).
+    """
+    if dedup_key:
+        active = Job.query.filter(Job.dedup_key == dedup_key, Job.status.in_(JOB_ACTIVE)).first()
+        if active:
+            return active, False
+
+    job = Job(kind=kind, host_id=host_id, params=params or {}, dedup_key=dedup_key, status='queued')
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # An identical request won the race (unique index on active dedup keys)
+        db.session.rollback()
+        return Job.query.filter(Job.dedup_key == dedup_key, Job.status.in_(JOB_ACTIVE)).first(), False
+    return job, True
+
+
+def claim(worker):
+    """
+    Takes the oldest queued job. The conditional UPDATE makes the claim
+    atomic across worker processes. Returns None when the queue is empty.
+    """
+    while True:
+        now = datetime.utcnow()
+        candidate = db.session.query(Job.id).filter(Job.status == 'queued').order_by(Job.id).first()
+        if candidate is None:
+            db.session.commit()  # end the read transaction
+            return None
+        claimed = db.session.execute(
+            db.update(Job)
+            .where(Job.id == candidate.id, Job.status == 'queued')
+            .values(status='running', worker=worker, stage='starting', started_at=now, heartbeat_at=now)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, candidate.id)
+        # Another worker was faster, try the next one
+
+
+def fail_stale(timeout):
+    """
+    Marks running jobs as failed when their worker gave no sign of life
+    (see Heartbeat) for `timeout` seconds: it was killed or its host died.
+    Long jobs of live workers are left alone.
+    """
+    limit = datetime.utcnow() - timedelta(seconds=timeout)
+    stale = db.session.execute(
+        db.update(Job)
+        .where(Job.status == 'running', db.func.coalesce(Job.heartbeat_at, Job.started_at) < limit)
+        .values(status='failed', error=f'no heartbeat for {timeout}s (worker lost)', finished_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return stale
+
+
+def beat(worker):
+    """Heartbeat of every job `worker` is running"""
+    db.session.execute(
+        db.update(Job)
+        .where(Job.status == 'running', Job.worker == worker)
+        .values(heartbeat_at=datetime.utcnow())
+    )
+    db.session.commit()
+
+
+class Heartbeat(threading.Thread):
+    """Calls beat() every `interval` seconds while a worker process runs, next to its jobs"""
+
+    def __init__(self, app, worker, interval):
+        super().__init__(name='job-heartbeat', daemon=True)
+        self.app = app
+        self.worker = worker
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    beat(self.worker)
+            except Exception as e:
+                log.warning('heartbeat failed', extra=fields(worker=self.worker, error=e))
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def run_fetch(job, report):
+    """Fetch (SSH) -> Parse + Save -> Store for one host"""
+    host = db.session.get(Host, job.host_id)
+    if not host:
+        raise LookupError('Host not found')
+
+    report(10, 'fetching')
+    # Bounded like a scheduled fetch: a stuck host must not hold the worker
+    result = ingest.collect(ingest.host_ref(host), sources=ingest.host_sources([host.id])[host.id],
+                            timeout=current_app.config['FETCH_TIMEOUT'])
+
+    if not result.logs_count:
+        if result.error:
+            raise RuntimeError(result.error)
+        return {'message': 'No new logs found', 'count': 0}
+    if not result.archives:
+        raise RuntimeError('Failed to save logs')
+
+    report(70, 'storing')
+    alerts_count = _store(job.id, result)
+    return {
+        'message': 'Success',
+        'count': result.logs_count,
+        'files': [archive.filename for archive in result.archives],
+        'alerts_generated': alerts_count
+    }
+
+
+def run_block_ip(job, report):
+    """Blocks one address on one host (jobs queued by earlier versions; the API now queues firewall_sync)"""
+    host = db.session.get(Host, job.host_id)
+    if not host:
+        raise LookupError('Host not found')
+
+    ip_to_block = job.params['ip']
+    response.request_blocks([ip_to_block], host_ids=[host.id])
+    db.session.commit()
+
+    report(20, 'blocking')
+    entry, = response.build_engine(current_app.config).sync([host.id])
+    if entry['error']:
+        raise RuntimeError(entry['error'])
+    return {'message': f'Adres {ip_to_block} został zablokowany!'}
+
+
+def run_firewall_sync(job, report):
+    """
+    Pushes pending, failed and expired blocks to every affected host at once.
+    Blocks requested while a pass runs are picked up by the next pass.
+    """
+    engine = response.build_engine(current_app.config)
+    results = {}
+    for attempt in range(5):
+        # Failed hosts are retried once per job, not in a loop
+        host_ids = [h for h in response.dirty_host_ids(include_failed=attempt == 0)
+                    if results.get(h, {}).get('status') != 'error']
+        if not host_ids:
+            break
+        report(min(10 + attempt * 20, 90), 'pushing')
+        for entry in engine.sync(host_ids):
+            results[entry['host_id']] = entry
+
+    if not results:
+        db.session.commit()
+        return {'message': 'Reguły zapory są aktualne', 'hosts': []}
+    summary = sorted(results.values(), key=lambda entry: entry['host_id'])
+    failed = [entry for entry in summary if entry['status'] == 'error']
+    if len(failed) == len(summary):
+        raise RuntimeError('; '.join(f"{entry['host']}: {entry['error']}" for entry in failed))
+    message = f"Zapora zaktualizowana na {len(summary) - len(failed)} z {len(summary)} hostów"
+    return {'message': message, 'hosts': summary, 'failed': len(failed)}
+
+
+def _store(job_id, result):
+    """
+    Stores a FetchResult. Worker processes of a WorkerPool hand it to the
+    pool's parent, whose write-behind buffer stores the results of all
+    ingestion (sweeps, streaming, jobs): the correlation windows of a host
+    then live in one process. Elsewhere it is stored right here.
+    """
+    if _store_channel is None:
+        return ingest.store(result)
+    results, replies, slot = _store_channel
+    results.put((slot, job_id, result))
+    deadline = time.monotonic() + current_app.config['JOB_TIMEOUT']
+    while True:
+        try:
+            reply_id, outcome = replies.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            raise RuntimeError('no reply from the storing process')
+        # A reply to an earlier job that had given up waiting is dropped
+        if reply_id == job_id:
+            break
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome
+
+
+HANDLERS = {
+    'fetch': run_fetch,
+    'block_ip': run_block_ip,
+    'firewall_sync': run_firewall_sync,
+}
+
+
+def _update_own(job_id, worker, **values):
+    """
+    Updates a job only while it is still running on `worker`: once
+    fail_stale has given it up, its dedup key may belong to a new job.
+    Returns whether it was updated.
+    """
+    updated = db.session.execute(
+        db.update(Job)
+        .where(Job.id == job_id, Job.status == 'running', Job.worker == worker)
+        .values(**values)
+    ).rowcount
+    db.session.commit()
+    return bool(updated)
+
+
+def run(job):
+    """Runs one claimed job and records its result or error"""
+    job_id, kind, worker = job.id, job.kind, job.worker
+
+    def report(progress, stage):
+        _update_own(job_id, worker, progress=progress, stage=stage, heartbeat_at=datetime.utcnow())
+
+    try:
+        handler = HANDLERS.get(kind)
+        if handler is None:
+            raise ValueError(f"unknown job kind '{kind}'")
+        outcome = {'status': 'done', 'progress': 100, 'stage': None, 'result': handler(job, report)}
+    except Exception as e:
+        db.session.rollback()
+        outcome = {'status': 'failed', 'error': str(e)}
+        log.error('job failed', extra=fields(job=job_id, kind=kind, error=e))
+
+    if not _update_own(job_id, worker, finished_at=datetime.utcnow(), **outcome):
+        log.warning('job was given up on before it finished, outcome not recorded',
+                    extra=fields(job=job_id, kind=kind, status=outcome['status']))
+    metrics.JOBS.labels(kind, outcome['status']).inc()
+    return db.session.get(Job, job_id)
+
+
+def work(poll_interval=1.0, stop=None):
+    """Worker loop: claims and runs jobs until `stop` (an Event) is set. Needs an app context."""
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    timeout = current_app.config['JOB_TIMEOUT']
+    log.info('worker started', extra=fields(worker=name))
+    # Keeps this worker's jobs from being failed by fail_stale() in other workers
+    heartbeat = Heartbeat(current_app._get_current_object(), name, min(30.0, timeout / 4))
+    heartbeat.start()
+    try:
+        while stop is None or not stop.is_set():
+            try:
+                fail_stale(timeout)
+                job = claim(name)
+            except Exception as e:
+                db.session.rollback()
+                log.error('job claim failed', extra=fields(worker=name, error=e))
+                job = None
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            run(job)
+            db.session.remove()
+            try:
+                # This process' counters, for /metrics served by the web app
+                metrics.REGISTRY.dump(current_app.config['METRICS_DIR'], name=f"worker-{os.getpid()}")
+            except OSError as e:
+                log.warning('metrics snapshot failed', extra=fields(worker=name, error=e))
+    finally:
+        heartbeat.stop()
+
+
+def _worker_main(poll_interval, results=None, replies=None, slot=None):
+    # Fresh interpreter (spawn): own app, engine and SSH pool
+    global _store_channel
+    from app import app
+    if results is not None:
+        _store_channel = (results, replies, slot)
+    with app.app_context():
+        try:
+            work(poll_interval)
+        except KeyboardInterrupt:
+            pass
+
+
+class WorkerPool:
+    """
+    `processes` worker processes running work(); jobs survive restarts in
+    the jobs table. The workers fetch and parse, their FetchResults are
+    stored by this process (see _store), through ingest.submit.
+    """
+
+    def __init__(self, app, processes, poll_interval=1.0):
+        self.app = app
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.workers = []
+        self.results = None
+        self.replies = []
+        self.storer = None
+
+    def start(self):
+        # spawn: no inherited DB connections, SSH sockets or threads
+        context = multiprocessing.get_context('spawn')
+        self.results = context.Queue()
+        for i in range(self.processes):
+            replies = context.Queue()
+            worker = context.Process(target=_worker_main, args=(self.poll_interval, self.results, replies, i),
+                                     name=f'job-worker-{i}', daemon=True)
+            worker.start()
+            self.workers.append(worker)
+            self.replies.append(replies)
+        self.storer = threading.Thread(target=self._store_results, name='job-results', daemon=True)
+        self.storer.start()
+
+    def _store_results(self):
+        """Queues the workers' results on the write-behind buffer, answers with the alert count"""
+        while True:
+            item = self.results.get()
+            if item is None:
+                return
+            slot, job_id, result = item
+            try:
+                with self.app.app_context():
+                    future = ingest.submit(result)
+            except Exception as e:
+                self._reply(slot, job_id, e)
+                continue
+            future.add_done_callback(functools.partial(self._reply_future, slot, job_id))
+
+    def _reply_future(self, slot, job_id, future):
+        try:
+            self._reply(slot, job_id, future.result())
+        except Exception as e:
+            self._reply(slot, job_id, e)
+
+    def _reply(self, slot, job_id, outcome):
+        if isinstance(outcome, Exception):
+            # Plain exception: the original may not survive pickling
+            outcome = RuntimeError(str(outcome))
+        self.replies[slot].put((job_id, outcome))
+
+    def stop(self):
+        for worker in self.workers:
+            worker.terminate()
+        if self.results is not None:
+            self.results.put(None)
+
+    def join(self, timeout=None):
+        for worker in self.workers:
+            worker.join(timeout)
+        if self.storer is not None:
+            self.storer.join(timeout)
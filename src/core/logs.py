@@ -0,0 +1,74 @@
+import itertools
+import logging
+import sys
+
+# Every module logs below this name, e.g. siem.collector
+ROOT = 'siem'
+# One in this many sampled records is written (see Sampled)
+_sample_every = 100
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def fields(**values):
+    """Structured fields of a record: log.info('fetch failed', extra=fields(host='vm-1', error=e))"""
+    return {'fields': values}
+
+
+def _quote(value):
+    text = str(value)
+    if not text or any(c in text for c in ' "=\n'):
+        return '"' + text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+    return text
+
+
+class KeyValueFormatter(logging.Formatter):
+    """`ts=... level=info logger=siem.collector msg="fetch failed" host=vm-1 error=...` - one line per record"""
+
+    def format(self, record):
+        parts = [
+            f"ts={self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}",
+            f"level={record.levelname.lower()}",
+            f"logger={record.name}",
+            f"msg={_quote(record.getMessage())}",
+        ]
+        parts += [f"{key}={_quote(value)}" for key, value in getattr(record, 'fields', {}).items()]
+        if record.exc_info:
+            parts.append(f"exc={_quote(self.formatException(record.exc_info))}")
+        return ' '.join(parts)
+
+
+class Sampled:
+    """
+    Debug logging for per-line and per-event paths: nothing is formatted
+    unless DEBUG is enabled, and then only one record in `every` (default
+    LOG_SAMPLE_EVERY) is written, carrying the sampling rate.
+    """
+
+    def __init__(self, logger, every=None):
+        self.logger = logger
+        self.every = every
+        self._calls = itertools.count()
+
+    def debug(self, msg, **values):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        every = self.every or _sample_every
+        if next(self._calls) % every == 0:
+            self.logger.debug(msg, extra=fields(sampled=every, **values))
+
+
+def configure(level='INFO', sample_every=100):
+    """Sends the siem.* loggers to stdout in key=value form, at `level` (LOG_LEVEL)"""
+    global _sample_every
+    _sample_every = max(1, int(sample_every))
+    logger = logging.getLogger(ROOT)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    if not any(getattr(handler, '_siem', False) for handler in logger.handlers):
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(KeyValueFormatter())
+        handler._siem = True
+        logger.addHandler(handler)
+    logger.propagate = False
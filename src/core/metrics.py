@@ -0,0 +1,231 @@
+import bisect
+import glob
+import json
+import os
+import threading
+
+# Upper bounds (seconds) of latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def state(self):
+        return self.value
+
+    @staticmethod
+    def merge(a, b):
+        return a + b
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last one: above the highest bound
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def state(self):
+        return [list(self.counts), self.sum]
+
+    @staticmethod
+    def merge(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1]]
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._unlabelled = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """The series of one label combination (created on first use)"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def snapshot(self):
+        return {json.dumps(key): child.state() for key, child in list(self._children.items())}
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._unlabelled.inc(amount)
+
+    def render(self, states):
+        for key, value in sorted(states.items()):
+            yield f"{self.name}{self._label_text(key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._unlabelled.observe(value)
+
+    def render(self, states):
+        for key, (counts, total) in sorted(states.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float('inf'),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{self._label_text(key, [('le', _format_value(bound))])} {cumulative}"
+            yield f"{self.name}_sum{self._label_text(key)} {_format_value(total)}"
+            yield f"{self.name}_count{self._label_text(key)} {cumulative}"
+
+
+class Registry:
+    """
+    Counters and histograms of this process, rendered in the Prometheus
+    text format. Recording is a dict lookup and a locked add, so it can sit
+    on per-batch paths. Other processes (job workers) write snapshots to a
+    shared directory; render() adds them to the local values.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def dump(self, directory, name=None):
+        """Writes this process' values to `directory` for the process serving /metrics"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name or os.getpid()}.json")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def load_snapshots(directory, exclude=None):
+        snapshots = []
+        for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+            if exclude and os.path.basename(path) == f"{exclude}.json":
+                continue
+            try:
+                with open(path, encoding='utf-8') as fh:
+                    snapshots.append(json.load(fh))
+            except (OSError, ValueError):
+                continue  # being replaced or damaged, next scrape reads it
+        return snapshots
+
+    @staticmethod
+    def clear_snapshots(directory):
+        """Drops snapshots of earlier runs (their processes are gone)"""
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def render(self, snapshots=()):
+        lines = []
+        for name, metric in self.metrics.items():
+            merge = metric._new_child().merge
+            states = {}
+            for snapshot in (metric.snapshot(), *(s.get(name, {}) for s in snapshots)):
+                for key, value in snapshot.items():
+                    key = tuple(json.loads(key))
+                    states[key] = merge(states[key], value) if key in states else value
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render(states))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Fetching
+FETCH_DURATION = REGISTRY.histogram('siem_fetch_duration_seconds', 'Fetch, archive and parse time of one host batch', ['host'])
+FETCH_LINES = REGISTRY.counter('siem_fetch_lines_total', 'Journal lines fetched', ['host'])
+SSH_CONNECTIONS = REGISTRY.counter('siem_ssh_connections_total', 'SSH sessions opened', ['host'])
+SSH_ERRORS = REGISTRY.counter('siem_ssh_errors_total', 'Failed SSH connects and dead pooled sessions', ['host'])
+FETCH_ERRORS = REGISTRY.counter('siem_fetch_errors_total', 'Fetches and streams that broke off', ['host'])
+
+# Detection
+PARSE_ROWS = REGISTRY.counter('siem_parse_rows_total', 'Log lines run through the detection rules')
+PARSE_DURATION = REGISTRY.histogram('siem_parse_duration_seconds', 'Detection time of one batch of log lines')
+RULE_HITS = REGISTRY.counter('siem_rule_hits_total', 'Events produced by each detection rule', ['rule'])
+
+# Storage
+ALERTS_INSERTED = REGISTRY.counter('siem_alerts_inserted_total', 'New alerts stored')
+ALERT_INSERT_DURATION = REGISTRY.histogram('siem_alert_insert_duration_seconds',
+                                           'Deduplication and insert time of one batch of alerts')
+DB_WRITE_DURATION = REGISTRY.histogram('siem_db_write_duration_seconds',
+                                       'SQLite write statements and commits, waiting for the write lock included')
+DB_LOCKED = REGISTRY.counter('siem_db_locked_total', '"database is locked" errors')
+
+# Jobs
+JOBS = REGISTRY.counter('siem_jobs_total', 'Finished jobs', ['kind', 'status'])
@@ -1,16 +1,39 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import re
+import time
+from collections import Counter
 from datetime import datetime, timezone
-import sys
+
+from core.logs import Sampled, get_logger
+from core.metrics import PARSE_DURATION, PARSE_ROWS, RULE_HITS
+from core.rules import default_ruleset
+
+log = get_logger('parser')
+# Per-hit debug records, one in LOG_SAMPLE_EVERY written
+hit_log = Sampled(log)
 
 class LogParser:
-    PATTERNS = {
-        'ssh_failed': r"(?:Failed password|Connection closed by authenticating user|Connection closed by)\s+(?:for\s+)?(?:invalid\s+user\s+)?(?P<user>\S+)\s+(?:from\s+)?(?P<ip>[\d\.]+)",
-        'ssh_success': r"Accepted\s+(?:password|publickey)\s+for\s+(?P<user>\S+)\s+from\s+(?P<ip>[\d\.]+)"
-    }
+    # Detection rules live in rules/*.yml (see core.rules)
+    ANSI_RE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+    SPACE_RE = re.compile(r'\s+')
 
-    def __init__(self, filepath):
-        self.filepath = filepath
+    # The only columns detection looks at
+    COLUMNS = ('timestamp', 'message', 'MESSAGE', 'source')
+    # Rows per detection batch (iter_events)
+    BATCH_SIZE = 65_536
+
+    def __init__(self, source, vectorized=True, rules=None, routes=None):
+        # Parquet file path, or an in-memory pyarrow Table / DataFrame (parse-on-ingest)
+        self.source = source
+        # Columnar detection by default, row loop kept as the reference implementation
+        self.vectorized = vectorized
+        self.rules = rules if rules is not None else default_ruleset()
+        # Log source name -> rule packs its rows are matched against (core.sources.rule_routes);
+        # rows of other sources, or without one, get every rule
+        self.routes = routes or {}
 
     def clean_text(self, text):
         """Poprawione dekodowanie bajtów i czyszczenie tekstu."""
@@ -18,49 +41,199 @@ class LogParser:
             text = text.decode('utf-8', errors='ignore')
         if not isinstance(text, str):
             text = str(text)
-        
+
         # ANSI escape codes removal
-        text = re.sub(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])', '', text)
+        text = self.ANSI_RE.sub('', text)
         return " ".join(text.split())
 
+    def clean_column(self, column):
+        """Columnar clean_text: same result for every cell, computed with string kernels."""
+        # object dtype keeps Python `re` semantics (arrow kernels use RE2, where \s is ASCII only)
+        text = column.astype(object).fillna('')
+        if not text.map(type).eq(str).all():
+            # Rare slow path: bytes or non-string payloads
+            text = text.map(self.clean_text)
+        text = text.str.replace(self.ANSI_RE, '', regex=True)
+        return text.str.replace(self.SPACE_RE, ' ', regex=True).str.strip()
+
     def parse(self):
+        """All detected events of the source as a list (see iter_events)"""
         detected_events = []
         try:
-            df = pd.read_parquet(self.filepath)
-            if df.empty: return []
-
-            msg_col = 'message' if 'message' in df.columns else 'MESSAGE'
-
-            for _, row in df.iterrows():
-                message = self.clean_text(row.get(msg_col, ""))
-                if not message: continue
-
-                raw_ts = row.get('timestamp')
-                if raw_ts and not pd.isna(raw_ts):
-                    dt_object = datetime.fromtimestamp(float(raw_ts), tz=timezone.utc)
-                else:
-                    dt_object = datetime.now(timezone.utc)
-
-                for event_type, pattern in self.PATTERNS.items():
-                    match = re.search(pattern, message, re.IGNORECASE)
-                    if match:
-                        data = match.groupdict()
-                        
-                        print(f"DEBUG HIT: {event_type} | User: {data['user']} | IP: {data['ip']}", file=sys.stdout)
-                        
-                        severity = "INFO"
-                        if event_type == 'ssh_failed':
-                            severity = "CRITICAL" if data['user'] == 'root' else "WARNING"
-
-                        detected_events.append({
-                            'timestamp': dt_object,
-                            'type': event_type,
-                            'severity': severity,
-                            'source_ip': data['ip'],
-                            'target_user': data['user'],
-                            'message': message
-                        })
+            detected_events = list(self.iter_events())
         except Exception as e:
-            print(f"[PARSER ERROR] {e}", file=sys.stdout)
-            
-        return detected_events
\ No newline at end of file
+            log.exception('detection failed: %s', e)
+
+        return detected_events
+
+    def iter_events(self, batch_size=None):
+        """
+        Streaming detection: the source is read `batch_size` rows at a time
+        (Parquet record batches, only the projected columns) and events are
+        yielded batch by batch, so peak memory depends on the batch size,
+        not on the size of the archive. Errors propagate to the caller.
+        """
+        batch_size = batch_size or self.BATCH_SIZE
+        for df in self._batches(batch_size):
+            if df.empty:
+                continue
+            started = time.perf_counter()
+            events = self._parse_columns(df) if self.vectorized else self._parse_rows(df)
+            PARSE_DURATION.observe(time.perf_counter() - started)
+            PARSE_ROWS.inc(len(df))
+            for rule_id, hits in Counter(event['type'] for event in events).items():
+                RULE_HITS.labels(rule_id).inc(hits)
+            yield from events
+
+    def _batches(self, batch_size):
+        """Source -> DataFrames of at most `batch_size` rows with only the columns detection needs"""
+        source = self.source
+        if isinstance(source, pd.DataFrame):
+            for start in range(0, len(source), batch_size):
+                yield source.iloc[start:start + batch_size]
+            return
+
+        if isinstance(source, pa.Table):
+            columns = [c for c in self.COLUMNS if c in source.column_names]
+            batches = source.select(columns).to_batches(max_chunksize=batch_size)
+        else:
+            # Row group by row group; the raw JSON column is never read
+            parquet = pq.ParquetFile(source)
+            columns = [c for c in self.COLUMNS if c in parquet.schema_arrow.names]
+            batches = parquet.iter_batches(batch_size=batch_size, columns=columns)
+
+        for batch in batches:
+            yield batch.to_pandas()
+
+    def _parse_rows(self, df):
+        """Reference detection: one clean_text per row, then each candidate rule's regex."""
+        detected_events = []
+        msg_col = 'message' if 'message' in df.columns else 'MESSAGE'
+        rules = self.rules.rules
+
+        for _, row in df.iterrows():
+            packs = self.routes.get(row.get('source'))
+            message = self.clean_text(row.get(msg_col, ""))
+            if not message: continue
+
+            raw_ts = row.get('timestamp')
+            if raw_ts and not pd.isna(raw_ts):
+                dt_object = datetime.fromtimestamp(float(raw_ts), tz=timezone.utc)
+            else:
+                dt_object = datetime.now(timezone.utc)
+
+            lowered = message.lower()
+            for rule in rules:
+                if packs is not None and rule.pack not in packs:
+                    continue
+                if not rule.may_match(lowered):
+                    continue
+                match = rule.regex.search(message)
+                if match:
+                    fields = {field: match.group(group) for field, group in rule.fields.items()}
+
+                    hit_log.debug('rule hit', rule=rule.id, user=fields.get('target_user'), ip=fields.get('source_ip'))
+
+                    detected_events.append(self._event(
+                        rule, fields, dt_object, rule.severity_for(fields), message
+                    ))
+        return detected_events
+
+    def _parse_columns(self, df):
+        """
+        Columnar detection: the keyword prefilter runs once over the whole
+        message column, each rule's regex only over its candidate lines.
+        Produces the same events, in the same order, as _parse_rows.
+        """
+        msg_col = 'message' if 'message' in df.columns else 'MESSAGE'
+        if msg_col not in df.columns:
+            return []
+
+        messages = self.clean_column(df[msg_col]).reset_index(drop=True)
+        rules, candidates = self.rules.candidates(messages)
+        values = messages.to_numpy()
+        non_empty = (messages != '').to_numpy()
+        routed = self._routed_rows(df, rules)
+
+        rows, orders, fields, severities = [], [], [], []
+        for order, rule in enumerate(rules):
+            mask = candidates[rule.id] & non_empty
+            if rule.pack in routed:
+                mask &= routed[rule.pack]
+            candidate_rows = np.flatnonzero(mask)
+            if not len(candidate_rows):
+                continue
+            matches = [rule.regex.search(m) for m in values[candidate_rows]]
+            matched = np.fromiter((m is not None for m in matches), dtype=bool, count=len(matches))
+            if not matched.any():
+                continue
+            found = [{field: m.group(group) for field, group in rule.fields.items()} for m in matches if m is not None]
+            rows.append(candidate_rows[matched])
+            orders.append(np.full(matched.sum(), order))
+            fields.extend(found)
+            severities.extend(rule.severity_column(pd.DataFrame(found, columns=list(rule.fields))).tolist())
+
+        if not rows:
+            return []
+
+        # Row order first, then rule order - exactly like the nested loop
+        rows, orders = np.concatenate(rows), np.concatenate(orders)
+        ordering = np.lexsort((orders, rows))
+        rows = rows[ordering]
+
+        return [
+            self._event(rules[orders[i]], fields[i], ts, severities[i], message)
+            for i, ts, message in zip(ordering, self._utc_timestamps(df, rows), values[rows])
+        ]
+
+    def _routed_rows(self, df, rules):
+        """
+        Rule pack -> rows it may run on, for the packs some log source of the
+        batch does not use (all other packs run on every row).
+        """
+        if not self.routes or 'source' not in df.columns:
+            return {}
+        restricted = {name: packs for name, packs in self.routes.items() if packs is not None}
+        if not restricted:
+            return {}
+        sources = df['source'].reset_index(drop=True)
+        present = restricted.keys() & set(sources.dropna().unique())
+        routed = {}
+        for pack in {rule.pack for rule in rules}:
+            excluded = [name for name in present if pack not in restricted[name]]
+            if excluded:
+                routed[pack] = ~sources.isin(excluded).to_numpy()
+        return routed
+
+    @staticmethod
+    def _event(rule, fields, timestamp, severity, message):
+        event = {
+            'timestamp': timestamp,
+            'type': rule.id,
+            'severity': severity,
+            'source_ip': fields.get('source_ip'),
+            'target_user': fields.get('target_user'),
+            'message': message,
+            'category': rule.category
+        }
+        title = rule.title(fields)
+        if title:
+            event['title'] = title  # rule-provided alert text
+        return event
+
+    def _utc_timestamps(self, df, rows):
+        """Epoch seconds -> aware UTC datetimes for the selected rows (now() when missing)."""
+        now = datetime.now(timezone.utc)
+        if 'timestamp' not in df.columns:
+            return [now] * len(rows)
+
+        raw_ts = pd.to_numeric(df['timestamp'].reset_index(drop=True), errors='coerce')
+        raw_ts = raw_ts.to_numpy(dtype='float64')[rows]
+        # Missing and zero timestamps fall back to now(), as in the row loop
+        valid = ~np.isnan(raw_ts) & (raw_ts != 0)
+
+        # Split like datetime.fromtimestamp does (modf, fraction rounded half-even to microseconds)
+        fraction, whole = np.modf(np.where(valid, raw_ts, 0))
+        micros = whole.astype('int64') * 1_000_000 + np.round(fraction * 1e6).astype('int64')
+        stamps = pd.to_datetime(micros, unit='us', utc=True).to_pydatetime()
+        return [ts if ok else now for ts, ok in zip(stamps, valid)]
@@ -0,0 +1,190 @@
+import json
+
+import pyarrow as pa
+
+try:
+    # Optional, see core/collector.py; both give compact JSON like journalctl
+    import orjson
+    json_loads = orjson.loads
+
+    def json_dumps(value):
+        return orjson.dumps(value).decode()
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps(value):
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+# Columnar storage of raw journal lines (ARCHIVE_RAW=columnar).
+#
+# Instead of the JSON text, an archive file keeps every entry split up:
+#   - typed columns named after the journal field: integers for timestamps,
+#     PIDs and ids, dictionary-encoded strings for the few-valued fields,
+#   - `journal_fields`, a map of the remaining (rare) fields to their JSON text,
+#   - `journal_keys`, the entry's field names in their original order,
+#     dictionary-encoded (a host writes only a handful of layouts),
+#   - `journal_line`, the line itself when it is not a JSON object.
+# MESSAGE, __CURSOR and _HOSTNAME are not stored twice: the `message`,
+# `cursor` and `hostname` columns already hold them.
+#
+# join() rebuilds the line as compact JSON with the original field order.
+# Only lines that this reproduces byte for byte are split; others (escaped
+# unicode, spacing, numbers that do not survive parsing) are kept whole
+# in `journal_line`, so every raw line comes back unchanged.
+
+INT_FIELDS = {
+    '__REALTIME_TIMESTAMP': pa.int64(),
+    '__MONOTONIC_TIMESTAMP': pa.int64(),
+    '_SOURCE_REALTIME_TIMESTAMP': pa.int64(),
+    '_SOURCE_MONOTONIC_TIMESTAMP': pa.int64(),
+    '__SEQNUM': pa.int64(),
+    '_PID': pa.int64(),
+    'SYSLOG_PID': pa.int64(),
+    '_UID': pa.int64(),
+    '_GID': pa.int64(),
+    '_AUDIT_SESSION': pa.int64(),
+    '_AUDIT_LOGINUID': pa.int64(),
+    'PRIORITY': pa.int8(),
+    'SYSLOG_FACILITY': pa.int8(),
+}
+CATEGORY_FIELDS = (
+    '_BOOT_ID', '_MACHINE_ID', '__SEQNUM_ID', '_TRANSPORT', '_SYSTEMD_UNIT', '_SYSTEMD_SLICE', '_SYSTEMD_CGROUP',
+    '_SYSTEMD_INVOCATION_ID', '_SYSTEMD_USER_UNIT', 'SYSLOG_IDENTIFIER', '_COMM', '_EXE', '_CMDLINE',
+    '_CAP_EFFECTIVE', '_SELINUX_CONTEXT', '_RUNTIME_SCOPE',
+)
+# Journal fields kept in the record columns of the archive
+RECORD_FIELDS = {'MESSAGE': 'message', '__CURSOR': 'cursor', '_HOSTNAME': 'hostname'}
+
+KEYS = 'journal_keys'
+EXTRA = 'journal_fields'
+LINE = 'journal_line'
+EXTRA_TYPE = pa.map_(pa.string(), pa.string())
+COLUMNS = (*INT_FIELDS, *CATEGORY_FIELDS, KEYS, EXTRA, LINE)
+# Integer range that survives the trip through each type
+_LIMITS = {pa.int64(): 1 << 63, pa.int8(): 1 << 7}
+
+
+def _pylist(column):
+    """to_pylist() that resolves dictionary-encoded chunks through their (small) dictionary"""
+    if not pa.types.is_dictionary(column.type):
+        return column.to_pylist()
+    values = []
+    for chunk in column.chunks if isinstance(column, pa.ChunkedArray) else [column]:
+        dictionary = chunk.dictionary.to_pylist() + [None]
+        values.extend(dictionary[index] for index in chunk.indices.fill_null(-1).to_pylist())
+    return values
+
+
+def split(table):
+    """
+    Archive table (with `raw`) -> {column: pyarrow array} of the columnar
+    form of its raw lines. Rows without a raw line get nulls everywhere.
+    """
+    rows = table.num_rows
+    record_values = {field: table[column].to_pylist() for field, column in RECORD_FIELDS.items()}
+    ints = {field: [None] * rows for field in INT_FIELDS}
+    categories = {field: [None] * rows for field in CATEGORY_FIELDS}
+    # field -> (column values, int limit or None); record fields have no column here
+    targets = {field: (values, _LIMITS[INT_FIELDS[field]]) for field, values in ints.items()}
+    targets.update((field, (values, None)) for field, values in categories.items())
+    keys, extras, lines = [None] * rows, [None] * rows, [None] * rows
+
+    for i, line in enumerate(table['raw'].to_pylist()):
+        if line is None:
+            continue
+        try:
+            entry = json_loads(line)
+        except ValueError:
+            entry = None
+        if not isinstance(entry, dict) or not entry or '' in entry or json_dumps(entry) != line:
+            lines[i] = line
+            continue
+        layout = ','.join(entry)
+        if layout.count(',') != len(entry) - 1:
+            lines[i] = line  # a field name with a comma
+            continue
+
+        extra = []
+        for key, value in entry.items():
+            target = targets.get(key)
+            if target is not None:
+                values, limit = target
+                if limit is None:
+                    if value.__class__ is str:
+                        values[i] = value
+                        continue
+                elif value.__class__ is str and value.isdigit() and value.isascii() and (value[0] != '0' or value == '0'):
+                    number = int(value)
+                    if number < limit:
+                        values[i] = number
+                        continue
+            elif key in record_values and value == record_values[key][i]:
+                continue
+            extra.append((key, json_dumps(value)))
+        keys[i] = layout
+        extras[i] = extra
+
+    columns = {field: pa.array(values, INT_FIELDS[field]) for field, values in ints.items()}
+    columns.update({field: pa.array(values, pa.string()).dictionary_encode() for field, values in categories.items()})
+    columns[KEYS] = pa.array(keys, pa.string()).dictionary_encode()
+    columns[EXTRA] = pa.array(extras, EXTRA_TYPE)
+    columns[LINE] = pa.array(lines, pa.string())
+    return columns
+
+
+def join(table):
+    """Columnar form (split() columns + message, cursor, hostname) -> raw lines as a string array"""
+    rows = table.num_rows
+    names = set(table.column_names)
+    values = {field: _pylist(table[column]) for field, column in RECORD_FIELDS.items()}
+    for field in (*INT_FIELDS, *CATEGORY_FIELDS):
+        values[field] = _pylist(table[field]) if field in names else [None] * rows
+    keys, extras, lines = _pylist(table[KEYS]), table[EXTRA].to_pylist(), table[LINE].to_pylist()
+    layouts = {}
+
+    raw = [None] * rows
+    for i in range(rows):
+        if lines[i] is not None:
+            raw[i] = lines[i]
+            continue
+        if keys[i] is None:
+            continue
+        layout = layouts.get(keys[i])
+        if layout is None:
+            # (field, '"field":', value list, quote?) per field of the layout
+            layout = layouts[keys[i]] = [(key, json_dumps(key) + ':', values.get(key), key in INT_FIELDS)
+                                         for key in keys[i].split(',')]
+        extra = dict(extras[i]) if extras[i] else None
+        parts = []
+        for key, prefix, column, quote in layout:
+            text = extra.get(key) if extra else None
+            if text is None:
+                value = column[i]
+                text = f'"{value}"' if quote else json_dumps(value)
+            parts.append(prefix + text)
+        raw[i] = '{' + ','.join(parts) + '}'
+    return pa.array(raw, pa.string())
+
+
+def canonical(table):
+    """The table with its raw lines as join() gives them back from a columnar file"""
+    columns = split(table)
+    rebuilt = table.drop_columns(['raw'])
+    for name, column in columns.items():
+        rebuilt = rebuilt.append_column(name, column)
+    return table.set_column(table.schema.get_field_index('raw'), 'raw', join(rebuilt))
+
+# Parquet encodings of a columnar file (benchmarks/bench_storage.py): a
+# dictionary for the few-valued columns only, deltas for the counters,
+# shared prefixes for cursors ("s=<seqnum id>;i=...")
+ENCODING_OPTIONS = {
+    'use_dictionary': [*CATEGORY_FIELDS, KEYS, 'hostname', 'PRIORITY', 'SYSLOG_FACILITY', '_UID', '_GID'],
+    'column_encoding': {
+        '__REALTIME_TIMESTAMP': 'DELTA_BINARY_PACKED',
+        '__MONOTONIC_TIMESTAMP': 'DELTA_BINARY_PACKED',
+        '_SOURCE_REALTIME_TIMESTAMP': 'DELTA_BINARY_PACKED',
+        '_SOURCE_MONOTONIC_TIMESTAMP': 'DELTA_BINARY_PACKED',
+        '__SEQNUM': 'DELTA_BINARY_PACKED',
+        'cursor': 'DELTA_BYTE_ARRAY',
+    },
+}
@@ -0,0 +1,281 @@
+import ipaddress
+import os
+import threading
+import time
+from datetime import datetime
+
+from extensions import db
+from models import IPRegistry
+from core.logs import fields, get_logger
+
+log = get_logger('reputation')
+
+REPUTATIONS = ('TRUSTED', 'BANNED')
+
+
+class _Node:
+    __slots__ = ('prefix', 'length', 'value', 'children')
+
+    def __init__(self, prefix, length, value=None):
+        self.prefix = prefix  # network address as an integer
+        self.length = length  # prefix length in bits
+        self.value = value
+        self.children = [None, None]
+
+
+class PrefixTree:
+    """
+    Path-compressed binary radix tree of networks, one per address family.
+    A lookup walks at most one node per prefix bit and returns the value of
+    the longest matching network; n networks take at most 2n nodes.
+    """
+
+    def __init__(self):
+        self.roots = {4: _Node(0, 0), 6: _Node(0, 0)}
+        self.size = 0
+
+    @staticmethod
+    def _bit(value, position, bits):
+        return (value >> (bits - 1 - position)) & 1
+
+    @staticmethod
+    def _covers(node, address, bits):
+        return (address ^ node.prefix) >> (bits - node.length) == 0 if node.length else True
+
+    def insert(self, network, value):
+        """Sets the value of a network (ipaddress network); None clears it"""
+        bits = network.max_prefixlen
+        prefix, length = int(network.network_address), network.prefixlen
+        node = self.roots[network.version]
+        while True:
+            if node.length == length:
+                if node.value is None and value is not None:
+                    self.size += 1
+                elif node.value is not None and value is None:
+                    self.size -= 1
+                node.value = value
+                return
+            bit = self._bit(prefix, node.length, bits)
+            child = node.children[bit]
+            if child is None:
+                if value is not None:
+                    node.children[bit] = _Node(prefix, length, value)
+                    self.size += 1
+                return
+            # Common leading bits of the new network and the child
+            common = min(length, child.length, bits - (prefix ^ child.prefix).bit_length())
+            if common == child.length:
+                node = child
+                continue
+            if value is None:
+                return  # nothing stored there
+            # The new network goes between node and child; nodes are fully
+            # built before they are linked in, lookups never see a half split
+            if common == length:
+                new = _Node(prefix, length, value)
+                new.children[self._bit(child.prefix, length, bits)] = child
+            else:
+                mask = ((1 << common) - 1) << (bits - common)
+                new = _Node(prefix & mask, common)
+                new.children[self._bit(child.prefix, common, bits)] = child
+                new.children[self._bit(prefix, common, bits)] = _Node(prefix, length, value)
+            node.children[bit] = new
+            self.size += 1
+            return
+
+    def lookup(self, address):
+        """Value of the longest network containing the address (ipaddress address), None if none"""
+        bits = address.max_prefixlen
+        value = int(address)
+        node = self.roots[address.version]
+        best = node.value
+        while node.length < bits:
+            node = node.children[self._bit(value, node.length, bits)]
+            if node is None or not self._covers(node, value, bits):
+                break
+            if node.value is not None:
+                best = node.value
+        return best
+
+
+def _network(text):
+    """'10.0.0.1', '10.0.0.0/8', '2001:db8::/32' -> ipaddress network, None if invalid"""
+    try:
+        return ipaddress.ip_network(text.strip(), strict=False)
+    except ValueError:
+        return None
+
+
+class ReputationTable:
+    """
+    In-memory IP reputation used during detection.
+
+    Two trees: the IPRegistry table (TRUSTED / BANNED per address or
+    network, set by operators and by successful block-ip jobs) and the
+    allow/deny list files (one CIDR per line). Registry entries win over
+    the lists. The registry is re-read incrementally by `updated_at`
+    every `refresh_interval` seconds, and fully every `rebuild_interval`
+    seconds (deleted rows); list files are reloaded when they change.
+    """
+
+    def __init__(self, allowlist=None, denylist=None, refresh_interval=30.0, rebuild_interval=600.0):
+        self.allowlist = allowlist
+        self.denylist = denylist
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.registry = PrefixTree()
+        self.lists = PrefixTree()
+        self._since = None
+        self._lists_stamp = None
+        self._refreshed_at = 0.0
+        self._rebuilt_at = None
+        self._lock = threading.Lock()
+
+    def _read_list(self, path):
+        with open(path, encoding='utf-8') as fh:
+            for line in fh:
+                line = line.split('#', 1)[0].strip()
+                if not line:
+                    continue
+                network = _network(line)
+                if network is None:
+                    log.warning('invalid network skipped', extra=fields(path=path, network=line))
+                    continue
+                yield network
+
+    def _lists_current_stamp(self):
+        return tuple(os.stat(p).st_mtime_ns if p and os.path.exists(p) else None
+                     for p in (self.allowlist, self.denylist))
+
+    def load_lists(self):
+        tree = PrefixTree()
+        for path, reputation in ((self.allowlist, 'TRUSTED'), (self.denylist, 'BANNED')):
+            if path and os.path.exists(path):
+                for network in self._read_list(path):
+                    tree.insert(network, reputation)
+        self.lists, self._lists_stamp = tree, self._lists_current_stamp()
+
+    def _registry_rows(self, since=None):
+        # Own connection: the caller's session (and its pending writes) is left alone
+        query = db.select(IPRegistry.ip_address, IPRegistry.reputation, IPRegistry.updated_at)
+        if since is not None:
+            query = query.where(IPRegistry.updated_at >= since)
+        with db.engine.connect() as connection:
+            return connection.execute(query.order_by(IPRegistry.updated_at)).all()
+
+    def _apply_rows(self, tree, rows):
+        for ip_address, reputation, updated_at in rows:
+            network = _network(ip_address or '')
+            if network is not None:
+                tree.insert(network, reputation if reputation in REPUTATIONS else None)
+            if updated_at and (self._since is None or updated_at > self._since):
+                self._since = updated_at
+
+    def rebuild(self):
+        """Full reload of the registry and the list files"""
+        self._since = None
+        tree = PrefixTree()
+        self._apply_rows(tree, self._registry_rows())
+        self.registry = tree
+        self.load_lists()
+        self._rebuilt_at = self._refreshed_at = time.monotonic()
+        log.info('reputation loaded', extra=fields(registry=self.registry.size, lists=self.lists.size))
+
+    def refresh(self):
+        """Applies registry rows changed since the last refresh"""
+        # >= : rows written within the same clock tick as the newest seen one
+        self._apply_rows(self.registry, self._registry_rows(self._since))
+        if self._lists_current_stamp() != self._lists_stamp:
+            self.load_lists()
+        self._refreshed_at = time.monotonic()
+
+    def maybe_refresh(self):
+        now = time.monotonic()
+        if now - self._refreshed_at < self.refresh_interval:
+            return
+        with self._lock:
+            if now - self._refreshed_at < self.refresh_interval:
+                return
+            try:
+                if self._rebuilt_at is None or now - self._rebuilt_at >= self.rebuild_interval:
+                    self.rebuild()
+                else:
+                    self.refresh()
+            except Exception as e:
+                self._refreshed_at = now  # retry on the next interval
+                log.error('reputation refresh failed, keeping previous data', extra=fields(error=e))
+
+    def lookup(self, ip):
+        """'TRUSTED', 'BANNED' or None for an address string"""
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        return self.registry.lookup(address) or self.lists.lookup(address)
+
+    def apply(self, events):
+        """
+        Detection hot path: events from trusted addresses are dropped,
+        events from banned ones are escalated to CRITICAL and tagged with
+        'reputation'. One tree lookup per distinct source IP of the batch.
+        """
+        verdicts = {}
+        output = []
+        for event in events:
+            ip = event.get('source_ip')
+            if not ip:
+                output.append(event)
+                continue
+            if ip not in verdicts:
+                verdicts[ip] = self.lookup(ip)
+            verdict = verdicts[ip]
+            if verdict == 'TRUSTED':
+                continue
+            if verdict == 'BANNED':
+                event = dict(event, severity='CRITICAL', reputation='BANNED')
+            output.append(event)
+        return output
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_reputation(config):
+    """Process-wide reputation table, refreshed as it is used. Needs an app context."""
+    global _table
+    with _table_lock:
+        if _table is None:
+            _table = ReputationTable(
+                allowlist=config['REPUTATION_ALLOWLIST'] or None,
+                denylist=config['REPUTATION_DENYLIST'] or None,
+                refresh_interval=config['REPUTATION_REFRESH']
+            )
+    _table.maybe_refresh()
+    return _table
+
+
+def mark(ip, reputation):
+    """Records an address in IPRegistry (commit is left to the caller)"""
+    entry = IPRegistry.query.filter_by(ip_address=ip).first()
+    if entry is None:
+        entry = IPRegistry(ip_address=ip)
+        db.session.add(entry)
+    entry.reputation = reputation
+    entry.updated_at = datetime.utcnow()
+    return entry
+
+
+def mark_many(ips, reputation, chunk=500):
+    """mark() for many addresses, touching only the entries that change (commit is left to the caller)"""
+    ips = sorted(set(ips))
+    changed = 0
+    for i in range(0, len(ips), chunk):
+        part = ips[i:i + chunk]
+        current = dict(db.session.query(IPRegistry.ip_address, IPRegistry.reputation)
+                       .filter(IPRegistry.ip_address.in_(part)).all())
+        for ip in part:
+            if current.get(ip) != reputation:
+                mark(ip, reputation)
+                changed += 1
+    return changed
@@ -0,0 +1,292 @@
+import ipaddress
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import FirewallBlock, Host
+from core import ingest, reputation
+from core.logs import fields, get_logger
+from core.ssh_pool import ssh_pool
+
+log = get_logger('response')
+
+BACKENDS = ('ipset', 'iptables')
+# Names of the host-side objects holding the blocks (ipset sets / iptables chain)
+IPSET_NAMES = {4: 'siem-block', 6: 'siem-block6'}
+IPSET_MAXELEM = 1 << 20
+CHAIN = 'SIEM-BLOCK'
+# Rows per UPDATE ... WHERE id IN (...), below SQLite's bound parameter limit
+CHUNK = 500
+
+# Blocks of one host at sync time: ids and networks to keep, ids whose block ended
+HostPlan = namedtuple('HostPlan', ['host', 'active', 'expired', 'has_ipv6'])
+
+
+def canonical(ip):
+    """'10.0.0.1' / '10.0.0.0/8' -> canonical text; single addresses keep their plain form"""
+    network = ipaddress.ip_network(ip.strip())
+    if network.prefixlen == network.max_prefixlen:
+        return str(network.network_address)
+    return str(network)
+
+
+def _version(ip):
+    return 6 if ':' in ip else 4
+
+
+def _chunks(items):
+    items = list(items)
+    for i in range(0, len(items), CHUNK):
+        yield items[i:i + CHUNK]
+
+
+def _is_active(block, now):
+    return block.status != 'removed' and (block.expires_at is None or block.expires_at > now)
+
+
+def request_blocks(ips, host_ids=None, ttl=None):
+    """
+    Records blocks of the addresses on the hosts (all hosts by default),
+    for `ttl` seconds or until unblocked. Blocks that are already active
+    are only extended, never duplicated. Returns the number of blocks
+    that have to be pushed. Invalid addresses raise ValueError before
+    anything is recorded; the commit is left to the caller.
+    """
+    if ttl is not None and not (isinstance(ttl, int) and ttl > 0):
+        raise ValueError(f"invalid ttl '{ttl}' (seconds, greater than 0)")
+    networks = sorted({canonical(ip) for ip in ips})
+    if host_ids is None:
+        host_ids = [h for h, in db.session.query(Host.id).all()]
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl) if ttl is not None else None
+
+    existing = {}
+    for chunk in _chunks(networks):
+        for block in FirewallBlock.query.filter(FirewallBlock.host_id.in_(host_ids),
+                                                FirewallBlock.ip_address.in_(chunk)):
+            existing[(block.host_id, block.ip_address)] = block
+
+    new_rows, changed = [], 0
+    for host_id in host_ids:
+        for network in networks:
+            block = existing.get((host_id, network))
+            if block is None:
+                new_rows.append({'host_id': host_id, 'ip_address': network, 'status': 'pending',
+                                 'expires_at': expires_at, 'created_at': now, 'updated_at': now})
+            elif not _is_active(block, now):
+                block.status, block.expires_at, block.error = 'pending', expires_at, None
+                changed += 1
+            elif block.expires_at is not None and (expires_at is None or expires_at > block.expires_at):
+                # Still in place on the host, only the end moves
+                block.expires_at = expires_at
+    if new_rows:
+        db.session.execute(db.insert(FirewallBlock), new_rows)
+    return len(new_rows) + changed
+
+
+def request_unblocks(ips, host_ids=None):
+    """Ends active blocks of the addresses now; the next sync removes them. Returns their number."""
+    networks = sorted({canonical(ip) for ip in ips})
+    now = datetime.utcnow()
+    ended = 0
+    for chunk in _chunks(networks):
+        query = FirewallBlock.query.filter(FirewallBlock.ip_address.in_(chunk), FirewallBlock.status != 'removed')
+        if host_ids is not None:
+            query = query.filter(FirewallBlock.host_id.in_(host_ids))
+        for block in query:
+            if _is_active(block, now):
+                block.expires_at = now
+                ended += 1
+    return ended
+
+
+def dirty_host_ids(include_failed=True):
+    """Hosts whose firewall differs from firewall_blocks: pending (or failed) blocks, expired blocks"""
+    statuses = ['pending', 'failed'] if include_failed else ['pending']
+    now = datetime.utcnow()
+    query = db.session.query(FirewallBlock.host_id).filter(db.or_(
+        FirewallBlock.status.in_(statuses),
+        db.and_(FirewallBlock.status != 'removed', FirewallBlock.expires_at <= now)
+    )).distinct()
+    return sorted(h for h, in query.all())
+
+
+class ResponseEngine:
+    """
+    Pushes the blocks recorded in `firewall_blocks` to the hosts' firewalls.
+
+    Every push sends a host's complete block list in one command over the
+    pooled SSH session and replaces what is there, so it is idempotent and
+    never stacks duplicate rules. The `ipset` backend swaps in freshly
+    filled `hash:net` sets, matched by a single iptables rule per address
+    family with one hash lookup per packet. The `iptables` backend rebuilds
+    a SIEM-BLOCK chain with `iptables-restore --noflush` (still one rule per
+    address, for hosts without ipset). Hosts are pushed in parallel; only
+    the calling thread reads and writes the database.
+    """
+
+    def __init__(self, backend='ipset', max_workers=16, timeout=30, pool=ssh_pool):
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown firewall backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+        self.backend = backend
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.pool = pool
+
+    def plan(self, host, now):
+        blocks = db.session.query(FirewallBlock.id, FirewallBlock.ip_address, FirewallBlock.expires_at).filter(
+            FirewallBlock.host_id == host.id, FirewallBlock.status != 'removed'
+        ).all()
+        active, expired = [], []
+        for block_id, ip, expires_at in blocks:
+            if expires_at is None or expires_at > now:
+                active.append((block_id, ip))
+            else:
+                expired.append(block_id)
+        # IPv6 rules are only touched on hosts that have (or had) IPv6 blocks
+        has_ipv6 = any(_version(ip) == 6 for _, ip, _ in blocks)
+        return HostPlan(host, active, expired, has_ipv6)
+
+    def commands(self, plan):
+        """(remote command, stdin) pairs that bring the host to the planned state"""
+        networks = {4: [], 6: []}
+        for _, ip in plan.active:
+            networks[_version(ip)].append(ip)
+        families = (4, 6) if plan.has_ipv6 else (4,)
+
+        if self.backend == 'ipset':
+            lines = []
+            for version in (4, 6):
+                name, family = IPSET_NAMES[version], 'inet' if version == 4 else 'inet6'
+                spec = f"hash:net family {family} maxelem {IPSET_MAXELEM}"
+                lines += [f"create {name} {spec}", f"create {name}-new {spec}", f"flush {name}-new"]
+                lines += [f"add {name}-new {ip}" for ip in networks[version]]
+                lines += [f"swap {name}-new {name}", f"destroy {name}-new"]
+            command = "sudo ipset -exist restore"
+            for version in families:
+                binary = 'iptables' if version == 4 else 'ip6tables'
+                rule = f"INPUT -m set --match-set {IPSET_NAMES[version]} src -j DROP"
+                command += f" && {{ sudo {binary} -C {rule} 2>/dev/null || sudo {binary} -I {rule}; }}"
+            return [(command, '\n'.join(lines) + '\n')]
+
+        commands = []
+        for version in families:
+            binary = 'iptables' if version == 4 else 'ip6tables'
+            # A chain named in --noflush mode is flushed and refilled, the rest of the table stays
+            rules = [f"-A {CHAIN} -s {ip} -j DROP" for ip in networks[version]]
+            payload = '\n'.join(['*filter', f":{CHAIN} - [0:0]", *rules, 'COMMIT']) + '\n'
+            command = (f"sudo {binary}-restore --noflush"
+                       f" && {{ sudo {binary} -C INPUT -j {CHAIN} 2>/dev/null || sudo {binary} -I INPUT -j {CHAIN}; }}")
+            commands.append((command, payload))
+        return commands
+
+    def push(self, host, commands):
+        """Runs in a worker thread: the SSH part of a sync, no database access"""
+        started = time.monotonic()
+        for command, payload in commands:
+            try:
+                exit_status, _, err = self.pool.run(host, command, timeout=self.timeout, data=payload)
+            except Exception:
+                self.pool.discard(host)
+                raise
+            if exit_status != 0:
+                raise RuntimeError(err.strip() or f"firewall update exited with {exit_status}")
+        return time.monotonic() - started
+
+    def sync(self, host_ids=None):
+        """
+        Pushes the current block list of the hosts (default: every host with
+        changes, see dirty_host_ids) and records the outcome. Returns a
+        per-host summary list. Needs an app context.
+        """
+        if host_ids is None:
+            host_ids = dirty_host_ids()
+        if not host_ids:
+            return []
+        hosts = [ingest.host_ref(h) for h in Host.query.filter(Host.id.in_(host_ids)).order_by(Host.id)]
+        # Rows changed after this moment are left for the next sync
+        planned_at = datetime.utcnow()
+        plans = {host.id: self.plan(host, planned_at) for host in hosts}
+        db.session.commit()  # end the read transaction while the hosts are contacted
+
+        summary, newly_applied = [], set()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='firewall') as executor:
+            futures = {executor.submit(self.push, plan.host, self.commands(plan)): plan for plan in plans.values()}
+            for future in as_completed(futures):
+                plan = futures[future]
+                try:
+                    latency = future.result()
+                except Exception as e:
+                    summary.append(self._failed(plan, planned_at, str(e)))
+                else:
+                    summary.append(self._applied(plan, planned_at, latency, newly_applied))
+                db.session.commit()
+
+        # Known-bad from now on: further events from them are escalated (see core/reputation.py)
+        if newly_applied:
+            reputation.mark_many(newly_applied, 'BANNED')
+            db.session.commit()
+        summary.sort(key=lambda entry: entry['host_id'])
+        return summary
+
+    def _applied(self, plan, planned_at, latency, newly_applied):
+        now = datetime.utcnow()
+        added = 0
+        for chunk in _chunks(block_id for block_id, _ in plan.active):
+            rows = db.session.query(FirewallBlock.ip_address).filter(
+                FirewallBlock.id.in_(chunk), FirewallBlock.status.in_(('pending', 'failed')),
+                FirewallBlock.updated_at <= planned_at
+            ).all()
+            newly_applied.update(ip for ip, in rows)
+            added += len(rows)
+            db.session.query(FirewallBlock).filter(
+                FirewallBlock.id.in_(chunk), FirewallBlock.status != 'applied',
+                FirewallBlock.updated_at <= planned_at
+            ).update({'status': 'applied', 'applied_at': now, 'error': None}, synchronize_session=False)
+        for chunk in _chunks(plan.expired):
+            db.session.query(FirewallBlock).filter(
+                FirewallBlock.id.in_(chunk), FirewallBlock.updated_at <= planned_at
+            ).update({'status': 'removed'}, synchronize_session=False)
+        return self._entry(plan, 'ok', latency, added=added)
+
+    def _failed(self, plan, planned_at, error):
+        log.warning('firewall push failed', extra=fields(host=plan.host.name, error=error))
+        for chunk in _chunks(block_id for block_id, _ in plan.active):
+            db.session.query(FirewallBlock).filter(
+                FirewallBlock.id.in_(chunk), FirewallBlock.status.in_(('pending', 'failed')),
+                FirewallBlock.updated_at <= planned_at
+            ).update({'status': 'failed', 'error': error}, synchronize_session=False)
+        return self._entry(plan, 'error', 0.0, error=error)
+
+    @staticmethod
+    def _entry(plan, status, latency, added=0, error=None):
+        return {
+            'host_id': plan.host.id,
+            'host': plan.host.name,
+            'status': status,
+            'latency': round(latency, 3),
+            'blocked': len(plan.active),
+            'added': added,
+            'removed': len(plan.expired) if status == 'ok' else 0,
+            'error': error
+        }
+
+
+def build_engine(config):
+    """Response engine with the backend, pool size and timeout from app config"""
+    return ResponseEngine(
+        backend=config['FIREWALL_BACKEND'],
+        max_workers=config['FIREWALL_WORKERS'],
+        timeout=config['FIREWALL_TIMEOUT']
+    )
+
+
+def schedule_sync(app):
+    """Scheduled job: queues a firewall sync when blocks are pending, failed or expired"""
+    from core import jobs
+    if dirty_host_ids():
+        jobs.enqueue('firewall_sync', dedup_key='firewall_sync')
+    else:
+        db.session.commit()  # end the read transaction
@@ -0,0 +1,98 @@
+from collections import defaultdict
+
+from extensions import db
+from models import Alert, AlertRollup, SEVERITY_RANK
+
+DIMENSIONS = ('severity', 'source_ip', 'host', 'hour')
+
+
+def hour_bucket(timestamp):
+    return timestamp.strftime('%Y-%m-%d %H:00')
+
+
+def aggregate(alert_rows):
+    """Alert mappings -> {(dimension, key): [count, max_severity_rank]}"""
+    deltas = defaultdict(lambda: [0, 0])
+    for row in alert_rows:
+        rank = SEVERITY_RANK.get(row['severity'], 0)
+        keys = (
+            ('severity', row['severity']),
+            ('source_ip', row['source_ip']),
+            ('host', str(row['host_id'])),
+            ('hour', hour_bucket(row['timestamp'])),
+        )
+        for dimension, key in keys:
+            if key is None:
+                continue
+            delta = deltas[(dimension, key)]
+            delta[0] += 1
+            delta[1] = max(delta[1], rank)
+    return deltas
+
+
+def apply(alert_rows):
+    """
+    Adds freshly inserted alerts to the rollups with one UPSERT.
+    Runs inside the caller's transaction, so counters commit together
+    with the alerts themselves.
+    """
+    deltas = aggregate(alert_rows)
+    if not deltas:
+        return
+
+    values = [
+        {'dimension': dimension, 'key': key, 'count': count, 'max_severity_rank': rank}
+        for (dimension, key), (count, rank) in deltas.items()
+    ]
+
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+            greatest = db.func.max  # scalar max(a, b) in SQLite
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+            greatest = db.func.greatest
+        stmt = insert(AlertRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['dimension', 'key'],
+            set_={
+                'count': AlertRollup.count + stmt.excluded.count,
+                'max_severity_rank': greatest(AlertRollup.max_severity_rank, stmt.excluded.max_severity_rank)
+            }
+        )
+        db.session.execute(stmt, values)
+        return
+
+    # Generic fallback: read-modify-write of the touched keys
+    for value in values:
+        rollup = AlertRollup.query.filter_by(dimension=value['dimension'], key=value['key']).first()
+        if rollup is None:
+            db.session.add(AlertRollup(**value))
+        else:
+            rollup.count += value['count']
+            rollup.max_severity_rank = max(rollup.max_severity_rank, value['max_severity_rank'])
+
+
+def read(dimension, min_count=None):
+    """Rollup rows of one dimension (optionally only keys seen more than `min_count` times)"""
+    query = AlertRollup.query.filter(AlertRollup.dimension == dimension)
+    if min_count is not None:
+        query = query.filter(AlertRollup.count > min_count)
+    return query.all()
+
+
+def rebuild():
+    """Recomputes all rollups from the alerts table (one pass, batched)"""
+    AlertRollup.query.delete()
+    batch = []
+    columns = (Alert.host_id, Alert.severity, Alert.source_ip, Alert.timestamp)
+    for host_id, severity, source_ip, timestamp in db.session.query(*columns).yield_per(10_000):
+        if timestamp is None:
+            continue
+        batch.append({'host_id': host_id, 'severity': severity, 'source_ip': source_ip, 'timestamp': timestamp})
+        if len(batch) >= 10_000:
+            apply(batch)
+            batch = []
+    apply(batch)
+    db.session.commit()
@@ -0,0 +1,233 @@
+import glob
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import yaml
+
+from core.logs import fields, get_logger
+
+log = get_logger('rules')
+
+RULES_PATH = os.environ.get('RULES_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'rules'))
+
+SEVERITIES = ('INFO', 'WARNING', 'CRITICAL')
+
+
+class _Missing(dict):
+    """format_map helper: unknown placeholders render as '?'"""
+    def __missing__(self, key):
+        return '?'
+
+
+class Rule:
+    """
+    One detection rule, compiled once:
+    - keywords: lowercase literals, at least one must occur in the line (prefilter)
+    - pattern: regex with named groups, searched case-insensitively
+    - fields: event field -> regex group (target_user, source_ip, ...)
+    - severity: default level plus `when` conditions, first match wins
+    - message: optional alert text template over the fields
+    """
+
+    def __init__(self, spec, origin):
+        try:
+            self.id = spec['id']
+            self.regex = re.compile(spec['pattern'], re.IGNORECASE)
+        except KeyError as e:
+            raise ValueError(f"{origin}: rule is missing '{e.args[0]}'")
+        except re.error as e:
+            raise ValueError(f"{origin}: rule '{spec.get('id')}' has an invalid pattern: {e}")
+
+        self.origin = origin
+        # Rule pack (file name without extension), what log sources select
+        self.pack = os.path.splitext(origin)[0]
+        self.category = spec.get('category')
+        self.keywords = [k.lower() for k in spec.get('keywords', [])]
+        self.fields = spec.get('fields', {})
+        self.message = spec.get('message')
+
+        unknown = set(self.fields.values()) - set(self.regex.groupindex)
+        if unknown:
+            raise ValueError(f"{origin}: rule '{self.id}' maps unknown groups {sorted(unknown)}")
+
+        severity = spec.get('severity', 'INFO')
+        if isinstance(severity, str):
+            severity = {'default': severity}
+        self.default_severity = severity.get('default', 'INFO')
+        self.conditions = severity.get('when', [])
+        for level in [self.default_severity] + [c.get('severity') for c in self.conditions]:
+            if level not in SEVERITIES:
+                raise ValueError(f"{origin}: rule '{self.id}' has unknown severity {level!r}")
+
+    def may_match(self, lowered_line):
+        """Keyword prefilter for a single lowercased line"""
+        return not self.keywords or any(k in lowered_line for k in self.keywords)
+
+    def _condition_holds(self, condition, value):
+        if 'equals' in condition:
+            return value == condition['equals']
+        if 'in' in condition:
+            return value in condition['in']
+        if 'matches' in condition:
+            return value is not None and re.search(condition['matches'], value) is not None
+        return False
+
+    def severity_for(self, fields):
+        """Severity for a single match (row-by-row path)"""
+        for condition in self.conditions:
+            if self._condition_holds(condition, fields.get(condition['field'])):
+                return condition['severity']
+        return self.default_severity
+
+    def severity_column(self, frame):
+        """Severity for a DataFrame of matches (columnar path), same semantics as severity_for"""
+        severity = np.full(len(frame), self.default_severity, dtype=object)
+        # Applied in reverse so that the first matching condition wins
+        for condition in reversed(self.conditions):
+            if condition['field'] not in frame:
+                continue
+            values = frame[condition['field']]
+            if 'equals' in condition:
+                mask = (values == condition['equals']).to_numpy()
+            elif 'in' in condition:
+                mask = values.isin(condition['in']).to_numpy()
+            elif 'matches' in condition:
+                mask = values.map(lambda v: self._condition_holds(condition, v)).to_numpy(dtype=bool)
+            else:
+                continue
+            severity[mask] = condition['severity']
+        return severity
+
+    def title(self, fields):
+        return self.message.format_map(_Missing(fields)) if self.message else None
+
+
+class RuleSet:
+    """
+    All rules from a directory of YAML rule packs (*.yml / *.yaml).
+
+    Rules are compiled once, and a shared keyword prefilter means only
+    candidate lines ever reach a rule's regex. The set reloads itself when
+    a rule file changes (checked at most every `check_interval` seconds);
+    a broken file keeps the previous rules active. `only` limits the set
+    to the given rule ids (e.g. re-parsing history with a new rule).
+    """
+
+    def __init__(self, path=RULES_PATH, check_interval=5.0, only=None):
+        self.path = path
+        self.check_interval = check_interval
+        self.only = set(only) if only else None
+        self._active = ([], None)  # (rules, combined keyword regex), swapped as one
+        self._stamp = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _files(self):
+        return sorted(glob.glob(os.path.join(self.path, '*.yml')) + glob.glob(os.path.join(self.path, '*.yaml')))
+
+    def _current_stamp(self):
+        return tuple((f, os.stat(f).st_mtime_ns) for f in self._files())
+
+    def reload(self):
+        """Loads and compiles every rule file; raises ValueError on invalid rules"""
+        stamp = self._current_stamp()
+        rules, seen = [], set()
+        for filename in self._files():
+            with open(filename, encoding='utf-8') as fh:
+                pack = yaml.safe_load(fh) or {}
+            for spec in pack.get('rules', []):
+                rule = Rule(spec, os.path.basename(filename))
+                if rule.id in seen:
+                    raise ValueError(f"{rule.origin}: duplicate rule id '{rule.id}'")
+                seen.add(rule.id)
+                rules.append(rule)
+
+        if self.only is not None:
+            unknown = self.only - seen
+            if unknown:
+                raise ValueError(f"unknown rule ids: {', '.join(sorted(unknown))}")
+            rules = [r for r in rules if r.id in self.only]
+
+        keywords = sorted({k for r in rules for k in r.keywords})
+        # RE2 syntax (arrow kernel): escaped literals only
+        combined = '|'.join(re.escape(k) for k in keywords) if keywords else None
+
+        # Swap in one go, parsers running right now keep the old rules
+        self._active, self._stamp = (rules, combined), stamp
+        log.info('rules loaded', extra=fields(rules=len(rules), path=self.path))
+
+    def maybe_reload(self):
+        """Hot reload: re-reads the rule files if any of them changed"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                if self._current_stamp() != self._stamp:
+                    self.reload()
+            except Exception as e:
+                log.error('rule reload failed, keeping previous rules', extra=fields(path=self.path, error=e))
+
+    @property
+    def rules(self):
+        return self._active[0]
+
+    @property
+    def packs(self):
+        """Names of the rule pack files (LogSource.rules)"""
+        return [os.path.splitext(os.path.basename(f))[0] for f in self._files()]
+
+    def candidates(self, messages):
+        """
+        Keyword prefilter over a message column (case-insensitive).
+        One pass with all keywords finds lines worth looking at; per-keyword
+        checks then run only on that (usually small) subset. Both run as
+        arrow string kernels, the rules' own regexes never see other lines.
+        Returns (rules, {rule id: boolean mask}).
+        """
+        rules, combined = self._active
+        count = len(messages)
+        text = pa.array(messages, type=pa.string(), from_pandas=True)
+        if combined is not None:
+            any_hit = pc.fill_null(pc.match_substring_regex(text, combined, ignore_case=True), False)
+            hit_rows = np.flatnonzero(any_hit.to_numpy(zero_copy_only=False))
+        else:
+            hit_rows = np.array([], dtype='int64')
+        subset = text.take(pa.array(hit_rows, type=pa.int64()))
+
+        masks, keyword_masks = {}, {}
+        for rule in rules:
+            if not rule.keywords:
+                masks[rule.id] = np.ones(count, dtype=bool)
+                continue
+            mask = np.zeros(count, dtype=bool)
+            for keyword in rule.keywords:
+                if keyword not in keyword_masks:
+                    found = pc.match_substring(subset, keyword, ignore_case=True)
+                    hit = np.zeros(count, dtype=bool)
+                    hit[hit_rows[pc.fill_null(found, False).to_numpy(zero_copy_only=False)]] = True
+                    keyword_masks[keyword] = hit
+                mask |= keyword_masks[keyword]
+            masks[rule.id] = mask
+        return rules, masks
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_ruleset():
+    """Process-wide rule set loaded from RULES_PATH, hot-reloaded on change"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = RuleSet()
+    _default.maybe_reload()
+    return _default
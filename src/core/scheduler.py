@@ -0,0 +1,211 @@
+import functools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from models import Host
+from core import ingest, metrics
+from core.logs import fields, get_logger
+
+log = get_logger('scheduler')
+
+
+class FetchScheduler:
+    """
+    Fans a fetch sweep out over all (or selected) hosts.
+
+    Worker threads only do the network and file work (SSH, Parquet, parsing).
+    Their results are handed back to the calling thread, which queues them
+    on the write-behind buffer, the single writer for LogArchive / Alert /
+    LogSource, so SQLite never sees concurrent writers.
+    """
+
+    def __init__(self, app, max_workers=8, host_timeout=60):
+        self.app = app
+        self.max_workers = max_workers
+        self.host_timeout = host_timeout
+
+    def _collect(self, host, sources, started):
+        started[host.id] = time.monotonic()
+        with self.app.app_context():
+            return ingest.collect(host, sources=sources, timeout=self.host_timeout)
+
+    def run(self, host_ids=None):
+        """Runs one sweep, returns a per-host summary list. Needs an app context."""
+        query = Host.query
+        if host_ids:
+            query = query.filter(Host.id.in_(host_ids))
+        hosts = [ingest.host_ref(h) for h in query.order_by(Host.id).all()]
+        sources = ingest.host_sources([h.id for h in hosts])
+
+        summary = []
+        started = {}
+        # Grace period on top of the collector's own deadline before a host is given up on
+        hard_limit = self.host_timeout + 5
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='fetch')
+        try:
+            pending = {executor.submit(self._collect, h, sources[h.id], started): h for h in hosts}
+
+            while pending:
+                done, _ = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    host = pending.pop(future)
+                    summary.append(self._write(host, future))
+
+                # Hosts stuck past the limit are reported now; what they archived
+                # until then is still recorded when they finish (see _write_late)
+                now = time.monotonic()
+                for future, host in list(pending.items()):
+                    if host.id in started and now - started[host.id] > hard_limit:
+                        pending.pop(future)
+                        future.add_done_callback(functools.partial(self._write_late, host))
+                        summary.append(self._entry(host, 'timeout', now - started[host.id],
+                                                   error=f"no result after {hard_limit}s"))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        # Wait for the write-behind buffer to commit the queued results
+        for entry in summary:
+            if isinstance(entry['alerts'], Future):
+                try:
+                    entry['alerts'] = entry['alerts'].result()
+                except Exception as e:
+                    entry.update(status='error', alerts=0, error=str(e))
+        return summary
+
+    def _write(self, host, future):
+        """Single-writer step: persists one host's result"""
+        try:
+            result = future.result()
+        except Exception as e:
+            return self._entry(host, 'error', 0.0, error=str(e))
+
+        if not result.archives:
+            if result.error:
+                return self._entry(host, 'error', result.latency, logs=result.logs_count, error=result.error)
+            return self._entry(host, 'empty', result.latency)
+
+        # Partially saved batches are stored too, the cursor only moves on full success
+        # (alert count is a Future until the write-behind buffer has committed it)
+        alerts = ingest.submit(result)
+        status = 'error' if result.error else 'ok'
+        return self._entry(host, status, result.latency, logs=result.logs_count, alerts=alerts, error=result.error)
+
+    def _write_late(self, host, future):
+        """
+        Stores the result of a host that ran past the limit (collector
+        thread). Its Parquet files exist already; without their LogArchive
+        rows and the new cursor they would be orphaned and fetched again.
+        """
+        with self.app.app_context():
+            entry = self._write(host, future)
+        if isinstance(entry['alerts'], Future):
+            try:
+                entry['alerts'] = entry['alerts'].result()
+            except Exception as e:
+                entry.update(status='error', alerts=0, error=str(e))
+        log.warning('late result stored', extra=fields(host=host.name, status=entry['status'], logs=entry['logs'],
+                                                       alerts=entry['alerts'], error=entry['error']))
+
+    @staticmethod
+    def _entry(host, status, latency, logs=0, alerts=0, error=None):
+        return {
+            'host_id': host.id,
+            'host': host.name,
+            'status': status,
+            'latency': round(latency, 3),
+            'logs': logs,
+            'alerts': alerts,
+            'error': error
+        }
+
+
+class PeriodicService(threading.Thread):
+    """Daemon thread running `job(app)` inside an app context every `interval` seconds"""
+
+    def __init__(self, app, name, interval, job):
+        super().__init__(name=name, daemon=True)
+        self.app = app
+        self.interval = interval
+        self.job = job
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    self.job(self.app)
+            except Exception as e:
+                log.error('service run failed', extra=fields(service=self.name, error=e))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def fetch_sweep(app):
+    """Scheduled job: one fetch sweep over all hosts with the configured pool"""
+    scheduler = FetchScheduler(
+        app,
+        max_workers=app.config['FETCH_WORKERS'],
+        host_timeout=app.config['FETCH_TIMEOUT']
+    )
+    summary = scheduler.run()
+    failed = sum(1 for s in summary if s['status'] in ('error', 'timeout'))
+    log.info('sweep done', extra=fields(hosts=len(summary), failed=failed))
+    return summary
+
+
+_services = []
+_services_lock = threading.Lock()
+
+
+def start_background_services(app, job_workers=None):
+    """
+    Starts the configured periodic services and the job worker processes
+    (`job_workers`, default JOB_WORKERS) once per process. `flask worker`
+    runs them; the web app only with BACKGROUND_SERVICES=1, since every
+    process doing so opens its own SSH sessions, sweeps and workers.
+    Returns the started services.
+    """
+    with _services_lock:
+        if _services:
+            return list(_services)
+        if app.config.get('FETCH_INTERVAL'):
+            _services.append(PeriodicService(app, 'fetch-scheduler', app.config['FETCH_INTERVAL'], fetch_sweep))
+        if app.config.get('COMPACT_INTERVAL'):
+            from core.compactor import compact_all
+            _services.append(PeriodicService(app, 'compactor', app.config['COMPACT_INTERVAL'], compact_all))
+        if app.config.get('STREAM_LOGS'):
+            from core.streamer import LogStreamer
+            _services.append(LogStreamer(
+                app,
+                batch_size=app.config['STREAM_BATCH_SIZE'],
+                batch_interval=app.config['STREAM_BATCH_INTERVAL']
+            ))
+        if app.config.get('FIREWALL_SYNC_INTERVAL'):
+            from core.response import schedule_sync
+            _services.append(PeriodicService(app, 'firewall-sync', app.config['FIREWALL_SYNC_INTERVAL'], schedule_sync))
+        job_workers = app.config.get('JOB_WORKERS') if job_workers is None else job_workers
+        if job_workers:
+            from core.jobs import WorkerPool
+            # Counters of the previous run's workers would be added to the new ones
+            metrics.REGISTRY.clear_snapshots(app.config['METRICS_DIR'])
+            _services.append(WorkerPool(app, job_workers, app.config['JOB_POLL_INTERVAL']))
+        for service in _services:
+            service.start()
+        log.info('background services started', extra=fields(services=len(_services), job_workers=job_workers))
+        return list(_services)
+
+
+def stop_background_services(timeout=10):
+    """Stops what start_background_services started and waits up to `timeout` seconds for each"""
+    with _services_lock:
+        services = list(_services)
+        _services.clear()
+    for service in services:
+        service.stop()
+    for service in services:
+        service.join(timeout)
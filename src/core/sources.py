@@ -0,0 +1,165 @@
+import re
+import shlex
+from collections import namedtuple
+
+# Log sources of a host (LogSource rows). A source is either
+#   - a group of journal matches: its systemd units (_SYSTEMD_UNIT=<unit>) and
+#     FIELD=value terms, with journalctl's semantics: values of one field are
+#     alternatives, different fields must all match, or
+#   - a log file, read from the byte offset stored as its cursor.
+# All journal sources of a host are pulled by one journalctl invocation (the
+# groups joined with '+'), file sources by one channel each on the same
+# pooled SSH session. Entries carry the name of their source, which selects
+# the rule packs they are parsed with.
+
+# A LogSource row as the collector and the parser see it (plain values, safe across threads)
+SourceRef = namedtuple('SourceRef', ['id', 'name', 'units', 'matches', 'path', 'rules', 'cursor'])
+
+# Hosts without log_sources rows: sshd, parsed with every rule pack
+DEFAULT_SOURCE = SourceRef(None, 'ssh', ('ssh.service',), (), None, None, None)
+
+UNIT_FIELD = '_SYSTEMD_UNIT'
+_NAME_RE = re.compile(r'^[\w.-]{1,32}$')
+_FIELD_RE = re.compile(r'^[A-Z0-9_]+$')
+
+
+def split_list(text):
+    """'a, b,,c' -> ('a', 'b', 'c')"""
+    return tuple(item.strip() for item in (text or '').split(',') if item.strip())
+
+
+def parse_match(term):
+    """'FIELD=value' -> (field, value); raises ValueError"""
+    field, separator, value = term.partition('=')
+    if not separator or not _FIELD_RE.match(field) or not value:
+        raise ValueError(f"invalid journal match '{term}', expected FIELD=value")
+    return field, value
+
+
+def source_ref(log_source):
+    """LogSource row -> SourceRef; a row without units, matches or path is the sshd default"""
+    units, matches, path = split_list(log_source.units), split_list(log_source.matches), log_source.path or None
+    if not (units or matches or path):
+        # Never fetch the whole journal by accident
+        units = DEFAULT_SOURCE.units
+    return SourceRef(log_source.id, log_source.log_type or DEFAULT_SOURCE.name, units, matches, path,
+                     split_list(log_source.rules) or None, log_source.cursor)
+
+
+def validate(source, packs):
+    """Raises ValueError if the source cannot be fetched or names unknown rule packs"""
+    if not _NAME_RE.match(source.name or ''):
+        raise ValueError("name: 1-32 letters, digits, '.', '_' or '-'")
+    if source.path and (source.units or source.matches):
+        raise ValueError('a source reads either a file (path) or the journal (units / matches)')
+    if not (source.path or source.units or source.matches):
+        raise ValueError('a source needs units, matches or a path')
+    if source.path and not source.path.startswith('/'):
+        raise ValueError('path must be absolute')
+    for unit in source.units:
+        if any(c.isspace() for c in unit) or '=' in unit:
+            raise ValueError(f"invalid unit '{unit}'")
+    for term in source.matches:
+        parse_match(term)
+    unknown = set(source.rules or ()) - set(packs)
+    if unknown:
+        raise ValueError(f"unknown rule packs: {', '.join(sorted(unknown))}")
+
+
+def journal_sources(sources):
+    return [source for source in sources if not source.path]
+
+
+def file_sources(sources):
+    return [source for source in sources if source.path]
+
+
+def journal_cursor(sources):
+    """Cursor the journal sources resume after: they share one journalctl stream, so one position"""
+    return next((source.cursor for source in journal_sources(sources) if source.cursor), None)
+
+
+def journal_matches(sources):
+    """journalctl match arguments of journal sources: one group per source, '+' between the groups"""
+    groups = []
+    for source in sources:
+        terms = [f"{UNIT_FIELD}={unit}" for unit in source.units] + list(source.matches)
+        groups.append(' '.join(shlex.quote(term) for term in terms))
+    return ' + '.join(groups)
+
+
+# A new file source (no cursor yet) starts this many bytes before the end of
+# the file, like the journal's first fetch with -n 1000
+FIRST_READ_BYTES = 256 * 1024
+
+
+def file_command(source, offset=None, follow=False):
+    """
+    Reads a log file from `offset` (bytes), or its last FIRST_READ_BYTES
+    when `offset` is None. The first output line is the offset actually
+    used: 0 when the file is now shorter (rotated or truncated), so
+    reading starts over.
+    """
+    path = shlex.quote(source.path)
+    if offset is None:
+        # One byte earlier: the reader drops the first (partial) line, a newline
+        # right there makes that an empty line and the next one is kept whole
+        start = f"start=$(( size > {FIRST_READ_BYTES} ? size - {FIRST_READ_BYTES} - 1 : 0 ))"
+    else:
+        start = f"start={int(offset)} && {{ [ \"$size\" -ge \"$start\" ] || start=0; }}"
+    return (f"size=$(sudo stat -c %s -- {path}) && {start} && echo \"$start\" && "
+            f"sudo tail -c +$((start + 1)){' -F' if follow else ''} -- {path}")
+
+
+def rule_routes(sources):
+    """Source name -> rule packs its entries are parsed with (None: every pack), see LogParser"""
+    return {source.name: frozenset(source.rules) if source.rules else None for source in sources}
+
+
+def advance(sources, cursor=None, offsets=None):
+    """SourceRefs after a stored batch: journal sources at `cursor`, file sources at their new offset"""
+    offsets = offsets or {}
+    moved = []
+    for source in sources:
+        if source.path:
+            if source.name in offsets:
+                source = source._replace(cursor=str(offsets[source.name]))
+        elif cursor:
+            source = source._replace(cursor=cursor)
+        moved.append(source)
+    return moved
+
+
+class Router:
+    """
+    Journal entry -> name of the journal source it was fetched for, with the
+    match semantics of journalctl; the first matching source wins. Entries
+    that match no source get None and are parsed with every rule pack.
+    """
+
+    def __init__(self, sources):
+        self.sources = [(source.name, self._conditions(source)) for source in sources]
+        # One source: nothing to decide
+        self.single = self.sources[0][0] if len(self.sources) == 1 else None
+        # Fields the entries need for routing (added to --output-fields)
+        self.fields = tuple(sorted({field for _, conditions in self.sources for field in conditions}))
+
+    @staticmethod
+    def _conditions(source):
+        conditions = {}
+        terms = [(UNIT_FIELD, unit) for unit in source.units] + [parse_match(term) for term in source.matches]
+        for field, value in terms:
+            conditions.setdefault(field, set()).add(value)
+        return conditions
+
+    def route(self, entry):
+        if self.single is not None:
+            return self.single
+        for name, conditions in self.sources:
+            for field, values in conditions.items():
+                value = entry.get(field)
+                if value.__class__ is not str or value not in values:
+                    break
+            else:
+                return name
+        return None
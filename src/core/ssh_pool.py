@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+import weakref
+import paramiko
+
+from core.metrics import SSH_CONNECTIONS, SSH_ERRORS
+
+KEY_PATH = os.environ.get('SSH_KEY_PATH', '/root/.ssh/id_rsa_siem')
+SSH_USER = os.environ.get('SSH_USER', 'mikolaj_mazur05')
+
+
+class _Session:
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.monotonic()
+        # Channels opened by exec_command; a follow stream keeps one open for hours
+        self.channels = weakref.WeakSet()
+
+    def is_alive(self):
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def in_use(self):
+        return any(not channel.closed for channel in list(self.channels))
+
+
+class SSHPool:
+    """
+    Process-wide pool of SSH sessions keyed by host address.
+
+    The private key is parsed once, every session goes through its own
+    `cloudflared access ssh` ProxyCommand and stays open with keepalives.
+    Dead sessions are replaced on the next use, idle ones (no open channel
+    for idle_timeout seconds) are closed.
+    Paramiko transports multiplex channels, so threads share one session per host.
+    """
+
+    def __init__(self, key_path=KEY_PATH, username=SSH_USER, keepalive=30, idle_timeout=600):
+        self.key_path = key_path
+        self.username = username
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self._key = None
+        self._sessions = {}
+        self._host_locks = {}
+        self._lock = threading.Lock()
+
+    def _pkey(self):
+        with self._lock:
+            if self._key is None:
+                self._key = paramiko.RSAKey.from_private_key_file(self.key_path)
+            return self._key
+
+    def _host_lock(self, address):
+        with self._lock:
+            return self._host_locks.setdefault(address, threading.Lock())
+
+    def _connect(self, address, timeout):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        sock = paramiko.ProxyCommand(f"cloudflared access ssh --hostname {address}")
+        client.connect(
+            hostname=address,
+            username=self.username,
+            pkey=self._pkey(),
+            sock=sock,
+            timeout=timeout,
+            banner_timeout=timeout,
+            auth_timeout=timeout,
+            allow_agent=False,
+            look_for_keys=False
+        )
+        client.get_transport().set_keepalive(self.keepalive)
+        return client
+
+    def get(self, host, timeout=10):
+        """Returns a connected SSHClient for the host, reusing a live session"""
+        self.evict_idle()
+        address = host.ip_address
+
+        with self._host_lock(address):
+            session = self._sessions.get(address)
+            if session and not session.is_alive():
+                SSH_ERRORS.labels(host.name).inc()
+                session.client.close()
+                session = None
+            if session is None:
+                try:
+                    session = _Session(self._connect(address, timeout))
+                except Exception:
+                    SSH_ERRORS.labels(host.name).inc()
+                    raise
+                SSH_CONNECTIONS.labels(host.name).inc()
+                self._sessions[address] = session
+            session.last_used = time.monotonic()
+            return session.client
+
+    def exec_command(self, host, cmd, timeout=None):
+        """exec_command on the pooled session, reconnecting once if it went stale"""
+        try:
+            streams = self.get(host, timeout=min(timeout, 10) if timeout else 10).exec_command(cmd, timeout=timeout)
+        except (paramiko.SSHException, EOFError, OSError):
+            self.discard(host)
+            streams = self.get(host, timeout=min(timeout, 10) if timeout else 10).exec_command(cmd, timeout=timeout)
+        with self._lock:
+            session = self._sessions.get(host.ip_address)
+            if session:
+                # Not idle while the channel is open (see evict_idle)
+                session.channels.add(streams[1].channel)
+        return streams
+
+    def run(self, host, cmd, timeout=30, data=None):
+        """Runs a command to completion, returns (exit_status, stdout, stderr); `data` goes to its stdin"""
+        stdin, stdout, stderr = self.exec_command(host, cmd, timeout=timeout)
+        if data is not None:
+            stdin.write(data)
+            stdin.flush()
+            stdin.channel.shutdown_write()
+        out = stdout.read().decode('utf-8', errors='replace')
+        err = stderr.read().decode('utf-8', errors='replace')
+        return stdout.channel.recv_exit_status(), out, err
+
+    def discard(self, host):
+        """Drops the host's session, e.g. after an error on it"""
+        with self._lock:
+            session = self._sessions.pop(host.ip_address, None)
+        if session:
+            session.client.close()
+
+    def evict_idle(self):
+        """Closes dead sessions and those unused for idle_timeout; open channels count as use"""
+        now = time.monotonic()
+        with self._lock:
+            for session in self._sessions.values():
+                if session.in_use():
+                    session.last_used = now
+            stale = [a for a, s in self._sessions.items()
+                     if now - s.last_used > self.idle_timeout or not s.is_alive()]
+            evicted = [self._sessions.pop(a) for a in stale]
+        for session in evicted:
+            session.client.close()
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.client.close()
+
+
+# Shared by the collector and the response actions
+ssh_pool = SSHPool()
@@ -0,0 +1,135 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy import event
+
+from extensions import db
+from core.logs import fields, get_logger
+from core.metrics import DB_LOCKED, DB_WRITE_DURATION
+
+log = get_logger('storage')
+
+
+def configure_sqlite(app):
+    """
+    Applies the SQLITE_* settings to every new SQLite connection:
+    WAL journal (readers and the writer no longer block each other),
+    synchronous=NORMAL (fsync at checkpoints only, safe with WAL),
+    a larger page cache, memory-mapped reads and a busy timeout so
+    concurrent writers wait for the lock instead of failing with
+    "database is locked". No-op for other databases.
+    """
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite' or not app.config['SQLITE_TUNING']:
+        return
+
+    pragmas = [
+        f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT'])}",
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA cache_size=-{int(app.config['SQLITE_CACHE_SIZE_KB'])}",  # negative = KiB
+        f"PRAGMA mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def instrument_engine(app):
+    """
+    Times INSERT/UPDATE/DELETE statements (siem_db_write_duration_seconds).
+    With SQLite the write lock is taken by a transaction's first write, so
+    the busy_timeout wait for it shows up here. "database is locked" errors
+    are counted in siem_db_locked_total.
+    """
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and statement.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+            context.write_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'write_started', None)
+        if started is not None:
+            DB_WRITE_DURATION.observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, 'handle_error')
+    def count_locked(context):
+        if 'database is locked' in str(context.original_exception):
+            DB_LOCKED.inc()
+
+
+class WriteBehindBuffer(threading.Thread):
+    """
+    Collects items from many threads and writes them in batches from one
+    thread: a batch is flushed when it reaches `max_items` or when its
+    oldest item is `max_delay` seconds old. `flush(items)` runs inside an
+    app context and returns one value (or exception) per item, which
+    resolves the Future returned by submit().
+    """
+
+    def __init__(self, app, flush, max_items=50, max_delay=1.0, name='write-behind'):
+        super().__init__(name=name, daemon=True)
+        self.app = app
+        self.flush = flush
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self._items = queue.Queue()
+        self._stop_event = threading.Event()
+
+    def submit(self, item):
+        future = Future()
+        self._items.put((item, future))
+        return future
+
+    def run(self):
+        while not (self._stop_event.is_set() and self._items.empty()):
+            try:
+                batch = [self._items.get(timeout=1)]
+            except queue.Empty:
+                continue
+
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop_event.is_set():
+                    break
+                try:
+                    batch.append(self._items.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+
+    def _write(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            with self.app.app_context():
+                outcomes = self.flush(items)
+        except Exception as e:
+            log.error('write-behind flush failed', extra=fields(buffer=self.name, items=len(items), error=e))
+            outcomes = [e] * len(items)
+
+        for (_, future), outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    def stop(self):
+        """Flushes what is queued, then ends the thread"""
+        self._stop_event.set()
@@ -0,0 +1,102 @@
+import functools
+import queue
+import threading
+
+from models import Host
+from core import ingest
+from core.collector import LogCollector
+from core.logs import fields, get_logger
+from core.metrics import FETCH_ERRORS
+from core.sources import advance, journal_cursor, rule_routes
+
+
+log = get_logger('streamer')
+
+
+class LogStreamer:
+    """
+    Follow mode: one `journalctl --follow` reader per host, one DB writer.
+
+    Readers save and parse each micro-batch as it arrives and queue the
+    results; the writer thread stores them (alerts + cursor) one by one.
+    A reader follows all log sources of its host over one SSH session.
+    After a disconnect it resumes from the last cursor / offsets it saw,
+    and after a restart from the ones stored in LogSource.
+    """
+
+    def __init__(self, app, host_ids=None, batch_size=500, batch_interval=2.0, retry_delay=5.0):
+        self.app = app
+        self.host_ids = host_ids
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.retry_delay = retry_delay
+        self._results = queue.Queue(maxsize=1000)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        with self.app.app_context():
+            query = Host.query
+            if self.host_ids:
+                query = query.filter(Host.id.in_(self.host_ids))
+            hosts = [ingest.host_ref(h) for h in query.order_by(Host.id).all()]
+            sources = ingest.host_sources([h.id for h in hosts])
+
+        writer = threading.Thread(target=self._write, name='stream-writer', daemon=True)
+        self._threads.append(writer)
+        for host in hosts:
+            self._threads.append(threading.Thread(
+                target=self._read, args=(host, sources[host.id]),
+                name=f"stream-{host.name}", daemon=True
+            ))
+        for thread in self._threads:
+            thread.start()
+        log.info('streaming', extra=fields(hosts=len(hosts)))
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _read(self, host, sources):
+        collector = LogCollector.from_config(self.app.config)
+        routes = rule_routes(sources)
+        while not self._stop.is_set():
+            try:
+                for batch in collector.follow(host, cursor=journal_cursor(sources), batch_size=self.batch_size,
+                                              batch_interval=self.batch_interval, stop=self._stop, sources=sources):
+                    with self.app.app_context():
+                        result = ingest.process(host, batch, routes)
+                    sources = advance(sources, result.cursor, result.offsets)
+                    self._results.put(result)
+            except Exception as e:
+                FETCH_ERRORS.labels(host.name).inc()
+                log.warning('stream broke, reconnecting', extra=fields(host=host.name, error=e))
+                collector.pool.discard(host)
+            # Stream ended or broke: reconnect after the last seen entry
+            self._stop.wait(self.retry_delay)
+
+    def _write(self):
+        while not (self._stop.is_set() and self._results.empty()):
+            try:
+                result = self._results.get(timeout=1)
+            except queue.Empty:
+                continue
+            if result.error:
+                log.warning('stream batch not fully saved', extra=fields(host=result.host.name, error=result.error))
+            if not result.archives:
+                continue
+            try:
+                with self.app.app_context():
+                    # Batched with the other hosts' results by the write-behind buffer
+                    stored = ingest.submit(result)
+                stored.add_done_callback(functools.partial(self._stored, result.host.name))
+            except Exception as e:
+                log.error('stream store failed', extra=fields(host=result.host.name, error=e))
+
+    @staticmethod
+    def _stored(name, future):
+        if future.exception():
+            log.error('stream store failed', extra=fields(host=name, error=future.exception()))
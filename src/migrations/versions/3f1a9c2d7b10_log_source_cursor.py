@@ -0,0 +1,26 @@
+"""journald cursor on log_sources
+
+Revision ID: 3f1a9c2d7b10
+Revises:
+Create Date: 2026-10-18 10:12:41.180421
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a9c2d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('log_sources', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cursor', sa.String(length=256), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('log_sources', schema=None) as batch_op:
+        batch_op.drop_column('cursor')
@@ -0,0 +1,62 @@
+"""alert fingerprint for set-based deduplication
+
+Revision ID: 8b2e4d6a1c37
+Revises: 3f1a9c2d7b10
+Create Date: 2026-10-18 11:03:17.552904
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4d6a1c37'
+down_revision = '3f1a9c2d7b10'
+branch_labels = None
+depends_on = None
+
+
+alerts = sa.table(
+    'alerts',
+    sa.column('id', sa.Integer),
+    sa.column('host_id', sa.Integer),
+    sa.column('source_ip', sa.String),
+    sa.column('target_user', sa.String),
+    sa.column('timestamp', sa.DateTime),
+    sa.column('fingerprint', sa.String),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('alerts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fingerprint', sa.String(length=40), nullable=True))
+
+    # Backfill existing alerts (same formula as core.ingest.alert_fingerprint);
+    # rows duplicating an earlier alert keep NULL
+    conn = op.get_bind()
+    seen = set()
+    rows = conn.execute(sa.select(
+        alerts.c.id, alerts.c.host_id, alerts.c.timestamp, alerts.c.source_ip, alerts.c.target_user
+    ).order_by(alerts.c.id)).all()
+    for row in rows:
+        if row.timestamp is None:
+            continue
+        key = f"{row.host_id}|{row.timestamp.isoformat(sep=' ')}|{row.source_ip}|{row.target_user}"
+        fingerprint = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        conn.execute(alerts.update().where(alerts.c.id == row.id).values(fingerprint=fingerprint))
+
+    with op.batch_alter_table('alerts', schema=None) as batch_op:
+        batch_op.create_index('ix_alerts_fingerprint', ['fingerprint'], unique=True)
+        batch_op.create_index('ix_alerts_host_id_timestamp', ['host_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('alerts', schema=None) as batch_op:
+        batch_op.drop_index('ix_alerts_host_id_timestamp')
+        batch_op.drop_index('ix_alerts_fingerprint')
+        batch_op.drop_column('fingerprint')
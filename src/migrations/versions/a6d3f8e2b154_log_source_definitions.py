@@ -0,0 +1,35 @@
+"""log source definitions
+
+Revision ID: a6d3f8e2b154
+Revises: f0c4b7a2d913
+Create Date: 2026-10-18 21:06:37.412958
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d3f8e2b154'
+down_revision = 'f0c4b7a2d913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('log_sources', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('units', sa.String(length=256), nullable=True))
+        batch_op.add_column(sa.Column('matches', sa.String(length=256), nullable=True))
+        batch_op.add_column(sa.Column('path', sa.String(length=256), nullable=True))
+        batch_op.add_column(sa.Column('rules', sa.String(length=256), nullable=True))
+
+    # Existing sources were fetched with `journalctl -u ssh.service`
+    op.execute("UPDATE log_sources SET units = 'ssh.service' WHERE units IS NULL")
+
+
+def downgrade():
+    with op.batch_alter_table('log_sources', schema=None) as batch_op:
+        batch_op.drop_column('rules')
+        batch_op.drop_column('path')
+        batch_op.drop_column('matches')
+        batch_op.drop_column('units')
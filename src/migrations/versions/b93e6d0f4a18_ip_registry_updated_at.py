@@ -0,0 +1,26 @@
+"""ip registry updated_at index
+
+Revision ID: b93e6d0f4a18
+Revises: d2f8a5c1e607
+Create Date: 2026-10-18 19:02:55.184203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b93e6d0f4a18'
+down_revision = 'd2f8a5c1e607'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ip_registry', schema=None) as batch_op:
+        batch_op.create_index('ix_ip_registry_updated_at', ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ip_registry', schema=None) as batch_op:
+        batch_op.drop_index('ix_ip_registry_updated_at')
@@ -0,0 +1,76 @@
+"""alert rollup counters
+
+Revision ID: c5d93e07f4a2
+Revises: 8b2e4d6a1c37
+Create Date: 2026-10-18 12:26:05.734118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d93e07f4a2'
+down_revision = '8b2e4d6a1c37'
+branch_labels = None
+depends_on = None
+
+
+alerts = sa.table(
+    'alerts',
+    sa.column('host_id', sa.Integer),
+    sa.column('severity', sa.String),
+    sa.column('source_ip', sa.String),
+    sa.column('timestamp', sa.DateTime),
+)
+
+
+def upgrade():
+    rollups = op.create_table('alert_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('dimension', sa.String(length=16), nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('max_severity_rank', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('dimension', 'key', name='uq_alert_rollups_dimension_key')
+    )
+    with op.batch_alter_table('alert_rollups', schema=None) as batch_op:
+        batch_op.create_index('ix_alert_rollups_dimension_count', ['dimension', 'count'], unique=False)
+
+    # Backfill from existing alerts (same SEVERITY_RANK as models.py)
+    conn = op.get_bind()
+    rank = sa.case(
+        (alerts.c.severity == 'CRITICAL', 2),
+        (alerts.c.severity == 'WARNING', 1),
+        else_=0
+    )
+    if conn.dialect.name == 'sqlite':
+        hour = sa.func.strftime('%Y-%m-%d %H:00', alerts.c.timestamp)
+    else:
+        hour = sa.func.to_char(alerts.c.timestamp, 'YYYY-MM-DD HH24:00')
+
+    dimensions = (
+        ('severity', alerts.c.severity),
+        ('source_ip', alerts.c.source_ip),
+        ('host', sa.cast(alerts.c.host_id, sa.String)),
+        ('hour', hour),
+    )
+    for dimension, key in dimensions:
+        grouped = conn.execute(
+            sa.select(key.label('key'), sa.func.count().label('count'), sa.func.max(rank).label('max_rank'))
+            .where(key.is_not(None))
+            .group_by(key)
+        ).all()
+        if grouped:
+            op.bulk_insert(rollups, [
+                {'dimension': dimension, 'key': r.key, 'count': r.count, 'max_severity_rank': r.max_rank}
+                for r in grouped
+            ])
+
+
+def downgrade():
+    with op.batch_alter_table('alert_rollups', schema=None) as batch_op:
+        batch_op.drop_index('ix_alert_rollups_dimension_count')
+
+    op.drop_table('alert_rollups')
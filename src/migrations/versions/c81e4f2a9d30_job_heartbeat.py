@@ -0,0 +1,26 @@
+"""job heartbeat
+
+Revision ID: c81e4f2a9d30
+Revises: a6d3f8e2b154
+Create Date: 2026-10-18 22:14:08.530417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81e4f2a9d30'
+down_revision = 'a6d3f8e2b154'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.drop_column('heartbeat_at')
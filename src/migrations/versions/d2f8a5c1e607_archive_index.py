@@ -0,0 +1,42 @@
+"""archive search index
+
+Revision ID: d2f8a5c1e607
+Revises: a4c7e1f3b920
+Create Date: 2026-10-18 18:14:27.530941
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f8a5c1e607'
+down_revision = 'a4c7e1f3b920'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archive_index',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('archive_id', sa.Integer(), nullable=False),
+    sa.Column('host_id', sa.Integer(), nullable=True),
+    sa.Column('min_ts', sa.Float(), nullable=True),
+    sa.Column('max_ts', sa.Float(), nullable=True),
+    sa.Column('row_count', sa.Integer(), nullable=True),
+    sa.Column('bloom', sa.LargeBinary(), nullable=False),
+    sa.Column('bloom_hashes', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['archive_id'], ['log_archives.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['host_id'], ['hosts.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('archive_id')
+    )
+    with op.batch_alter_table('archive_index', schema=None) as batch_op:
+        batch_op.create_index('ix_archive_index_host_id_min_ts', ['host_id', 'min_ts'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('archive_index', schema=None) as batch_op:
+        batch_op.drop_index('ix_archive_index_host_id_min_ts')
+
+    op.drop_table('archive_index')
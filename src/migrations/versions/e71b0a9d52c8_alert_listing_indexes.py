@@ -0,0 +1,32 @@
+"""alert listing indexes
+
+Revision ID: e71b0a9d52c8
+Revises: c5d93e07f4a2
+Create Date: 2026-10-18 13:48:52.091377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e71b0a9d52c8'
+down_revision = 'c5d93e07f4a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('alerts', schema=None) as batch_op:
+        batch_op.create_index('ix_alerts_timestamp_id', ['timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_alerts_severity_timestamp', ['severity', 'timestamp'], unique=False)
+        batch_op.create_index('ix_alerts_source_ip_timestamp', ['source_ip', 'timestamp'], unique=False)
+        batch_op.create_index('ix_alerts_is_resolved_timestamp', ['is_resolved', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('alerts', schema=None) as batch_op:
+        batch_op.drop_index('ix_alerts_is_resolved_timestamp')
+        batch_op.drop_index('ix_alerts_source_ip_timestamp')
+        batch_op.drop_index('ix_alerts_severity_timestamp')
+        batch_op.drop_index('ix_alerts_timestamp_id')
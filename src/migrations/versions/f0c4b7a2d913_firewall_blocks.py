@@ -0,0 +1,42 @@
+"""firewall blocks
+
+Revision ID: f0c4b7a2d913
+Revises: b93e6d0f4a18
+Create Date: 2026-10-18 19:48:12.530871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f0c4b7a2d913'
+down_revision = 'b93e6d0f4a18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('firewall_blocks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('host_id', sa.Integer(), nullable=False),
+    sa.Column('ip_address', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('applied_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['host_id'], ['hosts.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('host_id', 'ip_address', name='uq_firewall_blocks_host_id_ip_address')
+    )
+    with op.batch_alter_table('firewall_blocks', schema=None) as batch_op:
+        batch_op.create_index('ix_firewall_blocks_status_expires_at', ['status', 'expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('firewall_blocks', schema=None) as batch_op:
+        batch_op.drop_index('ix_firewall_blocks_status_expires_at')
+
+    op.drop_table('firewall_blocks')
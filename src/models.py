@@ -45,13 +45,20 @@ class Host(db.Model):
 # DATA ENGINEERING
 class LogSource(db.Model):
     """
-    Table for log sources per host (e.g., SSH Auth Logs, Windows Security Events)
+    Table for log sources per host: journal units / field matches or a log
+    file, each with its rule packs. All sources of a host are fetched over
+    one SSH session (see core/sources.py)
     """
     __tablename__ = 'log_sources'
     id = db.Column(db.Integer, primary_key=True)
     host_id = db.Column(db.Integer, db.ForeignKey('hosts.id'))
-    log_type = db.Column(db.String(32))  # e.g. 'ssh_auth', 'security_event'
+    log_type = db.Column(db.String(32))  # source name, unique per host: 'ssh', 'sudo', 'kernel', 'nginx'
+    units = db.Column(db.String(256))    # systemd units, comma separated: 'ssh.service,sshd.service'
+    matches = db.Column(db.String(256))  # journal matches, comma separated: 'SYSLOG_IDENTIFIER=sudo'
+    path = db.Column(db.String(256))     # log file read instead of the journal: '/var/log/nginx/access.log'
+    rules = db.Column(db.String(256))    # rule packs (rules/<pack>.yml), comma separated; empty = all
     last_fetch = db.Column(db.DateTime, nullable=True) 
+    cursor = db.Column(db.String(256), nullable=True)  # journald __CURSOR of the last stored entry, byte offset for files
 
 
 # --- 4. FORENSICS (Rejestr Plików Parquet) ---
@@ -67,21 +74,61 @@ class LogArchive(db.Model):
     record_count = db.Column(db.Integer, default=0)
 
 
+class ArchiveIndex(db.Model):
+    """
+    Search index of one archive file (see core/archive_index.py):
+    time range, row count and a Bloom filter of the IPs and users in it
+    """
+    __tablename__ = 'archive_index'
+    __table_args__ = (
+        db.Index('ix_archive_index_host_id_min_ts', 'host_id', 'min_ts'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    archive_id = db.Column(db.Integer, db.ForeignKey('log_archives.id', ondelete='CASCADE'), unique=True, nullable=False)
+    host_id = db.Column(db.Integer, db.ForeignKey('hosts.id'))
+    min_ts = db.Column(db.Float)  # epoch seconds (UTC)
+    max_ts = db.Column(db.Float)
+    row_count = db.Column(db.Integer, default=0)
+    bloom = db.Column(db.LargeBinary, nullable=False)
+    bloom_hashes = db.Column(db.Integer, nullable=False)
+
+    archive = db.relationship('LogArchive', backref=db.backref(
+        'search_index', uselist=False, cascade='all, delete-orphan'))
+
+
 # --- 5. THREAT INTEL ---
 class IPRegistry(db.Model):
     """
     Table for IP address reputation registry
     """
     __tablename__ = 'ip_registry'
+    __table_args__ = (
+        # Incremental refresh of the in-memory reputation table (core/reputation.py)
+        db.Index('ix_ip_registry_updated_at', 'updated_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    ip_address = db.Column(db.String(64), unique=True, nullable=False)
+    ip_address = db.Column(db.String(64), unique=True, nullable=False)  # address or CIDR network
     reputation = db.Column(db.String(20), default='UNKNOWN') # UNKNOWN, TRUSTED, BANNED
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
 # --- 6. ALERTS ---
+# Numeric order of severities (string max() would rank WARNING above CRITICAL)
+SEVERITY_RANK = {'INFO': 0, 'WARNING': 1, 'CRITICAL': 2}
+SEVERITY_BY_RANK = {rank: name for name, rank in SEVERITY_RANK.items()}
+
+
 class Alert(db.Model):
     __tablename__ = 'alerts'
+    __table_args__ = (
+        # Time-window lookups during ingestion deduplication
+        db.Index('ix_alerts_host_id_timestamp', 'host_id', 'timestamp'),
+        # Keyset pagination on (timestamp, id), alone and per filter
+        db.Index('ix_alerts_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_alerts_severity_timestamp', 'severity', 'timestamp'),
+        db.Index('ix_alerts_source_ip_timestamp', 'source_ip', 'timestamp'),
+        db.Index('ix_alerts_is_resolved_timestamp', 'is_resolved', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     host_id = db.Column(db.Integer, db.ForeignKey('hosts.id'))
     severity = db.Column(db.String(20)) # INFO, WARNING, CRITICAL
@@ -89,4 +136,83 @@ class Alert(db.Model):
     target_user = db.Column(db.String(64))  # <---
     message = db.Column(db.String(256))
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    is_resolved = db.Column(db.Boolean, default=False)
\ No newline at end of file
+    is_resolved = db.Column(db.Boolean, default=False)
+    # sha1 of host_id|timestamp|source_ip|target_user, see core.ingest.alert_fingerprint
+    fingerprint = db.Column(db.String(40), unique=True, index=True)
+
+
+class AlertRollup(db.Model):
+    """
+    Incrementally maintained alert counters, updated in the same
+    transaction as alert ingestion (see core/rollups.py)
+    """
+    __tablename__ = 'alert_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('dimension', 'key', name='uq_alert_rollups_dimension_key'),
+        db.Index('ix_alert_rollups_dimension_count', 'dimension', 'count'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    dimension = db.Column(db.String(16), nullable=False)  # severity, source_ip, host, hour
+    key = db.Column(db.String(64), nullable=False)        # e.g. 'CRITICAL', '1.2.3.4', '3', '2026-01-15 12:00'
+    count = db.Column(db.Integer, nullable=False, default=0)
+    max_severity_rank = db.Column(db.Integer, nullable=False, default=0)  # see SEVERITY_RANK
+
+
+# --- 7. JOBS ---
+# A job is active while queued or running; only one active job per dedup_key
+JOB_ACTIVE = ('queued', 'running')
+
+
+class Job(db.Model):
+    """
+    Persistent job queue (fetch, block_ip, firewall_sync) worked off by the worker
+    processes of core/jobs.py
+    """
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Workers claim the oldest queued job
+        db.Index('ix_jobs_status_id', 'status', 'id'),
+        # Per-host de-duplication: a second identical request joins the active job
+        db.Index('uq_jobs_active_dedup_key', 'dedup_key', unique=True,
+                 sqlite_where=db.text("status IN ('queued', 'running')"),
+                 postgresql_where=db.text("status IN ('queued', 'running')")),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)        # fetch, block_ip, firewall_sync
+    host_id = db.Column(db.Integer, db.ForeignKey('hosts.id'))
+    params = db.Column(db.JSON)
+    dedup_key = db.Column(db.String(128))                  # e.g. 'fetch:3'
+    status = db.Column(db.String(16), nullable=False, default='queued')  # queued, running, done, failed
+    progress = db.Column(db.Integer, nullable=False, default=0)           # 0-100
+    stage = db.Column(db.String(32))                       # e.g. 'fetching', 'storing'
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    worker = db.Column(db.String(64))                      # hostname:pid of the worker running it
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)                  # last sign of life of its worker
+    finished_at = db.Column(db.DateTime)
+
+
+# --- 8. RESPONSE ---
+class FirewallBlock(db.Model):
+    """
+    Firewall blocks per host: the desired state, pushed to the hosts in
+    batches by core/response.py, and whether it has been applied there
+    """
+    __tablename__ = 'firewall_blocks'
+    __table_args__ = (
+        db.UniqueConstraint('host_id', 'ip_address', name='uq_firewall_blocks_host_id_ip_address'),
+        # Hosts with changes to push: pending / failed blocks and expired ones
+        db.Index('ix_firewall_blocks_status_expires_at', 'status', 'expires_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    host_id = db.Column(db.Integer, db.ForeignKey('hosts.id'), nullable=False)
+    ip_address = db.Column(db.String(64), nullable=False)  # address or CIDR network
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending, applied, failed, removed
+    expires_at = db.Column(db.DateTime)                    # None = until unblocked
+    error = db.Column(db.Text)                             # last push error
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    applied_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
@@ -4,8 +4,39 @@ document.addEventListener('DOMContentLoaded', function() {
     loadHosts();
     loadAlerts();
     loadStats();
+    subscribeAlerts();
 });
 
+// Live updates pushed by the server (SSE) instead of polling
+function subscribeAlerts() {
+    if (!window.EventSource) return;
+    const source = new EventSource('/api/alerts/stream');
+
+    source.addEventListener('alert', e => {
+        const tbody = document.querySelector('#alerts-table tbody');
+        tbody.insertBefore(alertRow(JSON.parse(e.data)), tbody.firstChild);
+        while (tbody.rows.length > 50) tbody.deleteRow(-1);
+    });
+    source.addEventListener('stats', e => renderStats(JSON.parse(e.data)));
+    // This tab fell behind and messages were dropped: reload once
+    source.addEventListener('resync', () => { loadAlerts(); loadStats(); });
+}
+
+function alertRow(alert) {
+    let badgeClass = 'bg-info';
+    if (alert.severity === 'CRITICAL') badgeClass = 'bg-danger';
+    if (alert.severity === 'WARNING') badgeClass = 'bg-warning text-dark';
+
+    const tr = document.createElement('tr');
+    tr.innerHTML = `
+        <td class="text-secondary">${alert.timestamp}</td>
+        <td><span class="badge ${badgeClass}">${alert.severity}</span></td>
+        <td class="text-info">${alert.host}</td>
+        <td>${alert.message}</td>
+    `;
+    return tr;
+}
+
 // Download host list and populate table
 async function loadHosts() {
     try {
@@ -44,20 +75,7 @@ async function loadAlerts() {
         const tbody = document.querySelector('#alerts-table tbody');
         tbody.innerHTML = '';
 
-        alerts.forEach(alert => {
-            let badgeClass = 'bg-info';
-            if (alert.severity === 'CRITICAL') badgeClass = 'bg-danger';
-            if (alert.severity === 'WARNING') badgeClass = 'bg-warning text-dark';
-
-            const tr = document.createElement('tr');
-            tr.innerHTML = `
-                <td class="text-secondary">${alert.timestamp}</td>
-                <td><span class="badge ${badgeClass}">${alert.severity}</span></td>
-                <td class="text-info">${alert.host}</td>
-                <td>${alert.message}</td>
-            `;
-            tbody.appendChild(tr);
-        });
+        alerts.forEach(alert => tbody.appendChild(alertRow(alert)));
     } catch (e) { console.error('Błąd alertów:', e); }
 }
 
@@ -65,8 +83,12 @@ async function loadAlerts() {
 async function loadStats() {
     try {
         const response = await fetch('/api/alerts/stats');
-        const stats = await response.json();
+        renderStats(await response.json());
+    } catch (e) { console.error('Błąd statystyk:', e); }
+}
 
+function renderStats(stats) {
+    try {
         // Counter update
         const criticalCount = stats['CRITICAL'] || 0;
         document.getElementById('stats-alerts-critical').innerText = criticalCount;
@@ -97,6 +119,17 @@ async function loadStats() {
     } catch (e) { console.error('Błąd statystyk:', e); }
 }
 
+// Poll a queued job (fetch, block-ip) until it is done or failed
+async function waitForJob(jobId, onProgress) {
+    while (true) {
+        const response = await fetch(`/api/jobs/${jobId}`);
+        const job = await response.json();
+        if (!response.ok || job.status === 'done' || job.status === 'failed') return job;
+        if (onProgress) onProgress(job);
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
 // Fetch logs for a host
 async function fetchLogs(id, btn) {
     const originalText = btn.innerHTML;
@@ -105,9 +138,16 @@ async function fetchLogs(id, btn) {
 
     try {
         const response = await fetch(`/api/hosts/${id}/fetch`, { method: 'POST' });
-        const data = await response.json();
+        const queued = await response.json();
+        if (!response.ok) {
+            alert('Błąd: ' + (queued.message || queued.error));
+            return;
+        }
 
-        if (response.ok) {
+        const job = await waitForJob(queued.job_id, j => { btn.innerHTML = `⏳ Skanuję... ${j.progress}%`; });
+
+        if (job.status === 'done') {
+            const data = job.result;
             loadAlerts();
             loadStats();
             
@@ -117,7 +157,7 @@ async function fetchLogs(id, btn) {
                 alert(`✅ Skanowanie zakończone. Brak nowych zagrożeń krytycznych.`);
             }
         } else {
-            alert('Błąd: ' + (data.message || data.error));
+            alert('Błąd: ' + job.error);
         }
     } catch (e) { console.error('Error:', e); }
     finally {
@@ -196,13 +236,18 @@ async function blockIp(hostId, ip, btn) {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ ip: ip })
         });
-        const data = await response.json();
+        const queued = await response.json();
+        if (!response.ok) {
+            alert('Błąd: ' + queued.error);
+            return;
+        }
 
-        if (response.ok) {
-            alert('Sukces: ' + data.message);
+        const job = await waitForJob(queued.job_id);
+        if (job.status === 'done') {
+            alert('Sukces: ' + job.result.message);
             loadIpThreats(); // Refresh the threats list
         } else {
-            alert('Błąd: ' + data.error);
+            alert('Błąd: ' + job.error);
         }
     } catch (e) { console.error(e); }
     finally {
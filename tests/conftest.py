@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# Same import layout as the app and the benchmarks (flat imports from src/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+# In-memory database and no job workers for the whole session, set before `app` is imported
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('JOB_WORKERS', '0')
+os.environ.setdefault('SQLITE_TUNING', '0')
+os.environ.setdefault('WRITE_BEHIND', '0')
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The Flask app on a fresh, empty database; archives go to a temporary directory"""
+    from app import app as flask_app
+    from extensions import db
+
+    flask_app.config.update(TESTING=True, STORAGE_PATH=str(tmp_path / 'archives'), METRICS_DIR=str(tmp_path / 'metrics'))
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from api.alerts import decode_cursor, encode_cursor
+
+T0 = datetime(2026, 3, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def client(app):
+    from extensions import db
+    from models import Alert, Host
+
+    app.config['LOGIN_DISABLED'] = True
+    host = Host(name='vm-1', ip_address='vm-1')
+    db.session.add(host)
+    db.session.flush()
+    # 25 alerts over 10 distinct timestamps: pages must split ties on timestamp by id
+    for i in range(25):
+        db.session.add(Alert(host_id=host.id, severity='CRITICAL' if i % 5 == 0 else 'WARNING',
+                             source_ip=f"203.0.113.{i % 3}", target_user='root', message=f"alert {i}",
+                             timestamp=T0 + timedelta(minutes=i % 10), fingerprint=f"{i:040d}"))
+    db.session.commit()
+    yield app.test_client()
+    app.config['LOGIN_DISABLED'] = False
+
+
+def pages(client, **params):
+    """Follows next_cursor to the end, returns the pages' item lists"""
+    found, cursor = [], None
+    while True:
+        query = dict(params, **({'cursor': cursor} if cursor else {}))
+        body = client.get('/api/alerts/', query_string=query).get_json()
+        found.append(body['items'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return found
+
+
+def test_cursor_round_trip():
+    class Row:
+        timestamp, id = T0 + timedelta(microseconds=123), 42
+
+    assert decode_cursor(encode_cursor(Row)) == (Row.timestamp, 42)
+
+
+def test_pages_cover_every_alert_once_newest_first(client):
+    from models import Alert
+
+    result = pages(client, limit=7)
+    assert [len(page) for page in result] == [7, 7, 7, 4]
+    ids = [item['id'] for page in result for item in page]
+    expected = [a.id for a in Alert.query.order_by(Alert.timestamp.desc(), Alert.id.desc())]
+    assert ids == expected
+
+
+def test_exact_last_page_has_no_cursor(client):
+    body = client.get('/api/alerts/', query_string={'limit': 25}).get_json()
+    assert len(body['items']) == 25 and body['next_cursor'] is None
+
+
+def test_filters_apply_to_every_page(client):
+    result = pages(client, limit=2, severity='critical')
+    items = [item for page in result for item in page]
+    assert len(items) == 5
+    assert {item['severity'] for item in items} == {'CRITICAL'}
+
+
+def test_invalid_cursor_is_rejected(client):
+    response = client.get('/api/alerts/', query_string={'cursor': 'bm90LWEtY3Vyc29y'})
+    assert response.status_code == 400
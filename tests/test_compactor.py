@@ -0,0 +1,64 @@
+import os
+
+from core.collector import _FileReader
+from core.compactor import ArchiveCompactor
+from core.data_manager import ARCHIVE_SCHEMA, DataManager
+from core.ingest import HostRef
+from core.sources import SourceRef
+
+HOST = HostRef(1, 'vm-1', 'vm-1')
+BEFORE = [b'Mar  1 10:00:00 vm-1 app: login failed for root', b'Mar  1 10:00:01 vm-1 app: login failed for bob']
+# Same lengths, so the same offsets come back for other lines
+AFTER = [b'Mar  1 11:00:00 vm-1 app: login failed for evan', b'Mar  1 11:00:01 vm-1 app: login failed for amy']
+
+
+def read_file(lines, cursor):
+    source = SourceRef(2, 'app', (), (), '/var/log/app.log', None, cursor)
+    return _FileReader(source, HOST).records([b'0', *lines])
+
+
+def journal(i, message):
+    return {'timestamp': 1_772_359_200.0 + i, 'message': message, 'hostname': 'vm-1',
+            'cursor': f"s=abc;i={i}", 'source': 'ssh', 'raw': f'{{"MESSAGE":"{message}"}}'}
+
+
+def archive(records):
+    from extensions import db
+    from models import LogArchive
+
+    for saved in DataManager.save_logs(HOST.id, records):
+        db.session.add(LogArchive(host_id=HOST.id, filename=saved.filename, record_count=saved.record_count))
+    db.session.commit()
+
+
+def test_truncated_log_file_lines_survive_compaction(app):
+    from extensions import db
+    from models import Host, LogArchive
+
+    db.session.add(Host(id=HOST.id, name=HOST.name, ip_address=HOST.ip_address))
+    db.session.commit()
+    first = read_file(BEFORE, None) + [journal(1, 'one')]
+    archive(first)
+    # The same batch stored twice (a retried fetch) is merged away
+    archive(first)
+    # The file was truncated: read again from 0, the offsets repeat
+    after = read_file(AFTER, '1000') + [journal(1, 'one'), journal(2, 'two')]
+    assert [r['cursor'] for r in after[:2]] == [r['cursor'] for r in first[:2]]
+    archive(after)
+
+    summary, = ArchiveCompactor().compact_host(HOST.id)
+    assert (summary['files'], summary['rows_in'], summary['rows_out']) == (3, 10, 6)
+    merged, = LogArchive.query.all()
+    table = DataManager.read_archive(os.path.join(DataManager.storage_path(), merged.filename), schema=ARCHIVE_SCHEMA)
+    assert sorted(table['message'].to_pylist()) == sorted([line.decode() for line in BEFORE + AFTER] + ['one', 'two'])
+
+
+def test_deduplicate_keeps_the_first_occurrence():
+    import pyarrow as pa
+
+    rows = [journal(1, 'one'), journal(1, 'one again'), dict(journal(3, 'x'), cursor=None),
+            dict(journal(4, 'x'), cursor=None)] + read_file(BEFORE, None) + read_file(BEFORE, None)
+    table = pa.Table.from_pylist(rows, schema=ARCHIVE_SCHEMA)
+    kept = ArchiveCompactor.deduplicate(table)['message'].to_pylist()
+    # No cursor: the raw line is the key
+    assert kept == ['one', 'x', *[line.decode() for line in BEFORE]]
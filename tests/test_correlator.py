@@ -0,0 +1,126 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from core.correlator import Correlator, DistinctWindow, WindowCounter, _LRU
+
+T0 = datetime(2026, 3, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def failure(seconds, ip='203.0.113.7', user='root'):
+    return {
+        'timestamp': T0 + timedelta(seconds=seconds),
+        'type': 'ssh_failed',
+        'severity': 'WARNING',
+        'source_ip': ip,
+        'target_user': user,
+        'message': f"Failed password for {user} from {ip} port 22 ssh2",
+    }
+
+
+def attacks(events, kind):
+    return [e for e in events if e['type'] == kind]
+
+
+def test_window_counter_matches_brute_force_count():
+    rnd = random.Random(7)
+    counter, seen = WindowCounter(10), []
+    bucket = 0
+    for _ in range(2000):
+        # Mostly forward in time, sometimes late
+        bucket = max(0, bucket + rnd.choice([0, 0, 1, 1, 2, 13, -3]))
+        counter.add(bucket)
+        if bucket > (counter.head - 10):
+            seen.append(bucket)
+        assert counter.total() == sum(1 for b in seen if b > counter.head - 10)
+
+
+def test_distinct_window_forgets_expired_values():
+    window = DistinctWindow()
+    for i, user in enumerate(['a', 'b', 'c']):
+        window.add(user, bucket=i, horizon=i - 10, cap=10)
+    assert window.count(horizon=-10) == 3
+    assert window.count(horizon=0) == 2  # 'a' was seen in bucket 0 only
+    window.add('a', bucket=5, horizon=-5, cap=10)
+    assert window.count(horizon=0) == 3
+
+
+def test_distinct_window_is_capped():
+    window = DistinctWindow()
+    for i in range(50):
+        window.add(f"user{i}", bucket=i, horizon=-1, cap=8)
+    assert len(window.seen) == 8
+    # The stalest values went first
+    assert set(window.seen) == {f"user{i}" for i in range(42, 50)}
+
+
+def test_brute_force_fires_once_at_threshold_and_folds_the_rest():
+    correlator = Correlator(window=300, brute_force=5, spray_users=100, distributed_ips=100)
+    output = correlator.process(1, [failure(i) for i in range(4)])
+    assert len(output) == 4 and not attacks(output, 'brute_force')
+
+    output = correlator.process(1, [failure(4 + i) for i in range(10)])
+    alert, = attacks(output, 'brute_force')
+    assert alert['severity'] == 'CRITICAL' and alert['source_ip'] == '203.0.113.7'
+    assert '5 nieudanych' in alert['title']
+    # The failure that crossed the threshold and the later ones are folded in
+    assert len(output) == 1
+    assert correlator.by_ip_host.get(('203.0.113.7', 1)).suppressed == 9
+
+
+def test_brute_force_counts_per_host():
+    correlator = Correlator(window=300, brute_force=5, spray_users=100, distributed_ips=100)
+    output = correlator.process(1, [failure(i) for i in range(3)]) + correlator.process(2, [failure(i) for i in range(3)])
+    assert not attacks(output, 'brute_force')
+
+
+def test_failures_outside_the_window_do_not_add_up():
+    correlator = Correlator(window=300, brute_force=5, spray_users=100, distributed_ips=100)
+    # 4 failures, then 4 more well after the first ones left the window
+    output = correlator.process(1, [failure(i) for i in range(4)] + [failure(1000 + i) for i in range(4)])
+    assert not attacks(output, 'brute_force')
+    assert len(output) == 8
+
+
+def test_ongoing_attack_gets_a_new_alert_once_per_window():
+    correlator = Correlator(window=300, brute_force=3, spray_users=100, distributed_ips=100)
+    # One failure every 10 s for 20 minutes
+    output = correlator.process(1, [failure(i * 10) for i in range(120)])
+    fired = attacks(output, 'brute_force')
+    gaps = [(b['timestamp'] - a['timestamp']).total_seconds() for a, b in zip(fired, fired[1:])]
+    assert len(fired) == 4 and all(gap >= 300 for gap in gaps)
+
+
+def test_password_spray_and_distributed_attack():
+    correlator = Correlator(window=300, brute_force=100, spray_users=3, distributed_ips=3)
+    spray = correlator.process(1, [failure(i, user=f"user{i}") for i in range(3)])
+    alert, = attacks(spray, 'password_spray')
+    assert alert['source_ip'] == '203.0.113.7' and alert['target_user'] is None
+
+    distributed = correlator.process(1, [failure(10 + i, ip=f"198.51.100.{i}", user='admin') for i in range(3)])
+    alert, = attacks(distributed, 'distributed_attack')
+    assert alert['target_user'] == 'admin' and alert['source_ip'] is None
+
+
+def test_other_events_pass_through_untouched():
+    correlator = Correlator(window=300, brute_force=1)
+    accepted = dict(failure(0), type='ssh_accepted', severity='INFO')
+    auth_failure = dict(failure(1), type='nginx_auth_failed', category='auth_failure')
+    output = correlator.process(1, [accepted, auth_failure])
+    assert output[0] is accepted
+    # Rules tagged auth_failure count as failed logins
+    assert attacks(output, 'brute_force')
+
+
+def test_lru_evicts_the_least_recently_used_key():
+    table = _LRU(3, dict)
+    for key in 'abc':
+        table.touch(key)
+    table.touch('a')
+    table.touch('d')
+    assert list(table) == ['c', 'a', 'd']
+
+
+def test_key_tables_stay_bounded():
+    correlator = Correlator(window=300, brute_force=5, max_keys=50)
+    correlator.process(1, [failure(i, ip=f"10.0.{i // 256}.{i % 256}", user=f"u{i}") for i in range(500)])
+    assert len(correlator.by_ip_host) == len(correlator.by_ip) == len(correlator.by_user) == 50
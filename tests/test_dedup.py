@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+
+from core import ingest
+
+T0 = datetime(2026, 3, 1, 12, 0, 0)
+
+
+def event(seconds=0, ip='203.0.113.7', user='root', severity='WARNING'):
+    return {
+        'timestamp': T0 + timedelta(seconds=seconds),
+        'type': 'ssh_failed',
+        'severity': severity,
+        'source_ip': ip,
+        'target_user': user,
+        'message': f"Failed password for {user} from {ip} port 22 ssh2",
+    }
+
+
+def add_host(name='vm-1'):
+    from extensions import db
+    from models import Host
+
+    host = Host(name=name, ip_address=name)
+    db.session.add(host)
+    db.session.commit()
+    return host.id
+
+
+def test_fingerprint_is_the_same_for_aware_and_naive_utc():
+    aware = T0.replace(tzinfo=timezone.utc)
+    local = aware.astimezone(timezone(timedelta(hours=2)))
+    assert ingest.alert_fingerprint(1, T0, '203.0.113.7', 'root') == ingest.alert_fingerprint(1, aware, '203.0.113.7', 'root')
+    assert ingest.alert_fingerprint(1, T0, '203.0.113.7', 'root') == ingest.alert_fingerprint(1, local, '203.0.113.7', 'root')
+
+
+def test_fingerprint_changes_with_each_part():
+    base = ingest.alert_fingerprint(1, T0, '203.0.113.7', 'root')
+    assert len({
+        base,
+        ingest.alert_fingerprint(2, T0, '203.0.113.7', 'root'),
+        ingest.alert_fingerprint(1, T0 + timedelta(microseconds=1), '203.0.113.7', 'root'),
+        ingest.alert_fingerprint(1, T0, '203.0.113.8', 'root'),
+        ingest.alert_fingerprint(1, T0, '203.0.113.7', 'admin'),
+        ingest.alert_fingerprint(1, T0, '203.0.113.7', None),
+    }) == 6
+
+
+def test_alert_rows_drop_duplicates_inside_the_batch():
+    rows = ingest.alert_rows(1, [event(0), event(0, severity='CRITICAL'), event(1)])
+    assert len(rows) == 2
+    # The first occurrence wins
+    assert [row['severity'] for row in rows.values()] == ['WARNING', 'WARNING']
+
+
+def test_insert_alerts_skips_stored_alerts(app):
+    from models import Alert
+
+    host_id = add_host()
+    assert ingest.insert_alerts(host_id, [event(i) for i in range(5)]) == 5
+    # Same batch again (e.g. a re-fetched range): nothing new
+    assert ingest.insert_alerts(host_id, [event(i) for i in range(5)]) == 0
+    # Overlapping batch: only the new tail goes in
+    assert ingest.insert_alerts(host_id, [event(i) for i in range(3, 8)]) == 3
+    assert Alert.query.count() == 8
+    assert Alert.query.filter_by(host_id=host_id).count() == len({a.fingerprint for a in Alert.query})
+
+
+def test_same_event_on_two_hosts_is_two_alerts(app):
+    from models import Alert
+
+    first, second = add_host('vm-1'), add_host('vm-2')
+    assert ingest.insert_alerts(first, [event()]) == 1
+    assert ingest.insert_alerts(second, [event()]) == 1
+    assert Alert.query.count() == 2
+
+
+def test_info_alerts_are_stored_resolved(app):
+    from models import Alert
+
+    host_id = add_host()
+    ingest.insert_alerts(host_id, [event(0, severity='INFO'), event(1, severity='CRITICAL')])
+    assert {a.severity: a.is_resolved for a in Alert.query} == {'INFO': True, 'CRITICAL': False}
+
+
+def test_retried_batch_is_correlated_once(app, monkeypatch):
+    from models import Alert
+    from core.correlator import Correlator
+
+    monkeypatch.setitem(app.config, 'CORRELATION_ENABLED', True)
+    correlator = Correlator(window=300, brute_force=5, spray_users=100, distributed_ips=100)
+    monkeypatch.setattr(ingest, 'get_correlator', lambda config: correlator)
+    failed = []
+
+    def insert_rows(rows, insert=ingest._insert_rows):
+        if not failed:
+            failed.append(True)
+            raise RuntimeError('database is locked')
+        return insert(rows)
+
+    monkeypatch.setattr(ingest, '_insert_rows', insert_rows)
+    results = []
+    for host_id in (add_host('vm-1'), add_host('vm-2')):
+        result = ingest.FetchResult(ingest.HostRef(host_id, f"vm-{host_id}", f"vm-{host_id}"))
+        result.events = [event(i) for i in range(3)]
+        results.append(result)
+
+    # 3 failures per host stay under the threshold even though the batch was written twice
+    assert ingest.store_many(results) == [3, 3]
+    assert correlator.by_ip_host.get(('203.0.113.7', results[0].host.id)).window.total() == 3
+    assert Alert.query.count() == 6
@@ -0,0 +1,64 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from core.collector import _FileReader, line_timestamp
+from core.ingest import HostRef
+from core.sources import SourceRef
+
+T0 = datetime(2026, 3, 1, 12, 0, 0, tzinfo=timezone.utc).timestamp()
+NOW = T0 + 3600
+
+
+@pytest.mark.parametrize('line, expected', [
+    ('203.0.113.7 - - [01/Mar/2026:12:00:00 +0000] "GET /.env HTTP/1.1" 404 153 "-" "curl/8.0"', T0),
+    ('203.0.113.7 - - [01/Mar/2026:14:00:00 +0200] "GET / HTTP/1.1" 200 1 "-" "-"', T0),
+    ('Mar  1 12:00:00 vm-1 sshd[812]: Failed password for root from 203.0.113.7 port 22 ssh2', T0),
+    ('2026-03-01T12:00:00.250000+00:00 vm-1 sshd[812]: Accepted publickey for deploy', T0 + 0.25),
+    ('2026-03-01T13:30:00+01:30 vm-1 kernel: [UFW BLOCK]', T0),
+    ('<34>1 2026-03-01T12:00:00Z vm-1 app - - - started', T0),
+    ('2026/03/01 12:00:00 [error] 812#812: *1 open() failed', T0),
+])
+def test_line_timestamp_formats(line, expected):
+    assert line_timestamp(line, NOW) == expected
+
+
+def test_syslog_year_is_never_in_the_future():
+    # A December line read on the 1st of January belongs to the previous year
+    new_year = datetime(2027, 1, 1, 0, 5, tzinfo=timezone.utc).timestamp()
+    assert line_timestamp('Dec 31 23:59:00 vm-1 sshd[1]: x', new_year) == \
+        datetime(2026, 12, 31, 23, 59, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.mark.parametrize('line', [
+    'Failed password for root from 203.0.113.7 port 22 ssh2',
+    'Foo  1 12:00:00 not a month',
+    '2026-02-30T12:00:00Z impossible day',
+    '',
+])
+def test_line_without_a_timestamp(line):
+    assert line_timestamp(line, NOW) is None
+
+
+def reader(cursor=None):
+    source = SourceRef(1, 'app', (), (), '/var/log/app.log', None, cursor)
+    return _FileReader(source, HostRef(1, 'vm-1', 'vm-1'))
+
+
+def test_records_carry_their_own_time_and_offset():
+    records = reader('100').records([b'100', b'Mar  1 12:00:00 vm-1 app: one', b'', b'no time here\r'])
+    assert [r['message'] for r in records] == ['Mar  1 12:00:00 vm-1 app: one', 'no time here']
+    assert records[0]['timestamp'] == line_timestamp(records[0]['message'], records[1]['timestamp'])
+    # Offsets count every byte, blank lines and the \r included
+    assert [r['offset'] for r in records] == [130, 145]
+    assert records[1]['cursor'] == '/var/log/app.log:145'
+
+
+def test_first_read_drops_the_partial_line():
+    first = reader()
+    # The offset and the partial line may come in separate blocks
+    assert first.records([b'50']) == []
+    records = first.records([b'tail of a line', b'a whole line'])
+    assert [(r['message'], r['offset']) for r in records] == [('a whole line', 78)]
+    # A first read from the start of a short file keeps every line
+    assert [r['message'] for r in reader().records([b'0', b'first line'])] == ['first line']
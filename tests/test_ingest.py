@@ -0,0 +1,37 @@
+import json
+
+from core import ingest
+from core.collector import LogCollector
+from core.data_manager import DataManager
+
+HOST = ingest.HostRef(1, 'vm-1', 'vm-1')
+
+
+def journal_line(message, i=0):
+    return json.dumps({'MESSAGE': message, '__REALTIME_TIMESTAMP': str(1_772_366_400_000_000 + i),
+                       '__CURSOR': f"s=abc;i={i}", '_HOSTNAME': 'vm-1'})
+
+
+def test_array_encoded_message_becomes_text():
+    # journalctl writes invalid UTF-8 and control bytes as arrays of byte values
+    colored = list(b'\x1b[31mFailed password\x1b[0m for root from 203.0.113.7 port 22 ssh2')
+    records = LogCollector(pool=None)._records([journal_line([72, 105, 255]), journal_line(colored, 1),
+                                                journal_line([300], 2)], HOST)
+    assert [r['message'] for r in records] == ['Hi�', bytes(colored).decode()]
+    assert DataManager.to_table(records).num_rows == 2
+
+
+def test_batch_with_an_array_message_is_archived_and_parsed(app):
+    records = LogCollector(pool=None)._records([
+        journal_line(list(b'\x1b[31mFailed password\x1b[0m for root from 203.0.113.7 port 22 ssh2')),
+        journal_line([72, 105, 255], 1),
+    ], HOST)
+    result = ingest.process(HOST, records)
+    assert result.error is None and result.cursor == 's=abc;i=1'
+    assert sum(archive.record_count for archive in result.archives) == 2
+    assert [event['type'] for event in result.events] == ['ssh_failed']
+
+
+def test_unconvertible_batch_is_an_error_not_an_exception(app):
+    result = ingest.process(HOST, [{'timestamp': 'soon', 'message': 'x', 'cursor': 's=abc;i=0'}])
+    assert result.error.startswith('unreadable log records') and not result.archives and result.cursor is None
@@ -0,0 +1,107 @@
+import queue
+import threading
+from datetime import datetime, timedelta
+
+from core import ingest, jobs
+from core.data_manager import ArchiveFile
+
+
+def running_job(worker='w1', age=0, heartbeat_age=None):
+    from extensions import db
+    from models import Job
+
+    now = datetime.utcnow()
+    job = Job(kind='fetch', status='running', worker=worker, dedup_key=f"fetch:{worker}",
+              started_at=now - timedelta(seconds=age),
+              heartbeat_at=None if heartbeat_age is None else now - timedelta(seconds=heartbeat_age))
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def status(job_id):
+    from extensions import db
+    from models import Job
+
+    db.session.expire_all()
+    return db.session.get(Job, job_id).status
+
+
+def test_long_job_with_a_heartbeat_is_not_failed(app):
+    job_id = running_job(age=3600, heartbeat_age=5)
+    assert jobs.fail_stale(60) == 0
+    assert status(job_id) == 'running'
+
+
+def test_job_of_a_lost_worker_is_failed(app):
+    job_id = running_job(age=3600, heartbeat_age=600)
+    assert jobs.fail_stale(60) == 1
+    assert status(job_id) == 'failed'
+
+
+def test_beat_keeps_only_the_workers_own_jobs_alive(app):
+    mine, other = running_job('w1', age=600), running_job('w2', age=600)
+    jobs.beat('w1')
+    assert jobs.fail_stale(60) == 1
+    assert (status(mine), status(other)) == ('running', 'failed')
+
+
+def test_given_up_job_keeps_its_failed_status(app, monkeypatch):
+    job_id = running_job()
+
+    def handler(job, report):
+        # Another worker's fail_stale runs meanwhile; a new job may take over the dedup key
+        jobs.fail_stale(0)
+        return {'message': 'late'}
+
+    monkeypatch.setitem(jobs.HANDLERS, 'fetch', handler)
+    from extensions import db
+    from models import Job
+    job = jobs.run(db.session.get(Job, job_id))
+    assert job.status == 'failed' and job.result is None
+
+
+def test_run_records_the_outcome(app, monkeypatch):
+    monkeypatch.setitem(jobs.HANDLERS, 'fetch', lambda job, report: report(50, 'halfway') or {'count': 1})
+    from extensions import db
+    from models import Job
+    job = jobs.run(db.session.get(Job, running_job()))
+    assert (job.status, job.progress, job.result) == ('done', 100, {'count': 1})
+
+
+def test_pool_workers_leave_storing_to_the_parent(app, monkeypatch):
+    from extensions import db
+    from models import Host, Job, LogArchive
+
+    host = Host(name='vm-1', ip_address='vm-1')
+    db.session.add(host)
+    db.session.commit()
+
+    def collect(ref, sources=None, timeout=None):
+        result = ingest.FetchResult(ref)
+        result.logs_count = 3
+        result.archives = [ArchiveFile(f"host_id={ref.id}/date=2026-03-01/a.parquet", 3, None)]
+        return result
+
+    stored_by = []
+    store = ingest.store
+    monkeypatch.setattr(ingest, 'collect', collect)
+    monkeypatch.setattr(ingest, 'store', lambda result: stored_by.append(threading.current_thread().name) or store(result))
+
+    # The pool's queues, with this thread playing the worker process
+    pool = jobs.WorkerPool(app, 1)
+    pool.results, pool.replies = queue.Queue(), [queue.Queue()]
+    pool.storer = threading.Thread(target=pool._store_results, name='job-results', daemon=True)
+    pool.storer.start()
+    monkeypatch.setattr(jobs, '_store_channel', (pool.results, pool.replies[0], 0))
+
+    job = Job(kind='fetch', host_id=host.id, status='running', worker='w1', started_at=datetime.utcnow())
+    db.session.add(job)
+    db.session.commit()
+    job = jobs.run(job)
+    pool.results.put(None)
+    pool.storer.join(5)
+
+    assert (job.status, job.result['count']) == ('done', 3)
+    assert stored_by == ['job-results']
+    assert LogArchive.query.count() == 1
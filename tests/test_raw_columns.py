@@ -0,0 +1,95 @@
+import json
+
+import pyarrow as pa
+import pytest
+
+from core import raw_columns
+from core.data_manager import ARCHIVE_SCHEMA
+
+ENTRY = {
+    '__CURSOR': 's=abc;i=1',
+    '__REALTIME_TIMESTAMP': '1772366400000000',
+    '_BOOT_ID': 'b0',
+    'PRIORITY': '6',
+    '_PID': '812',
+    '_HOSTNAME': 'vm-1',
+    'SYSLOG_IDENTIFIER': 'sshd',
+    'MESSAGE': 'Failed password for root from 203.0.113.7 port 22 ssh2',
+}
+
+
+def line(**fields):
+    """Compact journal JSON line, fields in the given order after ENTRY's (None drops a field)"""
+    entry = dict(ENTRY, **fields)
+    return json.dumps({k: v for k, v in entry.items() if v is not None}, ensure_ascii=False, separators=(',', ':'))
+
+
+def round_trip(lines):
+    records = []
+    for raw in lines:
+        try:
+            entry = json.loads(raw)
+        except (TypeError, ValueError):
+            entry = {}
+        entry = entry if isinstance(entry, dict) else {}
+        message = entry.get('MESSAGE')
+        records.append({'timestamp': 1.0, 'message': message if isinstance(message, str) else 'x',
+                        'hostname': entry.get('_HOSTNAME'), 'cursor': entry.get('__CURSOR'), 'raw': raw})
+    table = pa.Table.from_pylist(records, schema=ARCHIVE_SCHEMA)
+    columnar = table.drop_columns(['raw'])
+    for name, column in raw_columns.split(table).items():
+        columnar = columnar.append_column(name, column)
+    return raw_columns.join(columnar).to_pylist()
+
+
+LINES = [
+    line(),
+    # Arrays (binary / ANSI payloads) and nulls
+    line(MESSAGE=[27, 91, 51, 49, 109, 72, 105, 255], _SYSTEMD_UNIT=None),
+    '{"__CURSOR":"s=abc;i=3","MESSAGE":null,"_PID":"7","SYSLOG_IDENTIFIER":null}',
+    # Numbers as text that are not plain integers: leading zeros, signs, beyond int64 / int8
+    line(_PID='0812'),
+    line(_PID='0'),
+    line(_PID='-1', _UID='+5'),
+    line(__SEQNUM='99999999999999999999', PRIORITY='300'),
+    '{"__CURSOR":"s=abc;i=4","_PID":812,"__SEQNUM":18446744073709551616}',
+    # Unicode, as journalctl writes it and escaped
+    line(MESSAGE='Nieudane logowanie użytkownika żółw ✓ 😀'),
+    '{"__CURSOR":"s=abc;i=5","MESSAGE":"\\u017c\\u00f3\\u0142w \\ud83d\\ude00","_HOSTNAME":"vm-1"}',
+    '{"__CURSOR":"s=abc;i=6","MESSAGE":"tab\\tquote\\" slash\\/ nl\\n"}',
+    # Field order differs from ENTRY's, repeated layouts, rare fields, spacing
+    '{"MESSAGE":"first","_PID":"1","__CURSOR":"s=abc;i=7","CUSTOM_FIELD":"v","_TRANSPORT":"journal"}',
+    '{"MESSAGE":"again","_PID":"2","__CURSOR":"s=abc;i=8","CUSTOM_FIELD":"w","_TRANSPORT":"journal"}',
+    '{"__CURSOR": "s=abc;i=9", "MESSAGE": "spaced"}',
+    '{"a,b":"comma in a name","MESSAGE":"m"}',
+    # Not a journal object
+    'plain log file line',
+    '[1,2,3]',
+    '{}',
+    None,
+]
+
+
+@pytest.fixture(params=['default', 'stdlib'])
+def codec(request, monkeypatch):
+    """The installed JSON codec (orjson when available), and the json module fallback"""
+    if request.param == 'stdlib':
+        monkeypatch.setattr(raw_columns, 'json_loads', json.loads)
+        monkeypatch.setattr(raw_columns, 'json_dumps',
+                            lambda value: json.dumps(value, ensure_ascii=False, separators=(',', ':')))
+
+
+def test_raw_lines_are_rebuilt_byte_for_byte(codec):
+    assert round_trip(LINES) == LINES
+
+
+def test_field_order_is_kept():
+    rebuilt, = round_trip(['{"_PID":"5","MESSAGE":"m","__REALTIME_TIMESTAMP":"1","_BOOT_ID":"b"}'])
+    assert list(json.loads(rebuilt)) == ['_PID', 'MESSAGE', '__REALTIME_TIMESTAMP', '_BOOT_ID']
+
+
+def test_typed_columns_hold_plain_integers_only():
+    table = pa.Table.from_pylist([{'timestamp': 1.0, 'message': 'm', 'raw': raw}
+                                  for raw in (line(_PID='812'), line(_PID='0812'), line(_PID='99999999999999999999'))],
+                                 schema=ARCHIVE_SCHEMA)
+    assert raw_columns.split(table)['_PID'].to_pylist() == [812, None, None]
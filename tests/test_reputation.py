@@ -0,0 +1,106 @@
+import ipaddress
+import random
+
+import pytest
+
+from core.reputation import PrefixTree, ReputationTable
+
+
+def random_network(rnd, version):
+    """Networks packed into a small range, so many of them nest or overlap"""
+    if version == 4:
+        base, bits, shortest = int(ipaddress.ip_address('10.0.0.0')), 32, 8
+    else:
+        base, bits, shortest = int(ipaddress.ip_address('2001:db8::')), 128, 32
+    length = rnd.randint(shortest, bits)
+    address = base + rnd.getrandbits(16) * (1 << (bits - shortest - 16)) + rnd.getrandbits(bits - shortest - 16)
+    return ipaddress.ip_network((address, length), strict=False)
+
+
+def brute_force_lookup(networks, address):
+    """Value of the longest matching network, by checking all of them"""
+    matching = [network for network in networks if network.version == address.version and address in network]
+    return networks[max(matching, key=lambda network: network.prefixlen)] if matching else None
+
+
+def addresses_near(rnd, networks, count):
+    """Addresses inside, at the edges of and right next to the networks"""
+    found = []
+    for network in rnd.sample(list(networks), min(count, len(networks))):
+        first, last = int(network.network_address), int(network.broadcast_address)
+        for value in (first, last, first - 1, last + 1, rnd.randint(first, last)):
+            if 0 <= value < 2 ** network.max_prefixlen:
+                found.append(ipaddress.ip_address(value) if network.version == 4
+                             else ipaddress.IPv6Address(value))
+    return found
+
+
+@pytest.mark.parametrize('version', [4, 6])
+def test_lookup_equals_brute_force(version):
+    rnd = random.Random(version)
+    tree, networks = PrefixTree(), {}
+    for i in range(400):
+        network = random_network(rnd, version)
+        networks[network] = f"v{i}"
+        tree.insert(network, networks[network])
+
+    assert tree.size == len(networks)
+    for address in addresses_near(rnd, networks, 200):
+        assert tree.lookup(address) == brute_force_lookup(networks, address), address
+
+
+@pytest.mark.parametrize('version', [4, 6])
+def test_lookup_equals_brute_force_after_removals(version):
+    rnd = random.Random(10 + version)
+    tree, networks = PrefixTree(), {}
+    for i in range(300):
+        network = random_network(rnd, version)
+        networks[network] = f"v{i}"
+        tree.insert(network, networks[network])
+    removed = rnd.sample(sorted(networks), 150)
+    for network in removed:
+        tree.insert(network, None)
+        del networks[network]
+    # Clearing a network that was never stored changes nothing
+    tree.insert(random_network(rnd, version).supernet(new_prefix=1 if version == 4 else 2), None)
+
+    assert tree.size == len(networks)
+    for address in addresses_near(rnd, dict.fromkeys(removed + list(networks)), 200):
+        assert tree.lookup(address) == brute_force_lookup(networks, address), address
+
+
+def test_families_are_kept_apart():
+    tree = PrefixTree()
+    tree.insert(ipaddress.ip_network('0.0.0.0/0'), 'any4')
+    assert tree.lookup(ipaddress.ip_address('203.0.113.7')) == 'any4'
+    assert tree.lookup(ipaddress.ip_address('::ffff:203.0.113.7')) is None
+
+
+def write_list(directory, name, lines):
+    path = directory / name
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_table_applies_registry_over_lists(app, tmp_path):
+    from extensions import db
+    from models import IPRegistry
+
+    allowlist = write_list(tmp_path, 'allow.txt', ['10.0.0.0/8  # office', 'not-a-network'])
+    denylist = write_list(tmp_path, 'deny.txt', ['203.0.113.0/24', '2001:db8::/32'])
+    db.session.add_all([IPRegistry(ip_address='10.6.6.6', reputation='BANNED'),
+                        IPRegistry(ip_address='203.0.113.9', reputation='TRUSTED'),
+                        IPRegistry(ip_address='203.0.113.10', reputation='UNKNOWN')])
+    db.session.commit()
+    table = ReputationTable(allowlist=allowlist, denylist=denylist)
+    table.rebuild()
+
+    assert [table.lookup(ip) for ip in ('10.1.2.3', '10.6.6.6', '203.0.113.9', '203.0.113.10',
+                                         '2001:db8::1', '198.51.100.1', 'bogus')] == \
+        ['TRUSTED', 'BANNED', 'TRUSTED', 'BANNED', 'BANNED', None, None]
+
+    events = [{'source_ip': ip, 'severity': 'WARNING'} for ip in ('10.1.2.3', '203.0.113.7', '198.51.100.1', None)]
+    output = table.apply(events)
+    assert [e['source_ip'] for e in output] == ['203.0.113.7', '198.51.100.1', None]
+    assert output[0] == {'source_ip': '203.0.113.7', 'severity': 'CRITICAL', 'reputation': 'BANNED'}
+    assert output[1] is events[2]
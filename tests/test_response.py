@@ -0,0 +1,190 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from core import response
+
+
+class FakePool:
+    """Records what each host is sent; hosts in `failing` reject every command"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent = {}
+
+    def run(self, host, command, timeout=30, data=None):
+        self.sent.setdefault(host.name, []).append((command, data))
+        if host.name in self.failing:
+            return 1, '', 'ipset v7.1: Kernel error'
+        return 0, '', ''
+
+    def discard(self, host):
+        pass
+
+
+def add_hosts(*names):
+    from extensions import db
+    from models import Host
+
+    hosts = [Host(name=name, ip_address=name) for name in names]
+    db.session.add_all(hosts)
+    db.session.commit()
+    return [host.id for host in hosts]
+
+
+def blocks():
+    from extensions import db
+    from models import FirewallBlock
+
+    db.session.expire_all()
+    return {(b.host_id, b.ip_address): b for b in FirewallBlock.query}
+
+
+def banned():
+    from models import IPRegistry
+
+    return sorted(entry.ip_address for entry in IPRegistry.query.filter_by(reputation='BANNED'))
+
+
+def sync(backend='ipset', failing=()):
+    from extensions import db
+
+    pool = FakePool(failing)
+    summary = response.ResponseEngine(backend=backend, pool=pool).sync()
+    db.session.commit()
+    return pool.sent, summary
+
+
+def ipset_adds(sent, host):
+    (command, payload), = sent[host]
+    return [line for line in payload.splitlines() if line.startswith('add ')]
+
+
+def test_request_blocks_deduplicates_and_only_extends(app):
+    from extensions import db
+
+    first, second = add_hosts('vm-1', 'vm-2')
+    assert response.request_blocks(['203.0.113.7', '203.0.113.7/32'], ttl=60) == 2
+    db.session.commit()
+    expires_at = blocks()[(first, '203.0.113.7')].expires_at
+
+    # Already active: nothing new, a longer ttl moves the end, a shorter one does not
+    assert response.request_blocks(['203.0.113.7'], ttl=3600) == 0
+    db.session.commit()
+    extended = blocks()[(first, '203.0.113.7')].expires_at
+    assert extended - expires_at > timedelta(minutes=50)
+    response.request_blocks(['203.0.113.7'], ttl=10)
+    db.session.commit()
+    assert blocks()[(first, '203.0.113.7')].expires_at == extended
+
+    # Without a ttl the block is permanent
+    response.request_blocks(['203.0.113.7'], host_ids=[second])
+    db.session.commit()
+    assert [(key, b.expires_at is None) for key, b in sorted(blocks().items())] == \
+        [((first, '203.0.113.7'), False), ((second, '203.0.113.7'), True)]
+
+
+def test_request_blocks_rejects_bad_input_before_recording(app):
+    add_hosts('vm-1')
+    with pytest.raises(ValueError):
+        response.request_blocks(['203.0.113.7', 'not-an-ip'])
+    with pytest.raises(ValueError, match='invalid ttl'):
+        response.request_blocks(['203.0.113.7'], ttl=0)
+    assert blocks() == {}
+
+
+def test_ipset_payload_per_host_and_banned_reputation(app):
+    from extensions import db
+
+    first, second = add_hosts('vm-1', 'vm-2')
+    response.request_blocks(['203.0.113.7'])
+    response.request_blocks(['2001:db8::/32', '198.51.100.0/24'], host_ids=[first])
+    db.session.commit()
+
+    sent, summary = sync()
+    assert ipset_adds(sent, 'vm-1') == ['add siem-block-new 198.51.100.0/24', 'add siem-block-new 203.0.113.7',
+                                        'add siem-block6-new 2001:db8::/32']
+    assert ipset_adds(sent, 'vm-2') == ['add siem-block-new 203.0.113.7']
+    # The IPv6 rule only goes to hosts with IPv6 blocks
+    assert 'ip6tables' in sent['vm-1'][0][0] and 'ip6tables' not in sent['vm-2'][0][0]
+    assert [(e['host'], e['status'], e['added']) for e in summary] == [('vm-1', 'ok', 3), ('vm-2', 'ok', 1)]
+    assert {b.status for b in blocks().values()} == {'applied'}
+    assert banned() == ['198.51.100.0/24', '2001:db8::/32', '203.0.113.7']
+    assert response.dirty_host_ids() == []
+
+
+def test_iptables_payload(app):
+    from extensions import db
+
+    add_hosts('vm-1')
+    response.request_blocks(['203.0.113.7', '198.51.100.4'])
+    db.session.commit()
+
+    sent, _ = sync(backend='iptables')
+    (command, payload), = sent['vm-1']
+    assert command.startswith('sudo iptables-restore --noflush')
+    assert payload == ('*filter\n:SIEM-BLOCK - [0:0]\n-A SIEM-BLOCK -s 198.51.100.4 -j DROP\n'
+                       '-A SIEM-BLOCK -s 203.0.113.7 -j DROP\nCOMMIT\n')
+
+
+def test_failed_host_keeps_its_blocks_for_the_next_sync(app):
+    from extensions import db
+
+    first, second = add_hosts('vm-1', 'vm-2')
+    response.request_blocks(['203.0.113.7'], host_ids=[first])
+    response.request_blocks(['198.51.100.4'], host_ids=[second])
+    db.session.commit()
+
+    _, summary = sync(failing={'vm-2'})
+    assert [(e['host'], e['status']) for e in summary] == [('vm-1', 'ok'), ('vm-2', 'error')]
+    failed = blocks()[(second, '198.51.100.4')]
+    assert (failed.status, failed.error) == ('failed', 'ipset v7.1: Kernel error')
+    # Only addresses blocked somewhere are marked BANNED
+    assert banned() == ['203.0.113.7']
+    assert response.dirty_host_ids() == [second]
+
+    sent, _ = sync()
+    assert list(sent) == ['vm-2'] and blocks()[(second, '198.51.100.4')].status == 'applied'
+
+
+def test_expired_and_unblocked_addresses_are_removed(app):
+    from extensions import db
+    from models import FirewallBlock
+
+    host_id, = add_hosts('vm-1')
+    response.request_blocks(['203.0.113.7'], ttl=60)
+    response.request_blocks(['198.51.100.4', '192.0.2.1'])
+    db.session.commit()
+    sync()
+
+    db.session.execute(db.update(FirewallBlock).where(FirewallBlock.ip_address == '203.0.113.7')
+                       .values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    assert response.request_unblocks(['198.51.100.4']) == 1
+    db.session.commit()
+    assert response.dirty_host_ids() == [host_id]
+
+    sent, summary = sync()
+    assert ipset_adds(sent, 'vm-1') == ['add siem-block-new 192.0.2.1']
+    assert summary[0]['removed'] == 2
+    assert {ip: b.status for (_, ip), b in blocks().items()} == \
+        {'203.0.113.7': 'removed', '198.51.100.4': 'removed', '192.0.2.1': 'applied'}
+
+    # Blocking a removed address again starts a new block
+    assert response.request_blocks(['203.0.113.7']) == 1
+
+
+def test_blocks_changed_after_planning_are_left_for_the_next_sync(app):
+    from extensions import db
+    from models import FirewallBlock
+
+    add_hosts('vm-1')
+    response.request_blocks(['203.0.113.7', '198.51.100.4'])
+    db.session.commit()
+    # Re-requested while the push is running: its newer state must not be marked applied
+    db.session.execute(db.update(FirewallBlock).where(FirewallBlock.ip_address == '198.51.100.4')
+                       .values(updated_at=datetime.utcnow() + timedelta(minutes=5)))
+    db.session.commit()
+
+    sync()
+    assert {ip: b.status for (_, ip), b in blocks().items()} == {'203.0.113.7': 'applied', '198.51.100.4': 'pending'}
+    assert banned() == ['203.0.113.7']
@@ -0,0 +1,137 @@
+import os
+import random
+
+import pandas as pd
+import pytest
+
+from core.parser import LogParser
+from core.rules import RULES_PATH, Rule, RuleSet
+
+# Lines for every shipped pack, near misses and noise
+LINES = [
+    "Failed password for root from 203.0.113.7 port 22 ssh2",
+    "Failed password for invalid user oracle from 198.51.100.4 port 4022 ssh2",
+    "\x1b[31mFailed   password\x1b[0m for bob from 10.0.0.9 port 22 ssh2",
+    "Connection closed by authenticating user admin 203.0.113.9 port 50022 [preauth]",
+    "Accepted publickey for deploy from 192.0.2.10 port 51000 ssh2: ED25519 SHA256:abc",
+    "Accepted password for alice from 192.0.2.11 port 51001 ssh2",
+    "Invalid user test from 203.0.113.50 port 40000",
+    "invalid user without an address",
+    "error: maximum authentication attempts exceeded for invalid user pi from 203.0.113.8 port 1 ssh2 [preauth]",
+    "pam_unix(sshd:session): session opened for user alice(uid=1000) by (uid=0)",
+    '203.0.113.7 - - [01/Mar/2026:12:00:00 +0000] "GET /.env HTTP/1.1" 404 153 "-" "curl/8.0"',
+    '203.0.113.7 - - [01/Mar/2026:12:00:01 +0000] "GET /static/../../etc/passwd HTTP/1.1" 400 0 "-" "-"',
+    '198.51.100.2 - admin [01/Mar/2026:12:00:02 +0000] "POST /login HTTP/1.1" 401 12 "-" "Mozilla/5.0"',
+    "[UFW BLOCK] IN=eth0 OUT= SRC=203.0.113.99 DST=10.0.0.2 PROTO=TCP SPT=4444 DPT=23",
+    "nginx[812]: segfault at 0 ip 00007f sp 00007ffd error 4 in libc.so.6",
+    "",
+    "   ",
+    "Server listening on 0.0.0.0 port 22.",
+]
+
+
+def frame(rows, seed=0):
+    rnd = random.Random(seed)
+    return pd.DataFrame({
+        'timestamp': [1_772_366_400 + i + rnd.random() for i in range(rows)],
+        'message': [rnd.choice(LINES) for _ in range(rows)],
+    })
+
+
+def write_pack(directory, name, body):
+    path = os.path.join(directory, name)
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write(body)
+    return path
+
+
+PACK = """
+rules:
+  - id: demo_failed
+    keywords: ["demo failure"]
+    pattern: 'demo failure for (?P<user>\\S+)'
+    fields: {target_user: user}
+    severity: WARNING
+"""
+
+
+def test_prefilter_candidates_match_every_rules_keyword_check():
+    rules = RuleSet(RULES_PATH)
+    messages = pd.Series([line.lower() if i % 2 else line.upper() for i, line in enumerate(LINES * 3)])
+    found, masks = rules.candidates(messages)
+    for rule in found:
+        expected = [rule.may_match(message.lower()) for message in messages]
+        assert masks[rule.id].tolist() == expected, rule.id
+
+
+def test_prefilter_never_hides_a_regex_match():
+    rules = RuleSet(RULES_PATH)
+    clean = LogParser(pd.DataFrame(), rules=rules).clean_text
+    for rule in rules.rules:
+        for line in map(clean, LINES):
+            if rule.regex.search(line):
+                assert rule.may_match(line.lower()), (rule.id, line)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_columnar_parse_equals_reference_parse(seed):
+    rules = RuleSet(RULES_PATH)
+    df = frame(2000, seed)
+    reference = LogParser(df, vectorized=False, rules=rules).parse()
+    columnar = LogParser(df, vectorized=True, rules=rules).parse()
+    assert columnar == reference
+    assert {event['type'] for event in reference} >= {'ssh_failed', 'ssh_success', 'nginx_auth_failed', 'firewall_blocked'}
+
+
+def test_columnar_parse_equals_reference_parse_with_routes():
+    rules = RuleSet(RULES_PATH)
+    df = frame(1000)
+    df['source'] = ['ssh', 'nginx', 'kernel', None] * 250
+    routes = {'ssh': frozenset({'ssh'}), 'nginx': frozenset({'nginx'}), 'kernel': None}
+    reference = LogParser(df, vectorized=False, rules=rules, routes=routes).parse()
+    assert LogParser(df, vectorized=True, rules=rules, routes=routes).parse() == reference
+    # Rows of a routed source only get the rules of its packs
+    ssh_rows = LogParser(df[df['source'] == 'ssh'], vectorized=True, rules=rules, routes=routes).parse()
+    nginx_rows = LogParser(df[df['source'] == 'nginx'], vectorized=True, rules=rules, routes=routes).parse()
+    assert ssh_rows and {e['type'] for e in ssh_rows} <= {r.id for r in rules.rules if r.pack == 'ssh'}
+    assert nginx_rows and {e['type'] for e in nginx_rows} <= {r.id for r in rules.rules if r.pack == 'nginx'}
+
+
+def test_severity_conditions_are_the_same_in_both_paths():
+    rules = RuleSet(RULES_PATH)
+    df = pd.DataFrame({'timestamp': [1.0, 2.0], 'message': [LINES[0], LINES[1]]})
+    for vectorized in (False, True):
+        severities = [e['severity'] for e in LogParser(df, vectorized=vectorized, rules=rules).parse()]
+        assert severities == ['CRITICAL', 'WARNING']
+
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(ValueError, match='unknown groups'):
+        Rule({'id': 'x', 'pattern': '(?P<a>.)', 'fields': {'source_ip': 'b'}}, 'x.yml')
+    with pytest.raises(ValueError, match='unknown severity'):
+        Rule({'id': 'x', 'pattern': '.', 'severity': 'LOUD'}, 'x.yml')
+    with pytest.raises(ValueError, match='missing'):
+        Rule({'pattern': '.'}, 'x.yml')
+
+
+def test_only_limits_the_rules(tmp_path):
+    write_pack(tmp_path, 'demo.yml', PACK)
+    assert [r.id for r in RuleSet(str(tmp_path), only=['demo_failed']).rules] == ['demo_failed']
+    with pytest.raises(ValueError, match='unknown rule ids'):
+        RuleSet(str(tmp_path), only=['nope'])
+
+
+def test_hot_reload_keeps_the_previous_rules_when_a_file_breaks(tmp_path):
+    path = write_pack(tmp_path, 'demo.yml', PACK)
+    rules = RuleSet(str(tmp_path), check_interval=0)
+    assert [r.id for r in rules.rules] == ['demo_failed']
+
+    write_pack(tmp_path, 'demo.yml', PACK.replace('demo_failed', 'demo_renamed'))
+    os.utime(path, ns=(0, 1))
+    rules.maybe_reload()
+    assert [r.id for r in rules.rules] == ['demo_renamed']
+
+    write_pack(tmp_path, 'demo.yml', PACK.replace("pattern: 'demo", "pattern: '(demo"))
+    os.utime(path, ns=(0, 2))
+    rules.maybe_reload()
+    assert [r.id for r in rules.rules] == ['demo_renamed']
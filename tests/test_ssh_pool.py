@@ -0,0 +1,79 @@
+from core.ingest import HostRef
+from core.ssh_pool import SSHPool
+
+HOST = HostRef(1, 'vm-1', 'vm-1')
+OTHER = HostRef(2, 'vm-2', 'vm-2')
+
+
+class Channel:
+    closed = False
+
+
+class Stream:
+    def __init__(self, channel):
+        self.channel = channel
+
+
+class Transport:
+    def is_active(self):
+        return True
+
+
+class Client:
+    def __init__(self):
+        self.closed = False
+
+    def get_transport(self):
+        return Transport()
+
+    def exec_command(self, cmd, timeout=None):
+        channel = Channel()
+        return Stream(channel), Stream(channel), Stream(channel)
+
+    def close(self):
+        self.closed = True
+
+
+class Clock:
+    now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def pool(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr('core.ssh_pool.time.monotonic', clock)
+    ssh = SSHPool(idle_timeout=600)
+    monkeypatch.setattr(ssh, '_connect', lambda address, timeout: Client())
+    return ssh, clock
+
+
+def test_session_with_a_long_lived_channel_is_not_evicted(monkeypatch):
+    ssh, clock = pool(monkeypatch)
+    stdin, stdout, stderr = ssh.exec_command(HOST, 'journalctl --follow')
+    client = ssh.get(HOST)
+
+    # The stream runs far past idle_timeout; another host's fetch triggers evict_idle
+    clock.now += 3600
+    ssh.get(OTHER)
+    assert not client.closed and ssh.get(HOST) is client
+
+    # Once the stream ends, the session is idle from then on
+    stdout.channel.closed = True
+    clock.now += 300
+    ssh.evict_idle()
+    assert not client.closed
+    clock.now += 601
+    ssh.evict_idle()
+    assert client.closed
+
+
+def test_idle_session_without_channels_is_evicted(monkeypatch):
+    ssh, clock = pool(monkeypatch)
+    stdin, stdout, stderr = ssh.exec_command(HOST, 'uptime')
+    stdout.channel.closed = True
+    client = ssh.get(HOST)
+    clock.now += 601
+    ssh.get(OTHER)
+    assert client.closed and ssh.get(HOST) is not client